@@ -0,0 +1,299 @@
+"""
+Actor processes for AdvantageActorCritic, see its num_actors argument
+
+Each actor process owns a copy of the policy network and a WordleVecEnv,
+plays batches of experience with it and hands them to the learner through a
+SharedRingBuffer. The learner publishes its weights to a SharedWeights every
+actor_sync_interval batches it consumes and actors pick the latest ones up
+before playing each batch, so experience is at most a few updates stale.
+
+Only slot numbers go through the multiprocessing queues, the experience
+itself is written once into shared memory by the actor and read once by the
+learner.
+"""
+import collections
+import multiprocessing
+import queue
+from typing import Any, Dict, Optional, Tuple
+
+import gym
+import numpy as np
+import torch
+from torch import nn
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+import a2c
+import wordle.envs  # registers the envs with gym
+import wordle.state
+from a2c.agent import ActorCriticAgent
+from common.returns import discounted_returns
+from wordle.vec import WordleVecEnv
+
+# Field name -> (shape, dtype) of one slot of a SharedRingBuffer
+Layout = Dict[str, Tuple[Tuple[int, ...], Any]]
+
+
+class SharedRingBuffer:
+    def __init__(self, slots: int, layout: Layout, ctx: Optional[multiprocessing.context.BaseContext] = None):
+        """
+        Fixed number of slots in shared memory, each holding one array per
+        field of layout. Producers fill free slots, the consumer takes filled
+        slots in the order they were committed and frees them again.
+
+        :param slots: number of slots, producers block when all are filled
+        :param layout: shape and dtype of each field of a slot
+        :param ctx: multiprocessing context the producers are started with
+        """
+        ctx = ctx or multiprocessing.get_context()
+        self.slots = slots
+        self.layout = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in layout.items()}
+        self._raw = {
+            name: ctx.RawArray('b', max(1, slots * int(np.prod(shape, dtype=np.int64)) * dtype.itemsize))
+            for name, (shape, dtype) in self.layout.items()
+        }
+        self._free = ctx.Queue()
+        self._filled = ctx.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._arrays = None
+
+    def __getstate__(self):
+        # Views are rebuilt on the other side of a pickle, the shared memory is what's sent
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    @property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        :return: (slots, *shape) view of every field
+        """
+        if self._arrays is None:
+            self._arrays = {
+                name: np.frombuffer(self._raw[name], dtype=dtype,
+                                    count=self.slots * int(np.prod(shape, dtype=np.int64))).reshape((self.slots,) + shape)
+                for name, (shape, dtype) in self.layout.items()
+            }
+        return self._arrays
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        """
+        :return: a free slot to write to, see commit
+        :raises queue.Empty: if none was freed within timeout seconds
+        """
+        return self._free.get(timeout=timeout)
+
+    def commit(self, slot: int):
+        self._filled.put(slot)
+
+    def get(self, timeout: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        :return: copy of the oldest filled slot, which is freed
+        :raises queue.Empty: if nothing was committed within timeout seconds
+        """
+        slot = self._filled.get(timeout=timeout)
+        batch = {name: array[slot].copy() for name, array in self.arrays.items()}
+        self._free.put(slot)
+        return batch
+
+    def put(self, batch: Dict[str, np.ndarray], timeout: Optional[float] = None):
+        """
+        Copy batch into a free slot and commit it
+        """
+        slot = self.acquire(timeout)
+        for name, array in self.arrays.items():
+            array[slot] = batch[name]
+        self.commit(slot)
+
+
+class SharedWeights:
+    def __init__(self, net: nn.Module, ctx: Optional[multiprocessing.context.BaseContext] = None):
+        """
+        The parameters of net, flattened into shared memory with a version
+        number that publish() increments
+
+        :param net: network whose parameters are shared, only its shapes are used here
+        """
+        ctx = ctx or multiprocessing.get_context()
+        self.size = sum(p.numel() for p in net.parameters())
+        self._raw = ctx.RawArray('f', self.size)
+        self._version = ctx.Value('q', 0, lock=False)
+        self._lock = ctx.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def publish(self, net: nn.Module):
+        vector = parameters_to_vector(net.parameters()).detach().float().cpu().numpy()
+        with self._lock:
+            np.frombuffer(self._raw, dtype=np.float32)[:] = vector
+            self._version.value += 1
+
+    def pull(self, net: nn.Module, version: int) -> int:
+        """
+        Load the published parameters into net if they're newer than version
+
+        :return: version of the parameters net now has
+        """
+        if self._version.value == version:
+            return version
+        with self._lock:
+            vector = torch.from_numpy(np.frombuffer(self._raw, dtype=np.float32).copy())
+            version = self._version.value
+        with torch.no_grad():
+            vector_to_parameters(vector, net.parameters())
+        return version
+
+
+def slot_layout(n_steps: int, num_envs: int, obs_size: int, n_words: int, max_turns: int,
+                mask_actions: bool) -> Layout:
+    """
+    :return: layout of one batch of n_steps * num_envs samples and the games that ended in it
+    """
+    size = n_steps * num_envs
+    layout = {
+        "states": ((size, obs_size), wordle.state.DTYPE),
+        "actions": ((size,), np.int64),
+        "dones": ((size,), np.bool_),
+        "returns": ((size,), np.float32),
+        "targets": ((size,), np.int64),
+        # Every game takes at least one step, so at most size of them end in a batch
+        "n_episodes": ((1,), np.int64),
+        "episode_won": ((size,), np.bool_),
+        "episode_goal": ((size,), np.int64),
+        "episode_turns": ((size,), np.int64),
+        "episode_reward": ((size,), np.float32),
+        "episode_actions": ((size, max_turns), np.int64),
+    }
+    if mask_actions:
+        layout["action_masks"] = ((size, n_words), np.bool_)
+    return layout
+
+
+class Actor:
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Plays batches the way AdvantageActorCritic.train_batch_vec does, without the learner
+
+        :param config: see AdvantageActorCritic._actor_config
+        """
+        self.config = config
+        env = gym.make(config["env"])
+        if config["mask_actions"]:
+            env.unwrapped.track_candidates = True
+        self.vec_env = WordleVecEnv(env, config["num_envs"])
+        self.net = a2c.construct(
+            config["network_name"],
+            obs_size=self.vec_env.observation_space.shape[0],
+            n_hidden=config["n_hidden"],
+            hidden_size=config["hidden_size"],
+            word_list=self.vec_env.words)
+        self.net.requires_grad_(False)
+        self.agent = ActorCriticAgent(self.net)
+        self.version = 0
+
+        n_envs = self.vec_env.num_envs
+        self.states = self.vec_env.reset()
+        self._cheat_words = np.full(n_envs, -1)
+        self._episode_rewards = np.zeros(n_envs)
+        self._actions = np.zeros((n_envs, self.vec_env.max_turns), dtype=np.int64)
+        self._recent_losing_words = collections.deque(maxlen=1000)
+
+    def _replay_lost_word(self) -> Tuple[Optional[int], Optional[int]]:
+        # Same as AdvantageActorCritic._replay_lost_word, from the games this actor lost
+        if len(self._recent_losing_words) > 0:
+            if np.random.random() < self.config["prob_play_lost_word"]:
+                goal_id = self._recent_losing_words[int(np.random.random() * len(self._recent_losing_words))]
+                cheat_word = goal_id if np.random.random() < self.config["prob_cheat"] else None
+                return goal_id, cheat_word
+        return None, None
+
+    def play(self, out: Dict[str, np.ndarray]):
+        """
+        Play one batch into out, arrays of a slot_layout
+        """
+        n_envs = self.vec_env.num_envs
+        n_steps = self.config["n_steps"]
+        max_turns = self.vec_env.max_turns
+        rows = np.arange(n_envs)
+        states = out["states"].reshape(n_steps, n_envs, -1)
+        actions_out = out["actions"].reshape(n_steps, n_envs)
+        targets = out["targets"].reshape(n_steps, n_envs)
+        rewards = np.empty((n_steps, n_envs), dtype=np.float32)
+        dones = np.empty((n_steps, n_envs), dtype=np.bool_)
+        action_masks = out["action_masks"].reshape(n_steps, n_envs, -1) if "action_masks" in out else None
+        n_episodes = 0
+
+        states[0] = self.states
+        for t in range(n_steps):
+            masks = self.vec_env.action_masks() if action_masks is not None else None
+            actions = np.array(self.agent(states[t], "cpu", masks), dtype=np.int64)
+            cheat = (states[t, :, 0] == 1) & (self._cheat_words >= 0)
+            actions[cheat] = self._cheat_words[cheat]
+
+            turns = max_turns - states[t, :, 0].astype(np.int64) + 1
+            self._actions[rows, turns - 1] = actions
+
+            # Written straight into the slot, the last step's start the next batch
+            next_states = states[t + 1] if t + 1 < n_steps else self.states
+            _, step_rewards, step_dones, aux = self.vec_env.step(actions, out=next_states)
+
+            actions_out[t] = actions
+            rewards[t] = step_rewards
+            dones[t] = step_dones
+            targets[t] = aux['goal_id']
+            if action_masks is not None:
+                action_masks[t] = masks
+
+            self._episode_rewards += step_rewards
+
+            for i in np.flatnonzero(step_dones):
+                goal_id = int(aux['goal_id'][i])
+                won = actions[i] == goal_id
+                out["episode_won"][n_episodes] = won
+                out["episode_goal"][n_episodes] = goal_id
+                out["episode_turns"][n_episodes] = turns[i]
+                out["episode_reward"][n_episodes] = self._episode_rewards[i]
+                out["episode_actions"][n_episodes] = self._actions[i]
+                n_episodes += 1
+                if not won:
+                    self._recent_losing_words.append(goal_id)
+
+                goal_id, cheat_word = self._replay_lost_word()
+                if goal_id is not None:
+                    self.vec_env.set_goal_id(i, goal_id)
+                self._cheat_words[i] = -1 if cheat_word is None else cheat_word
+                self._episode_rewards[i] = 0
+
+        with torch.no_grad():
+            _, last_values = self.net(torch.as_tensor(self.states))
+        out["dones"][:] = dones.reshape(-1)
+        out["returns"][:] = discounted_returns(rewards, dones, last_values.numpy().reshape(-1),
+                                               self.config["gamma"]).reshape(-1)
+        out["n_episodes"][0] = n_episodes
+
+
+def run_actor(index: int, config: Dict[str, Any], weights: SharedWeights, buffer: SharedRingBuffer, stop):
+    """
+    Entry point of an actor process, plays into buffer until stop is set
+
+    :param index: actor number, seeds its random numbers
+    :param config: see AdvantageActorCritic._actor_config
+    :param weights: policy parameters published by the learner
+    :param buffer: ring buffer of slot_layout slots to fill
+    :param stop: multiprocessing.Event
+    """
+    # Actors share the cores with each other and the learner
+    torch.set_num_threads(1)
+    np.random.seed(config["seed"] + index)
+    torch.manual_seed(config["seed"] + index)
+    actor = Actor(config)
+    while not stop.is_set():
+        actor.version = weights.pull(actor.net, actor.version)
+        try:
+            slot = buffer.acquire(timeout=0.1)
+        except queue.Empty:
+            continue
+        actor.play({name: array[slot] for name, array in buffer.arrays.items()})
+        buffer.commit(slot)
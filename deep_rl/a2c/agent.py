@@ -1,25 +1,34 @@
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 import torch
 from torch import nn
 from torch.distributions import Categorical
 
+
+def _as_mask(mask: Optional[np.ndarray], device: str) -> Optional[torch.Tensor]:
+    if mask is None:
+        return None
+    return torch.as_tensor(np.atleast_2d(mask), device=device)
+
+
 class ActorCriticAgent:
     """Actor-Critic based agent that returns an action based on the networks policy."""
 
     def __init__(self, net):
         self.net = net
 
-    def __call__(self, states: torch.Tensor, device: str) -> List[int]:
+    def __call__(self, states: torch.Tensor, device: str, mask: Optional[np.ndarray] = None) -> List[int]:
         """Takes in the current state and returns the action based on the agents policy.
         Args:
-            states: current state of the environment
+            states: current state of the environment, or a (N, obs) batch of states
             device: the device used for the current batch
+            mask: legal actions for each state, see WordleEnvBase.action_mask, or None if all are legal
         Returns:
             action defined by policy
         """
-        logprobs, _ = self.net(torch.tensor([states], device=device))
+        with torch.no_grad():
+            logprobs, _ = self.net(torch.as_tensor(np.atleast_2d(states), device=device), _as_mask(mask, device))
         probabilities = logprobs.exp().squeeze(dim=-1)
         prob_np = probabilities.data.cpu().numpy()
 
@@ -28,12 +37,10 @@ class ActorCriticAgent:
         cdf = np.cumsum(prob_np, axis=1)
         cdf[:, -1] = 1.  # Ensure cumsum adds to 1
         select = np.random.random(cdf.shape[0])
-        actions = [
-            np.searchsorted(cdf[row, :], select[row])
-            for row in range(cdf.shape[0])
-        ]
+        # Same as np.searchsorted on each row, done for the whole batch at once
+        actions = (cdf < select[:, None]).sum(axis=1)
 
-        return actions
+        return list(actions)
 
 class ActorCategorical(nn.Module):
     """Policy network, for discrete action spaces, which returns a distribution and an action given an
@@ -48,8 +55,8 @@ class ActorCategorical(nn.Module):
 
         self.actor_net = actor_net
 
-    def forward(self, states):
-        logits = self.actor_net(states)
+    def forward(self, states, mask=None):
+        logits = self.actor_net(states, mask)
         pi = Categorical(logits=logits)
         actions = pi.sample()
 
@@ -60,15 +67,17 @@ class GreedyActorCriticAgent:
     def __init__(self, net):
         self.net = net
 
-    def __call__(self, states: torch.Tensor, device: str) -> List[int]:
+    def __call__(self, states: torch.Tensor, device: str, mask: Optional[np.ndarray] = None) -> List[int]:
         """Takes in the current state and returns the action based on the agents policy.
         Args:
-            states: current state of the environment
+            states: current state of the environment, or a (N, obs) batch of states
             device: the device used for the current batch
+            mask: legal actions for each state, see WordleEnvBase.action_mask, or None if all are legal
         Returns:
             action defined by policy
         """
-        logprobs, _ = self.net(torch.tensor([states], device=device))
+        with torch.no_grad():
+            logprobs, _ = self.net(torch.as_tensor(np.atleast_2d(states), device=device), _as_mask(mask, device))
         probabilities = logprobs.exp().squeeze(dim=-1)
         prob_np = probabilities.data.cpu().numpy()
 
@@ -1,7 +1,9 @@
 import collections
+import multiprocessing
+import queue
 from argparse import ArgumentParser
 from collections import OrderedDict
-from typing import Any, List, Tuple, Iterator
+from typing import Any, Dict, List, Tuple, Iterator, Optional
 import wandb
 
 import gym
@@ -14,11 +16,16 @@ from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 
 import a2c
+import a2c.actors
+import wordle.envs  # registers the envs with gym
 import wordle.state
+from common.experience_log import ExperienceLog
+from common.returns import discounted_returns
+from common.rollout import RolloutBuffer
 from a2c.agent import ActorCriticAgent
 from a2c.experience import ExperienceSourceDataset, Experience
+from wordle.vec import WordleVecEnv
 
-import h5py
 
 class AdvantageActorCritic(LightningModule):
     """PyTorch Lightning implementation of `Advantage Actor Critic <https://arxiv.org/abs/1602.01783v2>`_.
@@ -43,6 +50,10 @@ class AdvantageActorCritic(LightningModule):
             prob_play_lost_word: float=0.,
             prob_cheat: float=0.,
             weight_decay: float=0.,
+            num_envs: int=1,
+            mask_actions: bool=False,
+            num_actors: int=0,
+            actor_sync_interval: int=10,
             evaluate: bool=False,
             **kwargs: Any,
     ) -> None:
@@ -57,6 +68,11 @@ class AdvantageActorCritic(LightningModule):
             entropy_beta: dictates the level of entropy per batch
             critic_beta: dictates the level of critic loss per batch
             epoch_len: how many batches before pseudo epoch
+            num_envs: how many games to play in lockstep when filling a batch, must divide batch_size
+            mask_actions: only let the policy pick words that can still be the goal
+            num_actors: play the games in this many separate processes instead of the training loop, see a2c.actors
+            actor_sync_interval: with num_actors, how many batches the learner consumes between weight refreshes
+                of the actors
         """
         super().__init__()
 
@@ -94,22 +110,51 @@ class AdvantageActorCritic(LightningModule):
         self._recent_losing_words = collections.deque(maxlen=1000)
         self._cheat_word = None
 
+        if mask_actions:
+            # Legal actions are the remaining candidates, which the env has to track
+            self.env.unwrapped.track_candidates = True
+
         self.state = self.env.reset()
 
-        # For collecting data
-        self._num_batches_before_clear = 10
-        self._resize_dset = False
-        self._data = {"states": [], "actions": [], "dones": [], "returns": [], "targets" : []}
+        assert batch_size % num_envs == 0, f'batch_size {batch_size} not divisible by num_envs {num_envs}'
+        self.vec_env = None
+        # With num_actors > 0 only the actor processes play, each with its own vec env
+        if num_envs > 1 and num_actors == 0:
+            self.vec_env = WordleVecEnv(self.env, num_envs)
+            self.vec_states = self.vec_env.reset()
+            self._vec_cheat_words = np.full(num_envs, -1)
+            self._vec_episode_rewards = np.zeros(num_envs)
+            self._vec_actions = np.zeros((num_envs, self.vec_env.max_turns), dtype=np.int64)
+
+        self._actor_processes = []
+
+        self._rollout = None
+        if num_actors == 0:
+            layout = {
+                "states": (self.state.shape, self.state.dtype),
+                "actions": ((), np.int64),
+                "rewards": ((), np.float32),
+                "dones": ((), np.bool_),
+                "targets": ((), np.int64),
+                "returns": ((), np.float32),
+            }
+            if mask_actions:
+                layout["action_masks"] = ((len(self.env.words),), np.bool_)
+            self._rollout = RolloutBuffer(batch_size // num_envs, num_envs, layout)
 
-        # Create the hd5 file
+        # For collecting data, written to the hdf5 file every 10 batches in the background
+        self._experience_log = None
         if not evaluate:
-            file_name = "./data/a2c/" + self.env_str + ".hdf5"
-            with h5py.File(file_name, 'w') as f:
-                states_dset = f.create_dataset("states", (self._num_batches_before_clear * batch_size, self.state.shape[0]), maxshape=(None, 417),dtype=np.uint, compression="gzip", compression_opts=9)
-                actions_dset = f.create_dataset("actions", (self._num_batches_before_clear * batch_size,), maxshape=(None,),dtype=np.uint, compression="gzip", compression_opts=9)
-                dones_dset = f.create_dataset("dones", (self._num_batches_before_clear * batch_size,), maxshape=(None,),dtype=np.bool_, compression="gzip", compression_opts=9)
-                returns_dset = f.create_dataset("returns", (self._num_batches_before_clear * batch_size,), maxshape=(None,),dtype=np.float, compression="gzip", compression_opts=9)
-                targets_dset = f.create_dataset("targets", (self._num_batches_before_clear * batch_size,), maxshape=(None,),dtype=np.uint, compression="gzip", compression_opts=9)
+            self._experience_log = ExperienceLog(
+                "./data/a2c/" + self.env_str + ".hdf5",
+                {
+                    "states": (self.state.shape, wordle.state.DTYPE),
+                    "actions": ((), np.int64),
+                    "dones": ((), np.bool_),
+                    "returns": ((), np.float32),
+                    "targets": ((), np.int64),
+                },
+                flush_rows=10 * batch_size)
 
 
     def forward(self, x: Tensor) -> Tuple[Tensor, Tensor]:
@@ -126,121 +171,272 @@ class AdvantageActorCritic(LightningModule):
         # if not isinstance(x, Tensor):
         #     x = torch.tensor(x, device=self.device)
         #
-        logprobs, values = self.net(torch.tensor([x], device=self.device))
+        logprobs, values = self.net(torch.as_tensor(x[None], device=self.device))
         return logprobs, values
 
-    def train_batch(self) -> Iterator[Tuple[np.ndarray, int, Tensor]]:
+    def train_batch(self) -> Iterator[Tuple[Tensor, ...]]:
         """Contains the logic for generating a new batch of data to be passed to the DataLoader.
         Returns:
-            yields a tuple of Lists containing tensors for
-            states, actions, and returns of the batch.
+            yields a tuple of tensors for the states, actions, returns and goal ids of the batch.
         Note:
-            This is what's taken by the dataloader:
-            states: a list of numpy array
-            actions: a list of list of int
-            returns: a torch tensor
+            This is what's taken by the dataloader, whole batches written in place into ``self._rollout``:
+            states: tensor of shape (batch_size, state dimension)
+            actions: tensor of shape (batch_size, )
+            returns: tensor of shape (batch_size, )
+            with mask_actions, also the legal action mask of each state
         """
+        if self.hparams.num_actors > 0:
+            yield from self.train_batch_actors()
+            return
+
+        if self.vec_env is not None:
+            yield from self.train_batch_vec()
+            return
+
         while True:
-            batch_states = []
-            batch_actions = []
-            batch_rewards = []
-            batch_masks = []
-            batch_targets = []
-            for _ in range(self.hparams.batch_size):
-                action = self.agent(self.state, self.device)[0]
+            batch = self._rollout.next()
+            for t in range(self.hparams.batch_size):
+                action_mask = self.env.action_mask() if self.hparams.mask_actions else None
+                action = self.agent(self.state, self.device, action_mask)[0]
                 if wordle.state.remaining_steps(self.state) == 1 and self._cheat_word:
                     action = self._cheat_word
 
                 next_state, reward, done, aux = self.env.step(action)
 
-                batch_states.append(self.state)
-                batch_actions.append(action)
-                batch_rewards.append(reward)
-                batch_masks.append(done)
-                batch_targets.append(aux['goal_id'])
+                batch["states"][t, 0] = self.state
+                batch["actions"][t, 0] = action
+                batch["rewards"][t, 0] = reward
+                batch["dones"][t, 0] = done
+                batch["targets"][t, 0] = aux['goal_id']
+                if action_mask is not None:
+                    batch["action_masks"][t, 0] = action_mask
 
-                self._seq.append(Experience(self.state.copy(), action, reward, aux['goal_id']))
+                self._seq.append(Experience(None, action, reward, aux['goal_id']))
                 self.state = next_state
                 self.episode_reward += reward
 
                 if done:
-                    if action == self.env.goal_word:
-                        self._winning_steps += self.env.max_turns - wordle.state.remaining_steps(self.state)
-                        self._wins += 1
-                        self._winning_rewards += self.episode_reward
-                        self._last_win = self._seq
-                    else:
-                        self._losses += 1
-                        self._last_loss = self._seq
-                        self._recent_losing_words.append(aux['goal_id'])
+                    self._end_episode(
+                        won=action == self.env.goal_word,
+                        goal_id=aux['goal_id'],
+                        turns=self.env.max_turns - wordle.state.remaining_steps(self.state),
+                        episode_reward=self.episode_reward,
+                        seq=self._seq)
                     self._seq = []
-                    self._total_rewards += self.episode_reward
 
-                    self.done_episodes += 1
-                    # With some probability, override the word with one that we lost recently
                     self.state = self.env.reset()
-                    self._cheat_word = None
-                    if len(self._recent_losing_words) > 0:
-                        if np.random.random() < self.hparams.prob_play_lost_word:
-                            lost_idx = int(np.random.random()*len(self._recent_losing_words))
-                            self.env.set_goal_id(self._recent_losing_words[lost_idx])
-                            if np.random.random() < self.hparams.prob_cheat:
-                                self._cheat_word = self._recent_losing_words[lost_idx]
+                    goal_id, self._cheat_word = self._replay_lost_word()
+                    if goal_id is not None:
+                        self.env.set_goal_id(goal_id)
 
                     self.episode_reward = 0
 
             _, last_value = self.forward(self.state)
 
-            returns = self.compute_returns(batch_rewards, batch_masks, last_value)
-
-            self._data["states"].extend(batch_states)
-            self._data["actions"].extend(batch_actions)
-            self._data["dones"].extend(batch_masks)
-            self._data["returns"].extend(list(returns.numpy()))
-            self._data["targets"].extend(batch_targets)
-
-            if len(self._data["actions"]) >= self._num_batches_before_clear * len(batch_actions):
-                
-                length = len(self._data["actions"])
-
-                file_name = "./data/a2c/" + self.env_str + ".hdf5"
-                with h5py.File(file_name, 'a') as f:
-
-                    states_dset = f["states"]
-                    actions_dset = f["actions"]
-                    dones_dset = f["dones"]
-                    returns_dset = f["returns"]
-                    targets_dset = f["targets"]
-
-                    curr_size = states_dset.shape[0]
-
-                    if self._resize_dset:
-                        states_dset.resize(curr_size + length, axis=0)
-                        actions_dset.resize(curr_size + length, axis=0)
-                        dones_dset.resize(curr_size + length, axis=0)
-                        returns_dset.resize(curr_size + length, axis=0)
-                        targets_dset.resize(curr_size + length, axis=0)
-
-                        states_dset[curr_size:, :] = self._data["states"]
-                        actions_dset[curr_size:] = self._data["actions"]
-                        dones_dset[curr_size:] = self._data["dones"]
-                        returns_dset[curr_size:] = self._data["returns"]
-                        targets_dset[curr_size:] = self._data["targets"]
-
-                    else:
-                        self._resize_dset = True
-                        states_dset[:, :] = self._data["states"]
-                        actions_dset[:] = self._data["actions"]
-                        dones_dset[:] = self._data["dones"]
-                        returns_dset[:] = self._data["returns"]
-                        targets_dset[:] = self._data["targets"]
-
-                # Free up memory
-                for k in self._data:
-                    self._data[k] = []
-
-            for idx in range(self.hparams.batch_size):
-                yield batch_states[idx], batch_actions[idx], returns[idx], batch_targets[idx]
+            batch["returns"][:, 0] = self.compute_returns(batch["rewards"][:, 0], batch["dones"][:, 0], last_value)
+
+            yield self._serve_rollout()
+
+    def train_batch_vec(self) -> Iterator[Tuple[Tensor, ...]]:
+        """Same as train_batch, but fills the batch by stepping ``num_envs`` games in lockstep with one batched
+        forward pass per turn. Samples are ordered turn by turn, so consecutive samples come from different games.
+        """
+        n_envs = self.vec_env.num_envs
+        n_steps = self.hparams.batch_size // n_envs
+        max_turns = self.vec_env.max_turns
+        rows = np.arange(n_envs)
+
+        while True:
+            batch = self._rollout.next()
+            states = batch["states"]
+            states[0] = self.vec_states
+            for t in range(n_steps):
+                action_masks = self.vec_env.action_masks() if self.hparams.mask_actions else None
+                actions = np.array(self.agent(states[t], self.device, action_masks), dtype=np.int64)
+                cheat = (states[t, :, 0] == 1) & (self._vec_cheat_words >= 0)
+                actions[cheat] = self._vec_cheat_words[cheat]
+
+                turns = max_turns - states[t, :, 0].astype(np.int64) + 1
+                self._vec_actions[rows, turns - 1] = actions
+
+                # Written straight into the rollout, the last step's start the next one
+                next_states = states[t + 1] if t + 1 < n_steps else self.vec_states
+                _, rewards, dones, aux = self.vec_env.step(actions, out=next_states)
+
+                batch["actions"][t] = actions
+                batch["rewards"][t] = rewards
+                batch["dones"][t] = dones
+                batch["targets"][t] = aux['goal_id']
+                if action_masks is not None:
+                    batch["action_masks"][t] = action_masks
+
+                self._vec_episode_rewards += rewards
+
+                for i in np.flatnonzero(dones):
+                    goal_id = int(aux['goal_id'][i])
+                    self._end_episode(
+                        won=actions[i] == goal_id,
+                        goal_id=goal_id,
+                        turns=turns[i],
+                        episode_reward=self._vec_episode_rewards[i],
+                        seq=[Experience(None, int(a), None, goal_id) for a in self._vec_actions[i, :turns[i]]])
+
+                    goal_id, cheat_word = self._replay_lost_word()
+                    if goal_id is not None:
+                        self.vec_env.set_goal_id(i, goal_id)
+                    self._vec_cheat_words[i] = -1 if cheat_word is None else cheat_word
+                    self._vec_episode_rewards[i] = 0
+
+            _, last_values = self.net(torch.as_tensor(self.vec_states, device=self.device))
+            # Every column at once, the games within a column are separated by their dones
+            batch["returns"][:] = discounted_returns(
+                batch["rewards"], batch["dones"], last_values.detach().reshape(-1).cpu().numpy(), self.hparams.gamma)
+
+            yield self._serve_rollout()
+
+    def _serve_rollout(self) -> Tuple[Tensor, ...]:
+        """Log the rollout just played into ``self._rollout`` and return it as one batch of tensors sharing its
+        memory."""
+        self._save_data(*(self._rollout.flat(name) for name in ("states", "actions", "dones", "returns", "targets")))
+        names = ["states", "actions", "returns", "targets"]
+        if self.hparams.mask_actions:
+            names.append("action_masks")
+        batch, = self._rollout.minibatches(names, len(self._rollout))
+        return batch
+
+    def train_batch_actors(self) -> Iterator[Tuple[Tensor, ...]]:
+        """Same as train_batch_vec, but the games are played by ``num_actors`` processes, each stepping
+        ``num_envs`` games with its own copy of the policy, and this only consumes the batches they play. The
+        actors' copies are refreshed every ``actor_sync_interval`` batches. Lost words are replayed by the actor
+        that lost them.
+        """
+        self._start_actors()
+        try:
+            consumed = 0
+            while True:
+                if consumed and consumed % self.hparams.actor_sync_interval == 0:
+                    self._actor_weights.publish(self.net)
+                batch = self._next_actor_batch()
+                consumed += 1
+
+                for i in range(int(batch["n_episodes"][0])):
+                    goal_id = int(batch["episode_goal"][i])
+                    turns = int(batch["episode_turns"][i])
+                    self._end_episode(
+                        won=bool(batch["episode_won"][i]),
+                        goal_id=goal_id,
+                        turns=turns,
+                        episode_reward=float(batch["episode_reward"][i]),
+                        seq=[Experience(None, int(a), None, goal_id) for a in batch["episode_actions"][i, :turns]])
+
+                self._save_data(batch["states"], batch["actions"], batch["dones"], batch["returns"], batch["targets"])
+
+                names = ["states", "actions", "returns", "targets"]
+                if self.hparams.mask_actions:
+                    names.append("action_masks")
+                # The batch is already a copy of the actor's slot, the tensors can share its memory
+                yield tuple(torch.from_numpy(batch[name]) for name in names)
+        finally:
+            self._stop_actors()
+
+    def _next_actor_batch(self) -> Dict[str, np.ndarray]:
+        """Wait for the next batch from the actors, failing as soon as any one of them has exited."""
+        while True:
+            try:
+                return self._actor_buffer.get(timeout=1.)
+            except queue.Empty:
+                dead = [process for process in self._actor_processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Actor process exited with code {dead[0].exitcode}")
+
+    def _actor_config(self) -> Dict[str, Any]:
+        """Everything an actor process needs to play like this module, see a2c.actors.Actor."""
+        return {
+            "env": self.env_str,
+            "network_name": self.hparams.network_name,
+            "n_hidden": self.hparams.n_hidden,
+            "hidden_size": self.hparams.hidden_size,
+            "num_envs": self.hparams.num_envs,
+            "n_steps": self.hparams.batch_size // self.hparams.num_envs,
+            "gamma": self.hparams.gamma,
+            "mask_actions": self.hparams.mask_actions,
+            "prob_play_lost_word": self.hparams.prob_play_lost_word,
+            "prob_cheat": self.hparams.prob_cheat,
+            # Follows seed_everything
+            "seed": int(np.random.randint(2**31 - self.hparams.num_actors)),
+        }
+
+    def _start_actors(self) -> None:
+        """Start the actor processes with the current weights of the network."""
+        self._stop_actors()
+        ctx = multiprocessing.get_context()
+        config = self._actor_config()
+        layout = a2c.actors.slot_layout(
+            config["n_steps"], config["num_envs"], self.env.observation_space.shape[0], len(self.env.words),
+            self.env.unwrapped.max_turns, config["mask_actions"])
+        # Two slots per actor, so an actor can play its next batch while the learner reads its last one
+        self._actor_buffer = a2c.actors.SharedRingBuffer(2 * self.hparams.num_actors, layout, ctx)
+        self._actor_weights = a2c.actors.SharedWeights(self.net, ctx)
+        self._actor_weights.publish(self.net)
+        self._actor_stop = ctx.Event()
+        self._actor_processes = [
+            ctx.Process(target=a2c.actors.run_actor,
+                        args=(i, config, self._actor_weights, self._actor_buffer, self._actor_stop),
+                        daemon=True)
+            for i in range(self.hparams.num_actors)
+        ]
+        for process in self._actor_processes:
+            process.start()
+
+    def _stop_actors(self) -> None:
+        if not self._actor_processes:
+            return
+        self._actor_stop.set()
+        for process in self._actor_processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._actor_processes = []
+
+    def _end_episode(self, won: bool, goal_id: int, turns: int, episode_reward: float, seq: List[Experience]) -> None:
+        """Update the win/loss metrics with a finished game."""
+        if won:
+            self._winning_steps += turns
+            self._wins += 1
+            self._winning_rewards += episode_reward
+            self._last_win = seq
+        else:
+            self._losses += 1
+            self._last_loss = seq
+            self._recent_losing_words.append(goal_id)
+        self._total_rewards += episode_reward
+
+        self.done_episodes += 1
+
+    def _replay_lost_word(self) -> Tuple[Optional[int], Optional[int]]:
+        """With some probability, override the goal of the next game with one that we lost recently.
+        Returns:
+            goal id to play next (None for a random goal) and the word to cheat with on the last turn (or None)
+        """
+        if len(self._recent_losing_words) > 0:
+            if np.random.random() < self.hparams.prob_play_lost_word:
+                lost_idx = int(np.random.random()*len(self._recent_losing_words))
+                goal_id = self._recent_losing_words[lost_idx]
+                cheat_word = None
+                if np.random.random() < self.hparams.prob_cheat:
+                    cheat_word = goal_id
+                return goal_id, cheat_word
+        return None, None
+
+    def _save_data(self, states, actions, dones, returns, targets) -> None:
+        """Hand a batch of experience to the experience log, which copies it."""
+        if self._experience_log is not None:
+            self._experience_log.write(states=states, actions=actions, dones=dones, returns=returns, targets=targets)
+
+    def on_train_end(self) -> None:
+        """Write the experience played so far to the hdf5 file and close it."""
+        if self._experience_log is not None:
+            self._experience_log.close()
 
     def compute_returns(
             self,
@@ -256,23 +452,17 @@ class AdvantageActorCritic(LightningModule):
         Returns:
             tensor of discounted rewards
         """
-        g = last_value
-        returns = []
-
-        for r, d in zip(rewards[::-1], dones[::-1]):
-            g = r + self.hparams.gamma * g * (1 - d)
-            returns.append(g)
-
-        # reverse list and stop the gradients
-        returns = torch.tensor(returns[::-1])
-
-        return returns
+        if isinstance(last_value, Tensor):
+            last_value = last_value.detach().item()
+        returns = discounted_returns(np.asarray(rewards), np.asarray(dones), last_value, self.hparams.gamma)
+        return torch.from_numpy(returns).float()
 
     def loss(
             self,
             states: Tensor,
             actions: Tensor,
             returns: Tensor,
+            action_masks: Optional[Tensor] = None,
     ) -> Tensor:
         """Calculates the loss for A2C which is a weighted sum of actor loss (MSE), critic loss (PG), and entropy
         (for exploration)
@@ -280,9 +470,10 @@ class AdvantageActorCritic(LightningModule):
             states: tensor of shape (batch_size, state dimension)
             actions: tensor of shape (batch_size, )
             returns: tensor of shape (batch_size, )
+            action_masks: boolean tensor of shape (batch_size, n_actions) of legal actions, or None
         """
 
-        logprobs, values = self.net(states)
+        logprobs, values = self.net(states, action_masks)
 
         # calculates (normalized) advantage
         with torch.no_grad():
@@ -313,10 +504,11 @@ class AdvantageActorCritic(LightningModule):
         Args:
             batch: a batch of (states, actions, returns)
         """
-        states, actions, returns, goal_ids = batch
+        states, actions, returns, goal_ids, *action_masks = batch
+        action_masks = action_masks[0] if action_masks else None
 
         # Compute loss to backprop
-        loss = self.loss(states, actions, returns)
+        loss = self.loss(states, actions, returns, action_masks)
 
         if self.global_step % 50 == 0:
             metrics = {
@@ -392,7 +584,8 @@ class AdvantageActorCritic(LightningModule):
     def _dataloader(self) -> DataLoader:
         """Initialize the Replay Buffer dataset used for retrieving experiences."""
         dataset = ExperienceSourceDataset(self.train_batch)
-        dataloader = DataLoader(dataset=dataset, batch_size=self.hparams.batch_size)
+        # train_batch yields whole batches
+        dataloader = DataLoader(dataset=dataset, batch_size=None)
         return dataloader
 
     def train_dataloader(self) -> DataLoader:
@@ -427,6 +620,10 @@ class AdvantageActorCritic(LightningModule):
         arg_parser.add_argument("--prob_play_lost_word", type=float, default=0, help="Probabiilty of replaying a losing word")
         arg_parser.add_argument("--prob_cheat", type=float, default=0, help="Probability of cheating when playing lost word")
         arg_parser.add_argument("--weight_decay", type=float, default=0., help="Optimizer weight decay regularization.")
+        arg_parser.add_argument("--num_envs", type=int, default=1, help="Number of games to step in lockstep per batch")
+        arg_parser.add_argument("--mask_actions", action="store_true", help="Only sample words that can still be the goal")
+        arg_parser.add_argument("--num_actors", type=int, default=0, help="Number of processes playing games for the learner, 0 to play in the training loop")
+        arg_parser.add_argument("--actor_sync_interval", type=int, default=10, help="Batches between refreshes of the actors' weights")
 
         arg_parser.add_argument(
             "--avg_reward_len",
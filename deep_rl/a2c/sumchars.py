@@ -1,9 +1,11 @@
 from typing import List
 
-import numpy as np
 import torch
 from torch import nn
 
+from a2c.masking import mask_logits
+from a2c.wordindex import word_index, gather_sum
+
 
 class SumChars(nn.Module):
     def __init__(self, obs_size: int, word_list: List[str], n_hidden: int = 1, hidden_size: int = 256):
@@ -26,25 +28,18 @@ class SumChars(nn.Module):
         layers.append(nn.ReLU())
 
         self.f0 = nn.Sequential(*layers)
-        word_array = np.zeros((word_width, len(word_list)))
-        for i, word in enumerate(word_list):
-            for j, c in enumerate(word):
-                word_array[j*26 + (ord(c) - ord('A')), i] = 1
-        self.words = torch.Tensor(word_array)
+        # W x 5 (position, letter) columns of each word, see wordindex
+        self.register_buffer('word_index', word_index(word_list), persistent=False)
 
         self.actor_head = nn.Linear(word_width, word_width)
         self.critic_head = nn.Linear(word_width, 1)
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
         y = self.f0(x.float())
         a = torch.log_softmax(
-            torch.tensordot(self.actor_head(y),
-                            self.words.to(self.get_device(y)),
-                            dims=((1,), (0,))),
+            mask_logits(
+                gather_sum(self.actor_head(y), self.word_index),
+                mask),
             dim=-1)
         c = self.critic_head(y)
         return a, c
-
-    def get_device(self, batch) -> str:
-        """Retrieve device currently being used by minibatch."""
-        return batch[0].device.index
\ No newline at end of file
@@ -0,0 +1,42 @@
+from typing import List
+
+import torch
+import torch.nn.functional as F
+
+
+def word_index(word_list: List[str]) -> torch.Tensor:
+    """
+    Index form of the one-hot (26*5, W) word matrix.
+
+    Every word has exactly one active (position, letter) column per position, so instead of the dense matrix only
+    the W x 5 column indices j*26 + letter are kept.
+    """
+    return torch.tensor([[j*26 + (ord(c) - ord('A')) for j, c in enumerate(word)] for word in word_list],
+                        dtype=torch.long)
+
+
+def gather_sum(h: torch.Tensor, index: torch.Tensor) -> torch.Tensor:
+    """
+    Equivalent of torch.tensordot(h, dense_words, dims=((1,), (0,))) for the dense one-hot word matrix.
+
+    Args:
+        h: (B, 26*5) scores per (position, letter)
+        index: (W, 5) word index from word_index
+
+    Returns:
+        (B, W) sum of the 5 scores picked out by each word
+    """
+    if h.shape[0] == 1:
+        # embedding_bag is slow for a single row, five index_selects are cheaper there
+        return sum(h.index_select(1, index[:, j]) for j in range(index.shape[1]))
+    return F.embedding_bag(index, h.t().contiguous(), mode='sum').t()
+
+
+def gather_linear(linear: torch.nn.Linear, index: torch.Tensor) -> torch.Tensor:
+    """
+    Apply linear to every one-hot word without materializing the words
+
+    Returns:
+        (W, linear.out_features), same as linear(dense_words.t())
+    """
+    return F.embedding_bag(index, linear.weight.t().contiguous(), mode='sum') + linear.bias
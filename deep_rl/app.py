@@ -3,12 +3,37 @@ import os
 import flask
 
 import a2c.play
+from serving.batcher import MicroBatcher
+from serving.book import OpeningBook
+from serving.cache import LRUCache, canonical_sequence, model_key
+from serving.sessions import Session, SessionStore
 
 AGENT = None
 ENV = None
+SUGGEST_BATCHER = None
+GOAL_BATCHER = None
+MODEL_KEY = None
+BOOK = None
 
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', '')
 CHECKPOINT_PATH = 'checkpoints/a2c_deployed.ckpt'
+# Exported with export.py, loaded instead of the checkpoint when present
+BUNDLE_PATH = os.environ.get('BUNDLE_PATH', 'data/checkpoints/a2c_deployed_bundle')
+# Serve the bundle's network through TorchScript, see serving.compiled,
+# COMPILED_INFERENCE=optimize also fuses linear+ReLU where the build supports it
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '') not in ('', '0')
+OPTIMIZED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '') == 'optimize'
+# Serve the int8 network, needs a bundle exported with --quantize, see serving.quantized
+QUANTIZED_INFERENCE = os.environ.get('QUANTIZED_INFERENCE', '') not in ('', '0')
+# Built with build_book.py, only used if it matches the loaded checkpoint
+OPENING_BOOK_PATH = os.environ.get('OPENING_BOOK_PATH', 'data/checkpoints/a2c_deployed_book')
+# Requests arriving within BATCH_WINDOW_MS of each other share a forward pass, up to BATCH_MAX_SIZE at once
+BATCH_WINDOW_MS = float(os.environ.get('BATCH_WINDOW_MS', 2))
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 32))
+# Requests still waiting for their batch after BATCH_TIMEOUT_S get a 503
+BATCH_TIMEOUT_S = float(os.environ.get('BATCH_TIMEOUT_S', 30))
+SUGGEST_CACHE = LRUCache(maxsize=int(os.environ.get('SUGGEST_CACHE_SIZE', 10000)))
+SESSIONS = SessionStore(ttl=float(os.environ.get('SESSION_TTL', 600)))
 
 
 app = flask.Flask(__name__, static_folder='../build/', static_url_path='/')
@@ -54,10 +79,15 @@ def wordle_goal(goal_word: str):
         return {"msg": "word is invalid!"}, 400
 
     try:
-        if AGENT is None or ENV is None:
+        if GOAL_BATCHER is None:
             return "Trouble loading model, maybe try again later?", 503
 
-        win, outcomes = a2c.play.goal(AGENT, ENV, goal_word)
+        result = BOOK.goal(goal_word) if BOOK is not None else None
+        if result is None:
+            result = GOAL_BATCHER.submit(goal_word)
+        win, outcomes = result
+    except TimeoutError:
+        return "Too busy, maybe try again later?", 503
     except Exception as e:
         return str(e), 403
     return {
@@ -87,10 +117,12 @@ def suggest():
     ]
 
     try:
-        if AGENT is None or ENV is None:
+        if SUGGEST_BATCHER is None:
             return {"msg": "Trouble loading model, maybe try again later?"}, 503
 
-        suggestion = a2c.play.suggest(AGENT, ENV, sequence=seq)
+        suggestion = _suggest(seq)
+    except TimeoutError:
+        return {"msg": "Too busy, maybe try again later?"}, 503
     except Exception as e:
         print("Caught exception", str(e))
         return str(e), 403
@@ -100,18 +132,129 @@ def suggest():
     }
 
 
-def _startup():
-    global AGENT, ENV
+def _suggest(seq, state=None) -> str:
+    """
+    Suggestion after seq, from the opening book, the cache or the network in that order
+
+    :param seq: (word, mask) history
+    :param state: state after seq if it's already known, otherwise it's rebuilt from seq
+    """
+    suggestion = BOOK.suggest(seq) if BOOK is not None else None
+    if suggestion is not None:
+        return suggestion
+
+    def compute():
+        return SUGGEST_BATCHER.submit(state if state is not None else a2c.play.sequence_state(ENV, seq))
+    return SUGGEST_CACHE.get_or_compute((MODEL_KEY, canonical_sequence(seq)), compute)
+
+
+@app.route('/api/wordle-session', methods=['GET'])
+def new_session():
+    """
+    Start a game whose state is kept server side, see serving.sessions
+    """
+    if SUGGEST_BATCHER is None:
+        return {"msg": "Trouble loading model, maybe try again later?"}, 503
 
-    if not S3_BUCKET_NAME:
-        # Assume we're local
-        url = f'data/{CHECKPOINT_PATH}'
+    try:
+        suggestion = _suggest([])
+    except TimeoutError:
+        return {"msg": "Too busy, maybe try again later?"}, 503
+    session_id = SESSIONS.create(a2c.play.sequence_state(ENV, []))
+    return {
+        "session": session_id,
+        "suggestion": suggestion,
+    }
+
+
+@app.route('/api/wordle-session/<session_id>', methods=['GET'])
+def session_suggest(session_id: str):
+    """
+    Add one (word, mask) move to a session and suggest the next word. A 404
+    means the session expired or lives in another worker, and the client
+    should use /api/wordle-suggest with the whole history instead.
+    """
+    word = flask.request.args.get('word', '')
+    mask = flask.request.args.get('mask', '')
+    if not _word_is_valid(word):
+        return {"msg": "word is invalid!"}, 400
+    if not _validate_mask(mask):
+        return {"msg": "mask is invalid!"}, 400
+
+    session = SESSIONS.get(session_id)
+    if session is None:
+        return {"msg": "session not found"}, 404
+    if len(session.sequence) >= 6:
+        return {"msg": "words are invalid!"}, 400
+
+    move = (word, [int(i) for i in mask])
+    try:
+        state = a2c.play.apply_guess(ENV, session.state, *move)
+        sequence = session.sequence + canonical_sequence([move])
+        session = Session(state, sequence)
+        suggestion = _suggest(session.history(), state)
+    except TimeoutError:
+        return {"msg": "Too busy, maybe try again later?"}, 503
+    except Exception as e:
+        print("Caught exception", str(e))
+        return str(e), 403
+
+    SESSIONS.put(session_id, session)
+    return {
+        "session": session_id,
+        "suggestion": suggestion,
+    }
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    if SUGGEST_BATCHER is None or GOAL_BATCHER is None:
+        return {"msg": "Model not loaded"}, 503
+    return {
+        "suggest": dict(SUGGEST_BATCHER.metrics.snapshot(), queue_depth=SUGGEST_BATCHER.queue_depth()),
+        "goal": dict(GOAL_BATCHER.metrics.snapshot(), queue_depth=GOAL_BATCHER.queue_depth()),
+        "suggest_cache": SUGGEST_CACHE.snapshot(),
+        "book": BOOK.snapshot() if BOOK is not None else None,
+        "sessions": SESSIONS.snapshot(),
+    }
+
+
+def _startup():
+    global AGENT, ENV, SUGGEST_BATCHER, GOAL_BATCHER, MODEL_KEY, BOOK
+
+    if os.path.exists(f'{BUNDLE_PATH}/manifest.json'):
+        # Only imports torch, not Lightning or gym, and the weights are memory
+        # mapped so forked workers share them
+        print(f"Startup: Loading bundle from {BUNDLE_PATH}...")
+        manifest, AGENT, ENV = a2c.play.load_from_bundle(BUNDLE_PATH, compiled=COMPILED_INFERENCE,
+                                                         optimize=OPTIMIZED_INFERENCE,
+                                                         quantized=QUANTIZED_INFERENCE)
+        # The quantized network answers differently, keep its cache and book apart
+        MODEL_KEY = manifest["hash"] + ('-int8' if QUANTIZED_INFERENCE else '')
     else:
-        url = f's3://{S3_BUCKET_NAME}/{CHECKPOINT_PATH}'
-    print(f"Startup: Loading checkpoint from {url}...")
-    _, AGENT, ENV = a2c.play.load_from_checkpoint(url)
+        if not S3_BUCKET_NAME:
+            # Assume we're local
+            url = f'data/{CHECKPOINT_PATH}'
+        else:
+            url = f's3://{S3_BUCKET_NAME}/{CHECKPOINT_PATH}'
+        print(f"Startup: Loading checkpoint from {url}...")
+        _, AGENT, ENV = a2c.play.load_from_checkpoint(url)
+        MODEL_KEY = model_key(AGENT.net)
     print("done!")
     print("Mask Based State Updates:", ENV.mask_based_state_updates)
 
+    SUGGEST_BATCHER = MicroBatcher(lambda states: a2c.play.suggest_states(AGENT, ENV, states),
+                                   max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_WINDOW_MS / 1000,
+                                   timeout=BATCH_TIMEOUT_S)
+    GOAL_BATCHER = MicroBatcher(lambda goal_words: a2c.play.goal_many(AGENT, ENV, goal_words),
+                                max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_WINDOW_MS / 1000,
+                                timeout=BATCH_TIMEOUT_S)
+
+    # Every game starts from the empty history, answer it before the first request
+    SUGGEST_CACHE.put((MODEL_KEY, canonical_sequence([])), a2c.play.suggest(AGENT, ENV, []))
+
+    BOOK = OpeningBook.load(OPENING_BOOK_PATH, MODEL_KEY, ENV.words)
+    print("Opening book:", OPENING_BOOK_PATH if BOOK is not None else None)
+
 
 _startup()
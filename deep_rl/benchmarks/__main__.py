@@ -0,0 +1,32 @@
+"""
+Run every benchmark, writing <name>.json for each to out_dir
+
+python -m benchmarks --out_dir bench/$(git rev-parse --short HEAD)
+
+Compare the files of two commits to spot regressions. rollout needs the
+training stack, skip it with --skip '[rollout]' on an inference only install.
+"""
+import importlib
+import os
+from typing import Optional, Sequence
+
+import fire
+
+from benchmarks.common import write_results
+
+BENCHMARKS = ["env", "inference", "rollout", "server"]
+
+
+def main(out_dir: Optional[str] = None, skip: Sequence[str] = ()):
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    for name in BENCHMARKS:
+        if name in skip:
+            continue
+        print("Running", name, "...")
+        results = importlib.import_module(f'benchmarks.{name}').run()
+        write_results(name, results, f'{out_dir}/{name}.json' if out_dir else None)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
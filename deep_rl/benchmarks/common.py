@@ -0,0 +1,75 @@
+"""
+Helpers shared by the benchmarks
+
+Every benchmark returns a list of result dicts and writes them with
+write_results() as JSON, together with enough about the machine and the
+commit to compare runs against each other.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+
+
+def time_calls(fn: Callable[[], Any], repeat: int = 100, warmup: int = 5) -> Dict[str, float]:
+    """
+    :return: latency percentiles of fn() in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    times *= 1000
+    return {
+        "p50_ms": float(np.percentile(times, 50)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "mean_ms": float(times.mean()),
+        "repeat": repeat,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_results(name: str, results: List[Dict[str, Any]], out: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Print results and, if out is given, write them as JSON to out
+
+    :param name: benchmark name
+    :param results: one dict per measurement
+    :param out: JSON file to write
+    """
+    report = {"benchmark": name, "environment": environment(), "results": results}
+    for result in results:
+        print(json.dumps(result))
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print("Wrote", out)
+    return report
@@ -0,0 +1,123 @@
+"""
+Throughput of the env and of the state updates it's built on
+
+python -m benchmarks.env --out env.json
+
+env_step times whole games of WordleEnvBase.step with random guesses, for
+the plain (wordle.state.update) and mask based (update_mask) paths, and the
+same through WordleVecEnv. state_update times each wordle.state update on
+its own, one guess per call, and update_batch per row.
+"""
+from typing import Any, Dict, List, Optional
+
+import fire
+import numpy as np
+
+import wordle.state
+from benchmarks.common import time_calls, write_results
+from wordle.bitstate import BitState
+from wordle.vec import WordleVecEnv
+from wordle.wordle import WordleEnvBase, _load_words
+
+
+def _games(env: WordleEnvBase, actions: np.ndarray) -> int:
+    """
+    Play random games until actions run out
+
+    :return: number of steps taken
+    """
+    env.reset()
+    for action in actions:
+        _, _, done, _ = env.step(int(action))
+        if done:
+            env.reset()
+    return len(actions)
+
+
+def _vec_steps(vec_env: WordleVecEnv, actions: np.ndarray):
+    for row in actions:
+        vec_env.step(row)
+
+
+def env_step(words: List[str], steps: int, num_envs: int, repeat: int) -> List[Dict[str, Any]]:
+    rng = np.random.RandomState(0)
+    results = []
+    for mask_based in (False, True):
+        path = "update_mask" if mask_based else "update"
+        env = WordleEnvBase(words=words, max_turns=6, mask_based_state_updates=mask_based)
+
+        actions = rng.randint(len(words), size=steps)
+        timing = time_calls(lambda: _games(env, actions), repeat=repeat, warmup=1)
+        results.append(dict(timing, benchmark="env_step", env="WordleEnvBase", path=path, words=len(words),
+                            steps=steps, steps_per_sec=steps * 1000 / timing["mean_ms"]))
+
+        vec_env = WordleVecEnv(env, num_envs)
+        vec_env.reset()
+        vec_actions = rng.randint(len(words), size=(max(1, steps // num_envs), num_envs))
+        timing = time_calls(lambda: _vec_steps(vec_env, vec_actions), repeat=repeat, warmup=1)
+        results.append(dict(timing, benchmark="env_step", env="WordleVecEnv", path=path, words=len(words),
+                            steps=vec_actions.size, num_envs=num_envs,
+                            steps_per_sec=vec_actions.size * 1000 / timing["mean_ms"]))
+    return results
+
+
+def state_update(words: List[str], updates: int, batch_size: int, repeat: int) -> List[Dict[str, Any]]:
+    rng = np.random.RandomState(0)
+    env = WordleEnvBase(words=words, max_turns=6)
+    patterns = env.patterns
+    guesses = rng.randint(len(words), size=updates)
+    goals = rng.randint(len(words), size=updates)
+    pairs = [(words[guess], words[goal]) for guess, goal in zip(guesses, goals)]
+    masks = [patterns.get_mask(word, goal_word) for word, goal_word in pairs]
+    state = wordle.state.new(env.max_turns)
+    bit_state = BitState(env.max_turns)
+
+    updaters = {
+        "update": lambda: [wordle.state.update(state, w, g) for w, g in pairs],
+        "update_mask": lambda: [wordle.state.update_mask(state, w, g, patterns) for w, g in pairs],
+        "update_from_mask": lambda: [wordle.state.update_from_mask(state, w, m) for (w, _), m in zip(pairs, masks)],
+        "bitstate_update": lambda: [bit_state.copy().update(w, g) for w, g in pairs],
+    }
+    results = []
+    for name, fn in updaters.items():
+        timing = time_calls(fn, repeat=repeat, warmup=1)
+        results.append(dict(timing, benchmark="state_update", updater=name, words=len(words), updates=updates,
+                            updates_per_sec=updates * 1000 / timing["mean_ms"]))
+
+    states = np.tile(state, (batch_size, 1))
+    batch_guesses = rng.randint(len(words), size=batch_size)
+    batch_goals = rng.randint(len(words), size=batch_size)
+    for mask_based in (False, True):
+        def update_batch():
+            batch = states.copy()
+            wordle.state.update_batch(batch, batch_guesses, batch_goals, patterns, mask_based=mask_based)
+        timing = time_calls(update_batch, repeat=repeat)
+        results.append(dict(timing, benchmark="state_update",
+                            updater="update_batch_mask" if mask_based else "update_batch",
+                            words=len(words), updates=batch_size,
+                            updates_per_sec=batch_size * 1000 / timing["mean_ms"]))
+    return results
+
+
+def run(n_words: Optional[int] = None,
+        steps: int = 2000,
+        num_envs: int = 64,
+        batch_size: int = 1024,
+        repeat: int = 10) -> List[Dict[str, Any]]:
+    """
+    :param n_words: vocabulary size, the full word list if None
+    :param steps: env steps per measurement
+    :param num_envs: games stepped together by WordleVecEnv
+    :param batch_size: rows per update_batch call
+    :param repeat: timed calls per measurement
+    """
+    words = _load_words(n_words)
+    return env_step(words, steps, num_envs, repeat) + state_update(words, steps, batch_size, repeat)
+
+
+def main(out: Optional[str] = None, **kwargs):
+    write_results("env", run(**kwargs), out)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
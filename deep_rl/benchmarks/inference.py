@@ -0,0 +1,69 @@
+"""
+Forward pass latency of the registered networks, eager, compiled and int8 quantized
+
+python -m benchmarks.inference --out inference.json
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import fire
+import numpy as np
+import torch
+
+import a2c
+import ppo
+import wordle.state
+from benchmarks.common import time_calls, write_results
+from serving.compiled import compile_network
+from serving.quantized import quantize_network
+from wordle.wordle import _load_words
+
+
+PACKAGES = {"a2c": a2c, "ppo": ppo}
+# Every registered network of both packages
+NETWORKS = [(algo, name) for algo, package in PACKAGES.items() for name in package._registry]
+
+
+def run(batch_sizes: Sequence[int] = (1, 16, 256, 4096),
+        n_words: Optional[int] = None,
+        hidden_size: int = 256,
+        repeat: int = 50,
+        compiled: bool = True,
+        quantized: bool = True) -> List[Dict[str, Any]]:
+    """
+    :param batch_sizes: states per forward pass
+    :param n_words: vocabulary size, the full word list if None
+    :param hidden_size: hidden size of the networks
+    :param repeat: timed forward passes per measurement
+    :param compiled: also time serving.compiled networks, with and without optimize
+    :param quantized: also time serving.quantized networks
+    """
+    words = _load_words(n_words)
+    obs_size = len(wordle.state.new(6))
+
+    results = []
+    for algo, name in NETWORKS:
+        torch.manual_seed(0)
+        net = PACKAGES[algo].construct(name, obs_size=obs_size, word_list=words,
+                                       n_hidden=1, hidden_size=hidden_size).eval()
+        modes = {"eager": net}
+        if compiled:
+            modes["compiled"] = compile_network(net, obs_size)
+            modes["optimized"] = compile_network(net, obs_size, optimize=True)
+        if quantized:
+            modes["quantized"] = quantize_network(net)
+        for batch_size in batch_sizes:
+            states = torch.as_tensor(np.tile(wordle.state.new(6), (batch_size, 1)))
+            for mode, model in modes.items():
+                with torch.no_grad():
+                    timing = time_calls(lambda: model(states), repeat=repeat)
+                results.append(dict(timing, algo=algo, network=name, mode=mode, batch_size=batch_size,
+                                    words=len(words), states_per_sec=batch_size * 1000 / timing["mean_ms"]))
+    return results
+
+
+def main(out: Optional[str] = None, **kwargs):
+    write_results("inference", run(**kwargs), out)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
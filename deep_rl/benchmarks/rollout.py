@@ -0,0 +1,93 @@
+"""
+Rollout throughput of A2C and PPO, the sample generators that feed training
+
+python -m benchmarks.rollout --out rollout.json
+
+Batches are pulled from AdvantageActorCritic.train_batch and
+PPO.generate_trajectory_samples exactly as the DataLoader does, including
+the experience logging to hdf5, so this needs the training stack installed.
+The modules write their logs relative to the working directory, so they are
+built inside a temporary directory.
+"""
+import itertools
+import os
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fire
+
+from benchmarks.common import write_results
+
+
+def _pull(batches: Iterator[Tuple], n_samples: int) -> int:
+    pulled = 0
+    while pulled < n_samples:
+        pulled += len(next(batches)[0])
+    return pulled
+
+
+def _samples_per_sec(generate, n_samples: int, warmup: int) -> Dict[str, float]:
+    # PPO's generator ends with each epoch and the DataLoader starts a new one, do the same
+    batches = itertools.chain.from_iterable(generate() for _ in itertools.count())
+    _pull(batches, warmup)
+    start = time.perf_counter()
+    n_samples = _pull(batches, n_samples)
+    elapsed = time.perf_counter() - start
+    return {"samples": n_samples, "seconds": elapsed, "samples_per_sec": n_samples / elapsed}
+
+
+def _a2c(env: str, num_envs: int, batch_size: int, hidden_size: int):
+    from a2c.module import AdvantageActorCritic
+
+    model = AdvantageActorCritic(
+        env=env, network_name="SumChars", gamma=0.9, lr=1e-3, batch_size=batch_size, avg_reward_len=100,
+        n_hidden=1, hidden_size=hidden_size, entropy_beta=0.01, critic_beta=0.5, epoch_len=10, num_envs=num_envs)
+    return model, model.train_batch
+
+
+def _ppo(env: str, num_envs: int, batch_size: int, hidden_size: int):
+    from ppo.module import PPO
+
+    model = PPO(env=env, network_name="SumChars", n_hidden=1, hidden_size=hidden_size,
+                steps_per_epoch=batch_size, num_envs=num_envs, prob_play_lost_word=0., prob_cheat=0.)
+    return model, model.generate_trajectory_samples
+
+
+def run(env: str = "WordleEnv100-v0",
+        num_envs: Sequence[int] = (1, 64),
+        batch_size: int = 512,
+        batches: int = 20,
+        hidden_size: int = 256) -> List[Dict[str, Any]]:
+    """
+    :param env: gym env id to train on
+    :param num_envs: games played in lockstep, 1 for the unvectorized rollout
+    :param batch_size: A2C batch_size and PPO steps_per_epoch, must be divisible by every num_envs
+    :param batches: batches timed after one warmup batch
+    :param hidden_size: hidden size of the networks
+    """
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(f'{tmp}/data/a2c')
+        os.makedirs(f'{tmp}/data/ppo')
+        os.chdir(tmp)
+        try:
+            for algo, build in (("a2c", _a2c), ("ppo", _ppo)):
+                for n in num_envs:
+                    model, generate = build(env, n, batch_size, hidden_size)
+                    rate = _samples_per_sec(generate, batches * batch_size, warmup=batch_size)
+                    # Before the temporary directory it writes to goes
+                    model._experience_log.close()
+                    results.append(dict(rate, algo=algo, env=env, num_envs=n, batch_size=batch_size))
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def main(out: Optional[str] = None, **kwargs):
+    write_results("rollout", run(**kwargs), out)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,147 @@
+"""
+End to end requests/sec of app.py over HTTP
+
+python -m benchmarks.server --out server.json [--bundle data/checkpoints/a2c_deployed_bundle]
+
+The app is served by a threaded werkzeug server on a local port and hit by
+client threads, each request on its own connection. Without a bundle, one
+is exported from a randomly initialised SumChars, the answers are
+meaningless but the work per request is the same. The opening book is off,
+so suggestions come from the cache (the empty history) or the network.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+import fire
+import numpy as np
+import torch
+
+import a2c
+import serving.bundle
+import wordle.state
+from benchmarks.common import write_results
+from wordle.wordle import WordleEnvBase, _load_words
+
+
+def _random_bundle(path: str, n_words: Optional[int], hidden_size: int):
+    words = _load_words(n_words)
+    env = WordleEnvBase(words=words, max_turns=6, allowable_words=min(2315, len(words)))
+    torch.manual_seed(0)
+    net = a2c.construct("SumChars", obs_size=len(wordle.state.new(6)), word_list=words,
+                        n_hidden=1, hidden_size=hidden_size)
+    serving.bundle.save(path, "a2c", "SumChars", {"n_hidden": 1, "hidden_size": hidden_size}, net, env)
+
+
+def _suggest_urls(env: WordleEnvBase, n: int, rng: np.random.RandomState) -> List[str]:
+    # Random one or two move histories, practically never the same twice so they miss the cache
+    urls = []
+    for _ in range(n):
+        goal = env.words[rng.randint(env.allowable_words)]
+        guesses = [env.words[i] for i in rng.randint(len(env.words), size=rng.randint(1, 3))]
+        masks = [''.join(map(str, env.patterns.get_mask(guess, goal))) for guess in guesses]
+        query = urllib.parse.urlencode({"words": ','.join(guesses), "masks": ','.join(masks)})
+        urls.append(f'/api/wordle-suggest?{query}')
+    return urls
+
+
+def _load(base: str, urls: List[str], clients: int) -> Dict[str, float]:
+    """
+    Request every url once from clients threads
+
+    :return: requests/sec and latency percentiles
+    """
+    latencies = np.empty(len(urls))
+    failures = []
+
+    def client(start: int):
+        for i in range(start, len(urls), clients):
+            begin = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base + urls[i]) as response:
+                    json.load(response)
+            except Exception as e:
+                failures.append(e)
+            latencies[i] = time.perf_counter() - begin
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(urls)} requests failed, first: {failures[0]}")
+
+    latencies *= 1000
+    return {
+        "requests": len(urls),
+        "requests_per_sec": len(urls) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def _serve(app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(bundle: Optional[str] = None,
+        n_words: Optional[int] = None,
+        hidden_size: int = 256,
+        requests: int = 500,
+        clients: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    :param bundle: bundle to serve, see export.py, a random network if None
+    :param n_words: vocabulary size of the random network, the full word list if None
+    :param hidden_size: hidden size of the random network
+    :param requests: requests per measurement
+    :param clients: concurrent clients of each measurement
+    """
+    clients = clients or [1, 8]
+    with tempfile.TemporaryDirectory() as tmp:
+        if bundle is None:
+            bundle = f'{tmp}/bundle'
+            _random_bundle(bundle, n_words, hidden_size)
+        os.environ['BUNDLE_PATH'] = bundle
+        os.environ['OPENING_BOOK_PATH'] = f'{tmp}/no_book'
+        # Loads the bundle on import
+        import app
+
+        server = _serve(app.app)
+        try:
+            base = f'http://127.0.0.1:{server.server_port}'
+            rng = np.random.RandomState(0)
+            env = app.ENV
+            results = []
+            for n_clients in clients:
+                endpoints = {
+                    "suggest_cached": ['/api/wordle-suggest?words=&masks='] * requests,
+                    "suggest": _suggest_urls(env, requests, rng),
+                    "goal": [f'/api/wordle-goal/{env.words[i]}'
+                             for i in rng.randint(env.allowable_words, size=requests)],
+                }
+                for endpoint, urls in endpoints.items():
+                    results.append(dict(_load(base, urls, n_clients), endpoint=endpoint, clients=n_clients,
+                                        words=len(env.words)))
+        finally:
+            server.shutdown()
+    return results
+
+
+def main(out: Optional[str] = None, **kwargs):
+    write_results("server", run(**kwargs), out)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,53 @@
+import os
+
+import fire
+import numpy as np
+
+import serving.book
+from serving.cache import model_key
+
+
+def main(
+        checkpoint: str,
+        out: str,
+        algo: str = 'a2c',
+):
+    """
+    Build the opening book of a checkpoint's greedy agent, see serving.book
+
+    :param checkpoint: checkpoint or bundle directory to load, as for a2c_play.py/ppo_play.py. Build the book
+        from the bundle that gets deployed, the book is keyed on the bundle's hash
+    :param out: directory to write the book to
+    :param algo: a2c or ppo
+    """
+    if algo == 'a2c':
+        import a2c.play as play
+    elif algo == 'ppo':
+        import ppo.play as play
+    else:
+        raise ValueError(f"Unknown algo {algo}, expected a2c or ppo")
+
+    if os.path.exists(f'{checkpoint}/manifest.json'):
+        print("Loading from bundle", checkpoint, "...")
+        manifest, agent, env = play.load_from_bundle(checkpoint)
+        key = manifest["hash"]
+    else:
+        print("Loading from checkpoint", checkpoint, "...")
+        _, agent, env = play.load_from_checkpoint(checkpoint, evaluate=True)
+        key = model_key(agent.net if algo == 'a2c' else agent.actor_net)
+    print("Got env with", len(env.words), "words and", env.allowable_words, "answers!")
+
+    actions, edges, children = serving.book.build_tree(agent, env)
+    print("Decision tree has", len(actions), "histories")
+
+    goal_words = env.words[:env.allowable_words]
+    games = np.full((len(goal_words), env.max_turns), -1, dtype=np.int32)
+    for i, (_, outcomes) in enumerate(play.goal_many(agent, env, goal_words)):
+        games[i, :len(outcomes)] = [env.patterns.index[guess] for guess, _ in outcomes]
+
+    serving.book.write(out, actions, edges, children, games, env, key)
+    print("Wrote book to", out)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
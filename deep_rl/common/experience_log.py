@@ -0,0 +1,164 @@
+"""
+Experience log written to hdf5 in the background, shared by A2C and PPO
+
+write() copies a batch of samples into a preallocated block of flush_rows
+rows. Full blocks go to a writer thread that appends them to the file, so
+training only waits for the copy. There are a fixed number of blocks: when
+all of them are waiting to be written, write() blocks until one is free
+again, which bounds the memory held by a writer that can't keep up.
+
+The datasets are chunked by flush_rows rows, so every flush writes whole
+chunks once, and compressed with a fast codec. The writer opens the file once
+and keeps it open until close(), which also runs at exit, flushes and stops
+the writer. flush() writes whatever is buffered and waits for it.
+"""
+import atexit
+import queue
+import threading
+from typing import Dict, Optional
+
+import h5py
+import numpy as np
+
+from common.rollout import Layout
+
+
+class ExperienceLog:
+    def __init__(self,
+                 file_name: str,
+                 layout: Layout,
+                 flush_rows: int,
+                 blocks: int = 3,
+                 compression: Optional[str] = "lzf",
+                 compression_opts: Optional[int] = None):
+        """
+        Create file_name, replacing it, with an empty dataset per field of layout
+
+        :param file_name: hdf5 file to write
+        :param layout: shape and dtype of one sample of each field
+        :param flush_rows: samples per write to the file, and per chunk of the datasets
+        :param blocks: blocks of flush_rows samples buffered before write() blocks
+        :param compression: h5py compression filter, e.g. "lzf" or "gzip"
+        :param compression_opts: options of the filter, e.g. the gzip level
+        """
+        self.file_name = file_name
+        self.layout = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in layout.items()}
+        self.flush_rows = flush_rows
+        with h5py.File(file_name, 'w') as f:
+            for name, (shape, dtype) in self.layout.items():
+                f.create_dataset(name, (0,) + shape, maxshape=(None,) + shape, dtype=dtype,
+                                 chunks=(flush_rows,) + shape, compression=compression,
+                                 compression_opts=compression_opts)
+
+        self._blocks = [
+            {name: np.empty((flush_rows,) + shape, dtype=dtype) for name, (shape, dtype) in self.layout.items()}
+            for _ in range(blocks)
+        ]
+        self._free = queue.Queue()
+        for block in range(1, blocks):
+            self._free.put(block)
+        # (block, rows) to write, None to stop
+        self._filled = queue.Queue()
+        self._block = 0
+        self._rows = 0
+        self._error = None
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    @staticmethod
+    def _append(f: h5py.File, block: Dict[str, np.ndarray], rows: int):
+        for name, array in block.items():
+            dset = f[name]
+            size = dset.shape[0]
+            dset.resize(size + rows, axis=0)
+            dset[size:] = array[:rows]
+        # Readable by others as soon as flush() returns
+        f.flush()
+
+    def _write_blocks(self):
+        f = None
+        while True:
+            item = self._filled.get()
+            if item is None:
+                break
+            block, rows = item
+            try:
+                if self._error is None:
+                    if f is None:
+                        f = h5py.File(self.file_name, 'a')
+                    self._append(f, self._blocks[block], rows)
+            except Exception as e:
+                # Raised by the next call from the training side, later blocks are dropped
+                self._error = e
+            finally:
+                self._free.put(block)
+                self._filled.task_done()
+        try:
+            if f is not None:
+                f.close()
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+        finally:
+            self._filled.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError(f"Writing {self.file_name} failed") from self._error
+        if self._closed:
+            raise RuntimeError(f"{self.file_name} was closed")
+
+    def _submit(self):
+        # Started on first use rather than in __init__, before which processes may still be forked
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_blocks, name="ExperienceLog", daemon=True)
+            self._thread.start()
+        self._filled.put((self._block, self._rows))
+        self._block = self._free.get()
+        self._rows = 0
+
+    def write(self, **arrays: np.ndarray):
+        """
+        Append samples, one array of the same length per field of the layout
+        """
+        self._check()
+        n = len(next(iter(arrays.values())))
+        start = 0
+        while start < n:
+            rows = min(n - start, self.flush_rows - self._rows)
+            block = self._blocks[self._block]
+            for name in self.layout:
+                block[name][self._rows:self._rows + rows] = arrays[name][start:start + rows]
+            self._rows += rows
+            start += rows
+            if self._rows == self.flush_rows:
+                self._submit()
+
+    def flush(self):
+        """
+        Write everything buffered so far and wait until it's in the file
+        """
+        self._check()
+        if self._rows:
+            self._submit()
+        self._filled.join()
+        self._check()
+
+    def close(self):
+        """
+        Flush, stop the writer and close the file, the log can't be written to afterwards
+        """
+        if self._closed:
+            return
+        atexit.unregister(self.close)
+        try:
+            if self._error is None:
+                self.flush()
+        finally:
+            self._closed = True
+            if self._thread is not None:
+                self._filled.put(None)
+                self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Writing {self.file_name} failed") from self._error
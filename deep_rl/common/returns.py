@@ -0,0 +1,76 @@
+"""
+Discounted returns and generalized advantage estimates, shared by A2C and PPO
+
+Both work on (T, N) arrays of N games played in lockstep for T steps, or on
+(T,) arrays of a single game, as NumPy arrays or torch tensors. dones[t]
+marks a game ending at step t: nothing is bootstrapped across it, the step
+after belongs to a new game. last_values bootstraps the games still going
+after the last step.
+
+Everything is computed in float64 and returned in float64, in the same order
+of operations as the list based loops these replace, so the numbers are the
+same. There is one backward scan over T, every column is done at once.
+"""
+from typing import Union
+
+import numpy as np
+import torch
+
+Array = Union[np.ndarray, torch.Tensor]
+
+
+def _float64(x, like: Array) -> Array:
+    if torch.is_tensor(like):
+        return torch.as_tensor(x, dtype=torch.float64, device=like.device)
+    return np.asarray(x, dtype=np.float64)
+
+
+def _scan(x: Array, not_done: Array, last: Array, discount: float) -> Array:
+    """
+    out[t] = x[t] + discount * out[t + 1] * not_done[t], out[T] = last
+    """
+    out = torch.empty_like(x) if torch.is_tensor(x) else np.empty_like(x)
+    carry = last
+    for t in range(len(x) - 1, -1, -1):
+        carry = carry * not_done[t] * discount + x[t]
+        out[t] = carry
+    return out
+
+
+def discounted_returns(rewards: Array, dones: Array, last_values: Union[Array, float], gamma: float) -> Array:
+    """
+    :param rewards: (T, N) rewards
+    :param dones: (T, N) whether each game ended at that step
+    :param last_values: (N,) values of the states after the last step
+    :param gamma: discount factor
+    :return: (T, N) discounted returns, float64
+    """
+    rewards = _float64(rewards, rewards)
+    return _scan(rewards, 1 - _float64(dones, rewards), _float64(last_values, rewards), gamma)
+
+
+def gae(rewards: Array,
+        values: Array,
+        dones: Array,
+        last_values: Union[Array, float],
+        gamma: float,
+        lam: float) -> Array:
+    """
+    Generalized advantage estimate, https://arxiv.org/abs/1506.02438
+
+    :param rewards: (T, N) rewards
+    :param values: (T, N) critic values of the states the rewards were earned in
+    :param dones: (T, N) whether each game ended at that step
+    :param last_values: (N,) values of the states after the last step
+    :param gamma: discount factor
+    :param lam: advantage discount factor
+    :return: (T, N) advantages, float64
+    """
+    rewards = _float64(rewards, rewards)
+    values = _float64(values, rewards)
+    not_done = 1 - _float64(dones, rewards)
+    next_values = values.clone() if torch.is_tensor(values) else values.copy()
+    next_values[:-1] = values[1:]
+    next_values[-1] = _float64(last_values, rewards)
+    deltas = rewards + gamma * (next_values * not_done) - values
+    return _scan(deltas, not_done, _float64(0., rewards), gamma * lam)
@@ -0,0 +1,76 @@
+"""
+Preallocated rollout storage, shared by A2C and PPO
+
+A RolloutBuffer holds one (T, N, *shape) array per field for T steps of N
+games played in lockstep. Rollouts write each step's states, actions and the
+rest straight into it, and training batches are torch.from_numpy views of it,
+so nothing is allocated or collated per sample.
+
+The DataLoader fetches a batch ahead of the one being trained on, so the
+next rollout may be written while the last one is still in use. The buffer
+keeps copies of its storage and every rollout starts by moving on to the
+next one with next().
+"""
+from typing import Any, Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+import torch
+
+# Field name -> (shape, dtype) of one sample
+Layout = Dict[str, Tuple[Tuple[int, ...], Any]]
+
+
+class RolloutBuffer:
+    def __init__(self, n_steps: int, num_envs: int, layout: Layout, copies: int = 2):
+        """
+        :param n_steps: steps per rollout
+        :param num_envs: games stepped in lockstep
+        :param layout: shape and dtype of one sample of each field
+        :param copies: rollouts kept before their storage is reused
+        """
+        self.n_steps = n_steps
+        self.num_envs = num_envs
+        self.layout = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in layout.items()}
+        self._storage = [
+            {name: np.empty((n_steps, num_envs) + shape, dtype=dtype) for name, (shape, dtype) in self.layout.items()}
+            for _ in range(copies)
+        ]
+        self._current = 0
+
+    def __len__(self) -> int:
+        return self.n_steps * self.num_envs
+
+    @property
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        :return: (T, N, *shape) arrays of the current rollout
+        """
+        return self._storage[self._current]
+
+    def next(self) -> Dict[str, np.ndarray]:
+        """
+        Move on to the storage of the next rollout
+
+        :return: its (T, N, *shape) arrays to write into
+        """
+        self._current = (self._current + 1) % len(self._storage)
+        return self.arrays
+
+    def flat(self, name: str) -> np.ndarray:
+        """
+        :return: (T * N, *shape) view of a field of the current rollout, step by step
+        """
+        array = self.arrays[name]
+        return array.reshape((len(self),) + array.shape[2:])
+
+    def minibatches(self, names: Sequence[str], batch_size: int) -> Iterator[Tuple[torch.Tensor, ...]]:
+        """
+        Consecutive batch_size slices of the current rollout, the last one
+        shorter if batch_size doesn't divide it
+
+        :param names: fields to serve, in order
+        :return: tensors sharing memory with the buffer, one per field
+        """
+        arrays = [self.flat(name) for name in names]
+        for start in range(0, len(self), batch_size):
+            yield tuple(torch.from_numpy(array[start:start + batch_size]) for array in arrays)
@@ -19,6 +19,7 @@ import dqn
 from dqn.agent import Agent
 from dqn.experience import SequenceReplay, RLDataset, Experience
 
+import wordle.envs  # registers the envs with gym
 import wordle.state
 
 import gym
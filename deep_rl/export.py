@@ -0,0 +1,51 @@
+import importlib
+import os
+import sys
+
+import fire
+
+import serving.bundle
+import serving.quantized
+
+
+def main(
+        checkpoint: str,
+        out: str,
+        algo: str = 'a2c',
+        quantize: bool = False,
+        max_win_rate_drop: float = 0.01,
+):
+    """
+    Export the policy network of a checkpoint as an inference bundle, see serving.bundle
+
+    :param checkpoint: AdvantageActorCritic or PPO checkpoint, local path or URL
+    :param out: bundle directory to write
+    :param algo: a2c or ppo
+    :param quantize: allow serving the bundle int8 quantized, if its win rate on every answer drops by at most
+        max_win_rate_drop
+    :param max_win_rate_drop: accuracy guard threshold for quantize, as a fraction
+    """
+    print("Exporting", checkpoint, "...")
+    serving.bundle.export_checkpoint(checkpoint, out, algo=algo)
+    manifest = serving.bundle.read_manifest(out)
+
+    size = sum(os.path.getsize(f'{out}/{name}') for name in os.listdir(out))
+    if quantize:
+        play = importlib.import_module(f'{algo}.play')
+        _, agent, env = play.load_from_bundle(out)
+        quantized_agent = type(agent)(serving.quantized.quantize_network(
+            agent.net if algo == 'a2c' else agent.actor_net))
+        print("Checking quantized win rate on", env.allowable_words, "answers...")
+        try:
+            rates = serving.quantized.check_accuracy(agent, quantized_agent, env, max_win_rate_drop)
+        except ValueError as e:
+            print("Not allowing quantized serving:", e)
+            sys.exit(1)
+        print(f"Win rate {rates['win_rate']:.4f}, quantized {rates['quantized_win_rate']:.4f}")
+        manifest = serving.bundle.update_manifest(out, quantization=dict(rates, max_win_rate_drop=max_win_rate_drop))
+
+    print(f"Wrote {manifest['network_name']} bundle to {out}, {size / 1e6:.1f}MB, hash {manifest['hash']}")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
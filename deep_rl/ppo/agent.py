@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 import torch
@@ -19,8 +19,8 @@ class ActorCategorical(nn.Module):
 
         self.actor_net = actor_net
 
-    def forward(self, states):
-        logits = self.actor_net(states)
+    def forward(self, states, mask=None):
+        logits = self.actor_net(states, mask)
         pi = Categorical(logits=logits)
         actions = pi.sample()
 
@@ -46,15 +46,19 @@ class GreedyActorCategorical(nn.Module):
 
         self.actor_net = actor_net
 
-    def forward(self, states: torch.Tensor, device: str) -> List[int]:
+    def forward(self, states: torch.Tensor, device: str, mask: Optional[np.ndarray] = None) -> List[int]:
         """Takes in the current state and returns the action based on the agents policy.
         Args:
-            states: current state of the environment
+            states: current state of the environment, or a (N, obs) batch of states
             device: the device used for the current batch
+            mask: legal actions for each state, see WordleEnvBase.action_mask, or None if all are legal
         Returns:
             action defined by policy
         """
-        logits = self.actor_net(torch.tensor([states], device=device))
+        if mask is not None:
+            mask = torch.as_tensor(np.atleast_2d(mask), device=device)
+        with torch.no_grad():
+            logits = self.actor_net(torch.as_tensor(np.atleast_2d(states), device=device), mask)
         probabilities = logits.exp().squeeze(dim=-1)
         prob_np = probabilities.data.cpu().numpy()
 
@@ -1,9 +1,11 @@
 from typing import List
 
-import numpy as np
 import torch
 from torch import nn
 
+from ppo.masking import mask_logits
+from ppo.wordindex import word_index, gather_linear
+
 
 class EmbeddingChars(nn.Module):
     def __init__(self,
@@ -37,32 +39,48 @@ class EmbeddingChars(nn.Module):
         self.actor_head = nn.Linear(self.n_emb, self.n_emb)
         self.critic_head = nn.Linear(self.n_emb, 1)
 
-        word_array = np.zeros((len(word_list), word_width))
-        for i, word in enumerate(word_list):
-            for j, c in enumerate(word):
-                word_array[i, j*26 + (ord(c) - ord('A'))] = 1
-        self.words = torch.Tensor(word_array)
+        self.register_buffer('word_index', word_index(word_list), persistent=False)
 
-        # W x word_width -> W x emb
+        # W x word_width -> W x emb, the one-hot words only go through f_word[0] via gather_linear
         self.f_word = nn.Sequential(
             nn.Linear(word_width, 64),
             nn.ReLU(),
             nn.Linear(64, self.n_emb),
         )
+        # (key, emb x W projection) of the vocabulary, see project_words
+        self._projected_words = None
+
+    def project_words(self, device) -> torch.Tensor:
+        """Run f_word over the whole vocabulary.
+
+        With gradients disabled the projection is memoized. The key is the device plus the storage and version
+        counter of every f_word parameter, so any in-place change (optimizer step, load_state_dict) invalidates it.
+        """
+        if torch.is_grad_enabled():
+            self._projected_words = None
+            return self._f_word().transpose(0, 1)
 
-    def forward(self, x):
+        key = (device,) + tuple((p.data_ptr(), p._version) for p in self.f_word.parameters())
+        if self._projected_words is None or self._projected_words[0] != key:
+            fw = self._f_word().transpose(0, 1)
+            self._projected_words = (key, fw)
+        return self._projected_words[1]
+
+    def _f_word(self) -> torch.Tensor:
+        h = gather_linear(self.f_word[0], self.word_index)
+        for layer in self.f_word[1:]:
+            h = layer(h)
+        return h
+
+    def forward(self, x, mask=None):
         fs = self.f_state(x.float())
-        fw = self.f_word(
-            self.words.to(self.get_device(x)),
-        ).transpose(0, 1)
+        fw = self.project_words(x.device)
 
         a = torch.log_softmax(
-            torch.tensordot(self.actor_head(fs), fw,
-                            dims=((1,), (0,))),
+            mask_logits(
+                torch.tensordot(self.actor_head(fs), fw,
+                                dims=((1,), (0,))),
+                mask),
             dim=-1)
         c = self.critic_head(fs)
         return a, c
-
-    def get_device(self, batch) -> str:
-        """Retrieve device currently being used by minibatch."""
-        return batch[0].device.index
\ No newline at end of file
@@ -0,0 +1,19 @@
+from typing import Optional
+
+import torch
+
+# Finite so that exp(logprob) * logprob stays 0 for masked actions instead of nan
+MASKED_LOGIT = -1e9
+
+
+def mask_logits(logits: torch.Tensor, mask: Optional[torch.Tensor]) -> torch.Tensor:
+    """Push the logits of illegal actions to MASKED_LOGIT.
+    Args:
+        logits: (batch, actions) logits
+        mask: boolean tensor broadcastable to logits, True where the action is legal, or None
+    Returns:
+        masked logits, or logits itself when every action is legal
+    """
+    if mask is None or bool(mask.all()):
+        return logits
+    return logits.masked_fill(~mask.to(logits.device), MASKED_LOGIT)
@@ -1,7 +1,7 @@
 import collections
 from argparse import ArgumentParser
 from collections import OrderedDict
-from typing import Any, List, Tuple, Iterator
+from typing import Any, List, Tuple, Iterator, Optional
 import wandb
 
 import gym
@@ -14,11 +14,15 @@ from torch.utils.data import DataLoader
 from torch.utils.tensorboard import SummaryWriter
 
 import ppo
+import wordle.envs  # registers the envs with gym
 import wordle.state
+from common.experience_log import ExperienceLog
+from common.returns import discounted_returns, gae
+from common.rollout import RolloutBuffer
 from ppo.agent import ActorCategorical
 from ppo.experience import ExperienceSourceDataset, Experience
-
-import h5py
+from wordle.subproc import SubprocVecEnv
+from wordle.vec import WordleVecEnv
 
 from pl_bolts.utils import _GYM_AVAILABLE
 from pl_bolts.models.rl.common.networks import MLP
@@ -52,6 +56,9 @@ class PPO(LightningModule):
         steps_per_epoch: int = 2048,
         nb_optim_iters: int = 4,
         clip_ratio: float = 0.2,
+        num_envs: int = 1,
+        num_env_workers: int = 0,
+        mask_actions: bool = False,
         evaluate: bool = False,
         **kwargs: Any,
     ) -> None:
@@ -67,6 +74,10 @@ class PPO(LightningModule):
             steps_per_epoch: how many action-state pairs to rollout for trajectory collection per epoch
             nb_optim_iters: how many steps of gradient descent to perform on each batch
             clip_ratio: hyperparameter for clipping in the policy objective
+            num_envs: how many games to play in lockstep during trajectory collection, must divide steps_per_epoch
+            num_env_workers: with num_envs, step the games in this many processes instead of this one, see
+                wordle.subproc
+            mask_actions: only let the policy pick words that can still be the goal
         """
         super().__init__()
 
@@ -104,14 +115,6 @@ class PPO(LightningModule):
         # actor_mlp = MLP(self.env.observation_space.shape, self.env.action_space.n)
         self.actor = ActorCategorical(self.net)
 
-        self.batch_states = []
-        self.batch_actions = []
-        self.batch_adv = []
-        self.batch_qvals = []
-        self.batch_logp = []
-        self.batch_masks = []
-        self.batch_targets = []
-
         self.ep_rewards = []
         self.ep_values = []
         self.epoch_rewards = []
@@ -138,35 +141,68 @@ class PPO(LightningModule):
         self.avg_ep_len = 0
         self.avg_reward = 0
 
-        self.state = self.env.reset()
+        if mask_actions:
+            # Legal actions are the remaining candidates, which the env has to track
+            self.env.unwrapped.track_candidates = True
 
-        # For collecting data
-        self._num_batches_before_clear = 10
-        self._resize_dset = False
-        self._data = {"states": [], "actions": [], "dones": [], "qvals": [], "adv": [], "targets" : []}
+        self.state = self.env.reset()
 
-        # Create the hd5 file
+        self.vec_env = None
+        if num_envs > 1:
+            assert steps_per_epoch % num_envs == 0, \
+                f'steps_per_epoch {steps_per_epoch} not divisible by num_envs {num_envs}'
+            if num_env_workers > 0:
+                self.vec_env = SubprocVecEnv(self.env, num_envs, num_env_workers)
+            else:
+                self.vec_env = WordleVecEnv(self.env, num_envs)
+            self.vec_states = self.vec_env.reset()
+            self._vec_cheat_words = np.full(num_envs, -1)
+            self._vec_episode_rewards = np.zeros(num_envs)
+            self._vec_actions = np.zeros((num_envs, self.vec_env.max_turns), dtype=np.int64)
+
+        layout = {
+            "states": (self.state.shape, self.state.dtype),
+            "actions": ((), np.int64),
+            "logp": ((), np.float32),
+            "rewards": ((), np.float32),
+            "values": ((), np.float32),
+            "dones": ((), np.bool_),
+            "targets": ((), np.int64),
+            "qvals": ((), np.float32),
+            "adv": ((), np.float32),
+        }
+        if mask_actions:
+            layout["action_masks"] = ((len(self.env.words),), np.bool_)
+        self._rollout = RolloutBuffer(steps_per_epoch // num_envs, num_envs, layout)
+
+        # For collecting data, written to the hdf5 file every epoch in the background
+        self._experience_log = None
         if not evaluate:
-            file_name = "./data/ppo/" + self.env_str + ".hdf5"
-            sz = self._num_batches_before_clear * self.steps_per_epoch
-            with h5py.File(file_name, 'w') as f:
-                states_dset = f.create_dataset("states", (sz, self.state.shape[0]), maxshape=(None, 417),dtype=np.uint, compression="gzip", compression_opts=9)
-                actions_dset = f.create_dataset("actions", (sz,), maxshape=(None,),dtype=np.uint, compression="gzip", compression_opts=9)
-                dones_dset = f.create_dataset("dones", (sz,), maxshape=(None,),dtype=np.bool_, compression="gzip", compression_opts=9)
-                qvals_dset = f.create_dataset("qvals", (sz,), maxshape=(None,),dtype=np.float, compression="gzip", compression_opts=9)
-                adv_dset = f.create_dataset("adv", (sz,), maxshape=(None,),dtype=np.float, compression="gzip", compression_opts=9)
-                targets_dset = f.create_dataset("targets", (sz,), maxshape=(None,),dtype=np.uint, compression="gzip", compression_opts=9)
-
-    def forward(self, x: Tensor) -> Tuple[Tensor, Tensor, Tensor]:
+            self._experience_log = ExperienceLog(
+                "./data/ppo/" + self.env_str + ".hdf5",
+                {
+                    "states": (self.state.shape, wordle.state.DTYPE),
+                    "actions": ((), np.int64),
+                    "dones": ((), np.bool_),
+                    "qvals": ((), np.float32),
+                    "adv": ((), np.float32),
+                    "targets": ((), np.int64),
+                },
+                flush_rows=steps_per_epoch)
+
+    def forward(self, x: Tensor, mask: Optional[np.ndarray] = None) -> Tuple[Tensor, Tensor, Tensor]:
         """Passes in a state x through the network and returns the policy and a sampled action.
         Args:
             x: environment state
+            mask: legal actions in state x, or None if all are legal
         Returns:
             Tuple of policy and action
         """
-        
-        pi, action = self.actor(torch.FloatTensor([x], device=self.device))
-        value = self.critic(torch.FloatTensor([x], device=self.device))
+        if mask is not None:
+            mask = torch.as_tensor(mask[None], device=self.device)
+        x = torch.as_tensor(x[None], device=self.device)
+        pi, action = self.actor(x, mask)
+        value = self.critic(x)
 
         return pi, action, value
 
@@ -178,16 +214,7 @@ class PPO(LightningModule):
         Returns:
             list of discounted rewards/advantages
         """
-        assert isinstance(rewards[0], float)
-
-        cumul_reward = []
-        sum_r = 0.0
-
-        for r in reversed(rewards):
-            sum_r = (sum_r * discount) + r
-            cumul_reward.append(sum_r)
-
-        return list(reversed(cumul_reward))
+        return discounted_returns(np.array(rewards), np.zeros(len(rewards)), 0., discount).tolist()
 
     def calc_advantage(self, rewards: List[float], values: List[float], last_value: float) -> List[float]:
         """Calculate the advantage given rewards, state values, and the last value of episode.
@@ -198,24 +225,25 @@ class PPO(LightningModule):
         Returns:
             list of advantages
         """
-        rews = rewards + [last_value]
-        vals = values + [last_value]
-        # GAE
-        delta = [rews[i] + self.gamma * vals[i + 1] - vals[i] for i in range(len(rews) - 1)]
-        adv = self.discount_rewards(delta, self.gamma * self.lam)
-
-        return adv
+        return gae(np.array(rewards), np.array(values), np.zeros(len(rewards)), last_value, self.gamma,
+                   self.lam).tolist()
 
-    def generate_trajectory_samples(self) -> Tuple[List[Tensor], List[Tensor], List[Tensor]]:
+    def generate_trajectory_samples(self) -> Iterator[Tuple[Tensor, ...]]:
         """Contains the logic for generating trajectory data to train policy and value network.
         Yield:
-           Tuple of Lists containing tensors for states, actions, log probs, qvals and advantage
+           Minibatches of ``batch_size`` tensors for states, actions, log probs, qvals and advantage, written in
+           place into ``self._rollout``
         """
+        if self.vec_env is not None:
+            yield from self.generate_trajectory_samples_vec()
+            return
 
+        batch = self._rollout.next()
         for step in range(self.steps_per_epoch):
 
             with torch.no_grad():
-                pi, action, value = self(self.state)
+                action_mask = self.env.action_mask() if self.hparams.mask_actions else None
+                pi, action, value = self(self.state, action_mask)
                 log_prob = self.actor.get_log_prob(pi, action[0])
             
             if wordle.state.remaining_steps(self.state) == 1 and self._cheat_word:
@@ -226,13 +254,15 @@ class PPO(LightningModule):
 
             self.episode_step += 1
 
-            self.batch_states.append(self.state)
-            self.batch_actions.append(action[0])
-            self.batch_logp.append(log_prob)
-            self.batch_masks.append(done)
-            self.batch_targets.append(aux['goal_id'])
+            batch["states"][step, 0] = self.state
+            batch["actions"][step, 0] = action[0]
+            batch["logp"][step, 0] = log_prob
+            batch["dones"][step, 0] = done
+            batch["targets"][step, 0] = aux['goal_id']
+            if action_mask is not None:
+                batch["action_masks"][step, 0] = action_mask
 
-            self._seq.append(Experience(self.state.copy(), action[0], reward, aux['goal_id']))
+            self._seq.append(Experience(None, action[0], reward, aux['goal_id']))
 
             self.ep_rewards.append(reward)
             self.ep_values.append(value.item())
@@ -254,10 +284,11 @@ class PPO(LightningModule):
                     last_value = 0
                     steps_before_cutoff = 0
 
+                episode = slice(step + 1 - len(self.ep_rewards), step + 1)
                 # discounted cumulative reward
-                self.batch_qvals += self.discount_rewards(self.ep_rewards + [last_value], self.gamma)[:-1]
+                batch["qvals"][episode, 0] = self.discount_rewards(self.ep_rewards + [last_value], self.gamma)[:-1]
                 # advantage
-                self.batch_adv += self.calc_advantage(self.ep_rewards, self.ep_values, last_value)
+                batch["adv"][episode, 0] = self.calc_advantage(self.ep_rewards, self.ep_values, last_value)
                 # logs
                 self.epoch_rewards.append(sum(self.ep_rewards))
                 # reset params
@@ -281,84 +312,15 @@ class PPO(LightningModule):
                     self._total_rewards += self.episode_reward
 
                     self.done_episodes += 1
-                    # With some probability, override the word with one that we lost recently
-                    self._cheat_word = None
-                    if len(self._recent_losing_words) > 0:
-                        if np.random.random() < self.hparams.prob_play_lost_word:
-                            lost_idx = int(np.random.random()*len(self._recent_losing_words))
-                            self.env.set_goal_id(self._recent_losing_words[lost_idx])
-                            if np.random.random() < self.hparams.prob_cheat:
-                                self._cheat_word = self._recent_losing_words[lost_idx]
+                    goal_id, self._cheat_word = self._replay_lost_word()
+                    if goal_id is not None:
+                        self.env.set_goal_id(goal_id)
 
                     self.episode_reward = 0
 
             if epoch_end:
 
-                self._data["states"].extend(self.batch_states)
-                self._data["actions"].extend([action.item() for action  in self.batch_actions])
-                self._data["dones"].extend(self.batch_masks)
-                self._data["qvals"].extend(self.batch_qvals)
-                self._data["adv"].extend(self.batch_adv)
-                self._data["targets"].extend(self.batch_targets)
-
-                if len(self._data["actions"]) >= self._num_batches_before_clear * len(self.batch_actions):
-                    
-                    length = len(self._data["actions"])
-
-                    file_name = "./data/ppo/" + self.env_str + ".hdf5"
-                    with h5py.File(file_name, 'a') as f:
-
-                        states_dset = f["states"]
-                        actions_dset = f["actions"]
-                        dones_dset = f["dones"]
-                        qvals_dset = f["qvals"]
-                        adv_dset = f["adv"]
-                        targets_dset = f["targets"]
-
-                        curr_size = states_dset.shape[0]
-
-                        if self._resize_dset:
-                            states_dset.resize(curr_size + length, axis=0)
-                            actions_dset.resize(curr_size + length, axis=0)
-                            dones_dset.resize(curr_size + length, axis=0)
-                            qvals_dset.resize(curr_size + length, axis=0)
-                            adv_dset.resize(curr_size + length, axis=0)
-                            targets_dset.resize(curr_size + length, axis=0)
-
-                            states_dset[curr_size:, :] = self._data["states"]
-                            actions_dset[curr_size:] = self._data["actions"]
-                            dones_dset[curr_size:] = self._data["dones"]
-                            qvals_dset[curr_size:] = self._data["qvals"]
-                            adv_dset[curr_size:] = self._data["adv"]
-                            targets_dset[curr_size:] = self._data["targets"]
-
-                        else:
-                            self._resize_dset = True
-                            states_dset[:, :] = self._data["states"]
-                            actions_dset[:] = self._data["actions"]
-                            dones_dset[:] = self._data["dones"]
-                            qvals_dset[:] = self._data["qvals"]
-                            adv_dset[:] = self._data["adv"]
-                            targets_dset[:] = self._data["targets"]
-
-                    # Free up memory
-                    for k in self._data:
-                        self._data[k] = []
-
-                train_data = zip(
-                    self.batch_states, self.batch_actions, self.batch_logp, self.batch_qvals, self.batch_adv
-                )
-
-                for state, action, logp_old, qval, adv in train_data:
-                    yield state, action, logp_old, qval, adv
-
-                self.batch_states.clear()
-                self.batch_actions.clear()
-                self.batch_adv.clear()
-                self.batch_logp.clear()
-                self.batch_qvals.clear()
-                self.batch_masks.clear()
-                self.batch_targets.clear()
+                yield from self._serve_rollout()
 
                 # logging
                 self.avg_reward = sum(self.epoch_rewards) / self.steps_per_epoch
@@ -376,8 +338,144 @@ class PPO(LightningModule):
 
                 self.epoch_rewards.clear()
 
-    def actor_loss(self, state, action, logp_old, adv) -> Tensor:
-        pi, _ = self.actor(state)
+    def generate_trajectory_samples_vec(self) -> Iterator[Tuple[Tensor, ...]]:
+        """Same as generate_trajectory_samples, but collects ``steps_per_epoch`` samples as
+        ``steps_per_epoch / num_envs`` turns of ``num_envs`` games played in lockstep, with one batched actor and
+        critic call per turn. Games are not cut short at the end of an epoch, unfinished games are bootstrapped
+        with the critic and carry on in the next epoch.
+        """
+        n_envs = self.vec_env.num_envs
+        n_steps = self.steps_per_epoch // n_envs
+        max_turns = self.vec_env.max_turns
+        rows = np.arange(n_envs)
+
+        batch = self._rollout.next()
+        states = batch["states"]
+        states[0] = self.vec_states
+        finished_rewards = []
+        finished_steps = 0
+        for t in range(n_steps):
+            obs = torch.as_tensor(states[t], device=self.device).float()
+            action_masks = self.vec_env.action_masks() if self.hparams.mask_actions else None
+            with torch.no_grad():
+                pi, actions = self.actor(obs, None if action_masks is None else torch.as_tensor(action_masks))
+                log_prob = self.actor.get_log_prob(pi, actions)
+                values = self.critic(obs).squeeze(-1)
+
+            actions = actions.cpu().numpy()
+            cheat = (states[t, :, 0] == 1) & (self._vec_cheat_words >= 0)
+            actions[cheat] = self._vec_cheat_words[cheat]
+
+            turns = max_turns - states[t, :, 0].astype(np.int64) + 1
+            self._vec_actions[rows, turns - 1] = actions
+
+            # Written straight into the rollout, the last step's start the next epoch
+            next_states = states[t + 1] if t + 1 < n_steps else self.vec_states
+            _, rewards, dones, aux = self.vec_env.step(actions, out=next_states)
+
+            batch["actions"][t] = actions
+            batch["logp"][t] = log_prob.cpu().numpy()
+            batch["rewards"][t] = rewards
+            batch["values"][t] = values.cpu().numpy()
+            batch["dones"][t] = dones
+            batch["targets"][t] = aux['goal_id']
+            if action_masks is not None:
+                batch["action_masks"][t] = action_masks
+
+            self._vec_episode_rewards += rewards
+
+            for i in np.flatnonzero(dones):
+                goal_id = int(aux['goal_id'][i])
+                finished_rewards.append(self._vec_episode_rewards[i])
+                finished_steps += turns[i]
+                self._end_episode(
+                    won=actions[i] == goal_id,
+                    goal_id=goal_id,
+                    turns=turns[i],
+                    episode_reward=self._vec_episode_rewards[i],
+                    seq=[Experience(None, int(a), None, goal_id) for a in self._vec_actions[i, :turns[i]]])
+
+                goal_id, cheat_word = self._replay_lost_word()
+                if goal_id is not None:
+                    self.vec_env.set_goal_id(i, goal_id)
+                self._vec_cheat_words[i] = -1 if cheat_word is None else cheat_word
+                self._vec_episode_rewards[i] = 0
+
+        # bootstrap the value of games still running at the end of the epoch
+        with torch.no_grad():
+            last_values = self.critic(torch.as_tensor(self.vec_states, device=self.device).float())
+        last_values = last_values.squeeze(-1).cpu().numpy()
+
+        # Every column at once, the games within a column are separated by their dones
+        batch["qvals"][:] = discounted_returns(batch["rewards"], batch["dones"], last_values, self.gamma)
+        batch["adv"][:] = gae(batch["rewards"], batch["values"], batch["dones"], last_values, self.gamma, self.lam)
+
+        yield from self._serve_rollout()
+
+        # logging
+        self.avg_reward = float(batch["rewards"].sum()) / self.steps_per_epoch
+        if finished_rewards:
+            self.avg_ep_reward = sum(finished_rewards) / len(finished_rewards)
+            self.avg_ep_len = finished_steps / len(finished_rewards)
+
+    def _serve_rollout(self) -> Iterator[Tuple[Tensor, ...]]:
+        """Log the epoch just played into ``self._rollout`` and serve it in minibatches of ``batch_size`` tensors
+        sharing its memory."""
+        self._save_data(*(self._rollout.flat(name)
+                          for name in ("states", "actions", "dones", "qvals", "adv", "targets")))
+        names = ["states", "actions", "logp", "qvals", "adv"]
+        if self.hparams.mask_actions:
+            names.append("action_masks")
+        yield from self._rollout.minibatches(names, self.batch_size)
+
+    def _end_episode(self, won: bool, goal_id: int, turns: int, episode_reward: float, seq: List[Experience]) -> None:
+        """Update the win/loss metrics with a finished game."""
+        if won:
+            self._winning_steps += turns
+            self._wins += 1
+            self._winning_rewards += episode_reward
+            self._last_win = seq
+        else:
+            self._losses += 1
+            self._last_loss = seq
+            self._recent_losing_words.append(goal_id)
+        self._total_rewards += episode_reward
+
+        self.done_episodes += 1
+
+    def _replay_lost_word(self) -> Tuple[Optional[int], Optional[int]]:
+        """With some probability, override the goal of the next game with one that we lost recently.
+        Returns:
+            goal id to play next (None for a random goal) and the word to cheat with on the last turn (or None)
+        """
+        if len(self._recent_losing_words) > 0:
+            if np.random.random() < self.hparams.prob_play_lost_word:
+                lost_idx = int(np.random.random()*len(self._recent_losing_words))
+                goal_id = self._recent_losing_words[lost_idx]
+                cheat_word = None
+                if np.random.random() < self.hparams.prob_cheat:
+                    cheat_word = goal_id
+                return goal_id, cheat_word
+        return None, None
+
+    def _save_data(self, states, actions, dones, qvals, adv, targets) -> None:
+        """Hand an epoch of experience to the experience log, which copies it."""
+        if self._experience_log is not None:
+            self._experience_log.write(states=states, actions=actions, dones=dones, qvals=qvals, adv=adv,
+                                       targets=targets)
+
+    def on_train_end(self) -> None:
+        """Write the experience played so far to the hdf5 file and close it."""
+        if self._experience_log is not None:
+            self._experience_log.close()
+
+    def teardown(self, stage: Optional[str] = None) -> None:
+        """Stop the worker processes of the vectorized env, also when training failed."""
+        if self.vec_env is not None and hasattr(self.vec_env, 'close'):
+            self.vec_env.close()
+
+    def actor_loss(self, state, action, logp_old, adv, action_mask=None) -> Tensor:
+        pi, _ = self.actor(state, action_mask)
         logp = self.actor.get_log_prob(pi, action)
         ratio = torch.exp(logp - logp_old)
         clip_adv = torch.clamp(ratio, 1 - self.clip_ratio, 1 + self.clip_ratio) * adv
@@ -398,7 +496,8 @@ class PPO(LightningModule):
         Returns:
             loss
         """
-        state, action, old_logp, qval, adv = batch
+        state, action, old_logp, qval, adv, *action_mask = batch
+        action_mask = action_mask[0] if action_mask else None
 
         # normalize advantages
         adv = (adv - adv.mean()) / adv.std()
@@ -408,7 +507,7 @@ class PPO(LightningModule):
         self.log("avg_reward", self.avg_reward, prog_bar=True, on_step=False, on_epoch=True)
 
         if optimizer_idx == 0:
-            loss_actor = self.actor_loss(state, action, old_logp, adv)
+            loss_actor = self.actor_loss(state, action, old_logp, adv, action_mask)
             self.log("loss_actor", loss_actor, on_step=False, on_epoch=True, prog_bar=True, logger=True)
 
             return loss_actor
@@ -481,7 +580,8 @@ class PPO(LightningModule):
     def _dataloader(self) -> DataLoader:
         """Initialize the Replay Buffer dataset used for retrieving experiences."""
         dataset = ExperienceSourceDataset(self.generate_trajectory_samples)
-        dataloader = DataLoader(dataset=dataset, batch_size=self.batch_size)
+        # generate_trajectory_samples yields whole minibatches
+        dataloader = DataLoader(dataset=dataset, batch_size=None)
         return dataloader
 
     def train_dataloader(self) -> DataLoader:
@@ -517,6 +617,9 @@ class PPO(LightningModule):
         parser.add_argument("--prob_play_lost_word", type=float, default=0, help="Probabiilty of replaying a losing word")
         parser.add_argument("--prob_cheat", type=float, default=0, help="Probability of cheating when playing lost word")
         parser.add_argument("--weight_decay", type=float, default=0., help="Optimizer weight decay regularization.")
+        parser.add_argument("--num_envs", type=int, default=1, help="Number of games to step in lockstep per epoch")
+        parser.add_argument("--num_env_workers", type=int, default=0, help="Number of processes stepping the num_envs games, 0 to step them in the training process")
+        parser.add_argument("--mask_actions", action="store_true", help="Only sample words that can still be the goal")
 
         parser.add_argument(
             "--avg_reward_len",
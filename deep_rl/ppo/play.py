@@ -1,19 +1,33 @@
-from typing import Tuple, List
+import multiprocessing
+from collections import namedtuple
+from typing import Any, Dict, Tuple, List, Optional, TYPE_CHECKING
 
+import numpy as np
+import torch
+
+import serving.bundle
+import serving.compiled
+import serving.quantized
 import wordle.state
+from wordle.const import REWARD
 from ppo.agent import GreedyActorCategorical
-from ppo.module import PPO
 from wordle.wordle import WordleEnvBase
 
+if TYPE_CHECKING:
+    # The training stack is only imported when loading a checkpoint, see load_from_checkpoint
+    from ppo.module import PPO
+
 
 def load_from_checkpoint(
         checkpoint: str,
         evaluate: bool=True
-) -> Tuple[PPO, GreedyActorCategorical, WordleEnvBase]:
+) -> Tuple['PPO', GreedyActorCategorical, WordleEnvBase]:
     """
     :param checkpoint:
     :return:
     """
+    from ppo.module import PPO
+
     model = PPO.load_from_checkpoint(checkpoint, evaluate=evaluate)
     agent = GreedyActorCategorical(model.net)
     env = model.env
@@ -21,6 +35,105 @@ def load_from_checkpoint(
     return model, agent, env
 
 
+def load_from_bundle(
+        path: str,
+        verify: bool=False,
+        compiled: bool=False,
+        optimize: bool=False,
+        quantized: bool=False,
+) -> Tuple[Dict[str, Any], GreedyActorCategorical, WordleEnvBase]:
+    """
+    Inference only counterpart of load_from_checkpoint, see serving.bundle
+
+    :param path: bundle directory written by export.py
+    :param verify: check the bundle's contents against its hash
+    :param compiled: run the network through TorchScript, see serving.compiled
+    :param optimize: with compiled, also fuse linear+ReLU where the build supports it
+    :param quantized: run the int8 network, only allowed if the bundle passed the accuracy guard in export.py,
+        see serving.quantized
+    :return: the bundle manifest, whose "hash" identifies the model, the agent and the env
+    """
+    assert compiled or not optimize, 'optimize only applies to the compiled network'
+    net, env, manifest = serving.bundle.load(path, verify=verify)
+    if quantized:
+        assert "quantization" in manifest, f'{path} was not exported with --quantize'
+        net = serving.quantized.quantize_network(net)
+    if compiled:
+        net = serving.compiled.compile_network(net, manifest["obs_size"], optimize=optimize)
+    assert manifest["algo"] == 'ppo', f'{path} is a {manifest["algo"]} bundle'
+    return manifest, GreedyActorCategorical(net), env
+
+
+def apply_guess(
+        env: WordleEnvBase,
+        state: wordle.state.WordleState,
+        word: str,
+        mask: List[int],
+) -> wordle.state.WordleState:
+    """
+    Advance a suggest history by one move
+
+    :param env:
+    :param state: State after the moves so far, not modified
+    :param word: Word played
+    :param mask: Outcome of word
+    :return: State after the move
+    """
+    word = word.upper()
+    assert word in env.patterns.index, f'{word} not in allowed words!'
+    assert all(i in (0, 1, 2) for i in mask)
+    assert len(mask) == 5
+
+    return wordle.state.update_from_mask(state, word, mask)
+
+
+def sequence_state(
+        env: WordleEnvBase,
+        sequence: List[Tuple[str, List[int]]],
+) -> wordle.state.WordleState:
+    """
+    :return: State after replaying every (word, mask) of sequence from a new game
+    """
+    state = wordle.state.new(env.max_turns)
+    for word, mask in sequence:
+        state = apply_guess(env, state, word, mask)
+    return state
+
+
+def suggest_states(
+        agent: GreedyActorCategorical,
+        env: WordleEnvBase,
+        states: List[wordle.state.WordleState],
+) -> List[str]:
+    """
+    Suggest the next word for each state in one forward pass, see sequence_state and apply_guess
+
+    :param agent:
+    :param env:
+    :param states:
+    :return: Next suggested word of each state
+    """
+    if not len(states):
+        return []
+    return [env.words[action] for action in agent(np.stack(states), "cpu")]
+
+
+def suggest_many(
+        agent: GreedyActorCategorical,
+        env: WordleEnvBase,
+        sequences: List[List[Tuple[str, List[int]]]],
+) -> List[str]:
+    """
+    Batched suggest, all states go through the network in one forward pass
+
+    :param agent:
+    :param env:
+    :param sequences: History of moves and outcomes of each game
+    :return: Next suggested word of each game
+    """
+    return suggest_states(agent, env, [sequence_state(env, sequence) for sequence in sequences])
+
+
 def suggest(
         agent: GreedyActorCategorical,
         env: WordleEnvBase,
@@ -34,16 +147,60 @@ def suggest(
     :param sequence: History of moves and outcomes until now
     :return:
     """
-    state = env.reset()
-    for word, mask in sequence:
-        word = word.upper()
-        assert word in env.words, f'{word} not in allowed words!'
-        assert all(i in (0, 1, 2) for i in mask)
-        assert len(mask) == 5
+    return suggest_many(agent, env, [sequence])[0]
+
+
+def goal_many(
+        agent: GreedyActorCategorical,
+        env: WordleEnvBase,
+        goal_words: List[str],
+) -> List[Tuple[bool, List[Tuple[str, int]]]]:
+    """
+    Batched goal, plays every goal word at once with one forward pass per turn
 
-        state = wordle.state.update_from_mask(state, word, mask)
+    The games are played on a stacked state array with the same rules and
+    rewards as env.step, env itself isn't touched.
 
-    return env.words[agent(state, "cpu")[0]]
+    :param agent:
+    :param env:
+    :param goal_words:
+    :return: (win, outcomes) of each game, see goal
+    """
+    goal_ids = []
+    for goal_word in goal_words:
+        try:
+            goal_ids.append(env.words.index(goal_word.upper()))
+        except ValueError:
+            raise ValueError("Goal word", goal_word, "not found in env words!")
+    goal_ids = np.array(goal_ids, dtype=np.int64)
+
+    states = np.tile(wordle.state.new(env.max_turns), (len(goal_ids), 1))
+    wins = np.zeros(len(goal_ids), dtype=np.bool_)
+    outcomes = [[] for _ in goal_ids]
+    active = np.arange(len(goal_ids))
+    for _ in range(env.max_turns):
+        if not len(active):
+            break
+        actions = np.array(agent(states[active], "cpu"), dtype=np.int64)
+        active_states = states[active]
+        wordle.state.update_batch(active_states, actions, goal_ids[active], env.patterns,
+                                  mask_based=env.mask_based_state_updates)
+        states[active] = active_states
+
+        remaining = active_states[:, 0]
+        won = actions == goal_ids[active]
+        lost = ~won & (remaining == 0)
+        for i, action, win, loss, left in zip(active, actions, won, lost, remaining):
+            reward = 0
+            if win and left != env.max_turns - 1:
+                reward = REWARD
+            elif loss:
+                reward = -REWARD
+            outcomes[i].append((env.words[action], reward))
+        wins[active] = won
+        active = active[~(won | lost)]
+
+    return [(bool(win), game) for win, game in zip(wins, outcomes)]
 
 
 def goal(
@@ -51,21 +208,72 @@ def goal(
         env: WordleEnvBase,
         goal_word: str,
 ) -> Tuple[bool, List[Tuple[str, int]]]:
-    state = env.reset()
-    try:
-        env.set_goal_word(goal_word.upper())
-    except:
-        raise ValueError("Goal word", goal_word, "not found in env words!")
-
-    outcomes = []
-    win = False
-    for i in range(env.max_turns):
-        action = agent(state, "cpu")[0]
-        state, reward, done, _ = env.step(action)
-        outcomes.append((env.words[action], reward))
-        if done:
-            if reward >= 0:
-                win = True
-            break
+    return goal_many(agent, env, [goal_word])[0]
+
+
+Evaluation = namedtuple(
+    "Evaluation",
+    field_names=["guess_counts", "losses", "trajectories"],
+)
+Evaluation.__doc__ = """\
+guess_counts = number of games won in each number of guesses, index 0 is 1 guess
+losses = goal words of the games lost
+trajectories = words guessed for each goal word, in order"""
+
+
+# Set in each pool worker by _init_worker, shared with the parent when forked
+_worker_agent = None
+_worker_env = None
+
+
+def _init_worker(agent: GreedyActorCategorical, env: WordleEnvBase, threads: int):
+    global _worker_agent, _worker_env
+    _worker_agent = agent
+    _worker_env = env
+    # Workers share the cores, don't let each of them use all of them
+    torch.set_num_threads(threads)
+
+
+def _goal_chunk(goal_words: List[str]) -> List[Tuple[bool, List[Tuple[str, int]]]]:
+    return goal_many(_worker_agent, _worker_env, goal_words)
+
+
+def evaluate(
+        agent: GreedyActorCategorical,
+        env: WordleEnvBase,
+        goal_words: Optional[List[str]] = None,
+        processes: int = 1,
+) -> Evaluation:
+    """
+    Play every goal word, see goal_many
+
+    :param agent:
+    :param env:
+    :param goal_words: Goal words to play, every answer of env if None
+    :param processes: Split the goal words across this many worker processes,
+        only worth it for large vocabularies on several cores
+    :return: Guess count distribution, losses and trajectories
+    """
+    if goal_words is None:
+        goal_words = env.words[:env.allowable_words]
+    goal_words = [goal_word.upper() for goal_word in goal_words]
+
+    if processes > 1 and len(goal_words) > 1:
+        chunk_size = -(-len(goal_words) // processes)
+        chunks = [goal_words[i:i + chunk_size] for i in range(0, len(goal_words), chunk_size)]
+        threads = max(1, torch.get_num_threads() // processes)
+        with multiprocessing.Pool(len(chunks), initializer=_init_worker, initargs=(agent, env, threads)) as pool:
+            results = [result for chunk in pool.map(_goal_chunk, chunks) for result in chunk]
+    else:
+        results = goal_many(agent, env, goal_words)
 
-    return win, outcomes
+    guess_counts = [0] * env.max_turns
+    losses = []
+    trajectories = {}
+    for goal_word, (win, outcomes) in zip(goal_words, results):
+        if win:
+            guess_counts[len(outcomes) - 1] += 1
+        else:
+            losses.append(goal_word)
+        trajectories[goal_word] = [guess for guess, _ in outcomes]
+    return Evaluation(guess_counts, losses, trajectories)
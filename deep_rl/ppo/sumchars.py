@@ -1,9 +1,11 @@
 from typing import List
 
-import numpy as np
 import torch
 from torch import nn
 
+from ppo.masking import mask_logits
+from ppo.wordindex import word_index, gather_sum
+
 class SumChars(nn.Module):
     def __init__(self, obs_size: int, word_list: List[str], n_hidden: int = 1, hidden_size: int = 256):
         """
@@ -29,25 +31,18 @@ class SumChars(nn.Module):
 
         self.f0 = nn.Sequential(*layers)
 
-        word_array = np.zeros((word_width, len(word_list)))
-        for i, word in enumerate(word_list):
-            for j, c in enumerate(word):
-                word_array[j*26 + (ord(c) - ord('A')), i] = 1
+        # W x 5 (position, letter) columns of each word, see wordindex
+        self.register_buffer('word_index', word_index(word_list), persistent=False)
 
-        self.words = torch.Tensor(word_array)
         self.actor_head = nn.Linear(word_width, word_width)
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
 
         y = self.f0(x.float())
         a = torch.log_softmax(
-            torch.tensordot(self.actor_head(y),
-                            self.words.to(self.get_device(y)),
-                            dims=((1,), (0,))),
+            mask_logits(
+                gather_sum(self.actor_head(y), self.word_index),
+                mask),
             dim=-1)
 
         return a
-
-    def get_device(self, batch) -> str:
-        """Retrieve device currently being used by minibatch."""
-        return batch[0].device.index
@@ -1,3 +1,6 @@
+import os
+import time
+
 import fire
 
 import ppo.play
@@ -6,9 +9,14 @@ import ppo.play
 def main(
         checkpoint: str,
         mode: str = 'goal',
+        processes: int = 1,
 ):
-    print("Loading from checkpoint", checkpoint, "...")
-    _, agent, env = ppo.play.load_from_checkpoint(checkpoint, evaluate=True)
+    if os.path.exists(f'{checkpoint}/manifest.json'):
+        print("Loading from bundle", checkpoint, "...")
+        _, agent, env = ppo.play.load_from_bundle(checkpoint)
+    else:
+        print("Loading from checkpoint", checkpoint, "...")
+        _, agent, env = ppo.play.load_from_checkpoint(checkpoint, evaluate=True)
     print("Got env with", len(env.words), "words!")
 
     if mode == 'goal':
@@ -16,7 +24,7 @@ def main(
     elif mode == 'suggest':
         suggest(agent, env)
     elif mode == 'evaluate':
-        evaluate(agent, env)
+        evaluate(agent, env, processes)
 
 
 def suggest(agent, env):
@@ -73,23 +81,23 @@ def goal(agent, env):
             continue
 
 
-def evaluate(agent, env):
+def evaluate(agent, env, processes):
     print("Evaluation mode")
-    n_wins = 0
-    n_guesses = 0
-    n_win_guesses = 0
     N = env.allowable_words
-    for goal_word in env.words[:N]:
-        win, outcomes = ppo.play.goal(agent, env, goal_word)
-        if win:
-            n_wins += 1
-            n_win_guesses += len(outcomes)
-        else:
-            print("Lost!", goal_word, outcomes)
-        n_guesses += len(outcomes)
-
-    print(f"Evaluation complete, won {n_wins/N}% and took {n_win_guesses/n_wins} guesses per win, "
-          f"{n_guesses / N} including losses.")
+    start = time.perf_counter()
+    evaluation = ppo.play.evaluate(agent, env, processes=processes)
+    elapsed = time.perf_counter() - start
+
+    for goal_word in evaluation.losses:
+        print("Lost!", goal_word, evaluation.trajectories[goal_word])
+    for n_guesses, count in enumerate(evaluation.guess_counts, 1):
+        print(f"{n_guesses} guesses: {count}")
+
+    n_wins = sum(evaluation.guess_counts)
+    n_win_guesses = sum(n * count for n, count in enumerate(evaluation.guess_counts, 1))
+    n_guesses = n_win_guesses + len(evaluation.losses) * env.max_turns
+    print(f"Evaluation complete in {elapsed:.1f}s, won {100 * n_wins / N:.2f}% and took "
+          f"{n_win_guesses / max(n_wins, 1):.3f} guesses per win, {n_guesses / N:.3f} including losses.")
 
 
 if __name__ == '__main__':
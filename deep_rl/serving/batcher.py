@@ -0,0 +1,184 @@
+"""
+Micro-batching for the inference endpoints
+
+Requests handed to a MicroBatcher are queued and a single worker thread
+drains the queue in batches: it waits for the first request, then keeps
+collecting until either max_batch_size requests are in hand or max_wait
+seconds have passed, and runs them all through one batched call such as
+a2c.play.suggest_many.
+
+This only helps when a process serves requests concurrently, e.g. gunicorn
+with --threads > 1. With one thread per worker every batch has size 1 and
+the batcher just adds a queue hop.
+
+Every request is answered, with an exception if its batch failed in any way,
+and submit() gives up waiting after timeout seconds.
+"""
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class BatcherMetrics:
+    """
+    Counters describing how requests are being batched, safe to read from any thread
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_size = 0
+        self.max_queue_depth = 0
+        self.errors = 0
+        # batch_sizes[n] = number of batches that had n requests
+        self.batch_sizes: Dict[int, int] = {}
+        self.wait_seconds = 0.
+
+    def record(self, batch_size: int, queue_depth: int, wait_seconds: float):
+        """
+        :param batch_size: requests in the batch that's about to run
+        :param queue_depth: requests still queued behind it
+        :param wait_seconds: summed time the batch's requests spent queued
+        """
+        with self._lock:
+            self.requests += batch_size
+            self.batches += 1
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth + batch_size)
+            self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+            self.wait_seconds += wait_seconds
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.,
+                "max_batch_size": self.max_batch_size,
+                "max_queue_depth": self.max_queue_depth,
+                "mean_wait_ms": 1000 * self.wait_seconds / self.requests if self.requests else 0.,
+                "errors": self.errors,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(self,
+                 fn: Callable[[List[T]], List[R]],
+                 max_batch_size: int = 32,
+                 max_wait: float = 0.002,
+                 timeout: Optional[float] = None):
+        """
+        :param fn: batched function, fn(items)[i] is the result for items[i]
+        :param max_batch_size: most requests passed to fn at once
+        :param max_wait: seconds to keep collecting after the first request of a batch arrives
+        :param timeout: seconds submit waits for a result before raising TimeoutError, None to wait forever
+        """
+        assert max_batch_size >= 1, 'max_batch_size must be at least 1'
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.metrics = BatcherMetrics()
+
+        self._queue: 'queue.Queue[Tuple[T, Future, float]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: threading.Thread = None
+        self._worker_pid = None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, item: T) -> R:
+        """
+        Queue item and block until its batch has run
+
+        :return: the result of fn for item, exceptions raised for it are re-raised here
+        :raises TimeoutError: if there's no result after timeout seconds
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            # The same class from Python 3.11 on, not before
+            raise TimeoutError(f'No result within {self.timeout}s')
+
+    def _ensure_worker(self):
+        # Threads don't survive a fork, so a worker started before gunicorn
+        # forked (e.g. with --preload) has to be replaced in the child
+        if self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid() and self._worker.is_alive():
+                return
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _collect(self) -> List[Tuple[T, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                now = time.monotonic()
+                self.metrics.record(len(batch), self._queue.qsize(), sum(now - queued for _, _, queued in batch))
+                self._run_batch(batch)
+            except Exception as e:
+                # Answer the batch rather than lose the thread and leave its requests waiting
+                self._fail(batch, e)
+
+    def _fail(self, batch: List[Tuple[T, Future, float]], e: Exception):
+        for _, future, _ in batch:
+            if not future.done():
+                self.metrics.record_error()
+                future.set_exception(e)
+
+    def _run_batch(self, batch: List[Tuple[T, Future, float]]):
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.fn(items)
+        except Exception as e:
+            if len(batch) == 1:
+                self.metrics.record_error()
+                batch[0][1].set_exception(e)
+                return
+            # One bad request shouldn't fail everyone it was batched with,
+            # run them one at a time so only the culprit sees the error
+            for request in batch:
+                self._run_batch([request])
+            return
+
+        if len(results) != len(batch):
+            self._fail(batch, RuntimeError(f'{len(results)} results for a batch of {len(batch)}'))
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
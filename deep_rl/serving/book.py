@@ -0,0 +1,206 @@
+"""
+Opening book for a deterministic (greedy) agent
+
+Playing the agent against every answer with the real feedback masks visits
+a finite tree of histories. Each node of the tree is a history and holds
+the word the agent plays there; its children are keyed by the pattern code
+(see wordle.patterns) that word got back. The book stores
+
+actions.npy = (nodes,) word id played at each node, node 0 is the empty history
+edges.npy = (edges,) sorted node * N_PATTERNS + code keys
+children.npy = (edges,) node reached through the matching edge
+games.npy = (answers, max_turns) word ids played for each answer by goal(), -1 once it's over
+meta.json = model_key and vocabulary the book was built for
+
+in a directory, and memory maps the arrays when loading. Histories that
+leave the tree, e.g. when the user played a word of their own, aren't in the
+book and have to be answered by the network.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import wordle.patterns
+import wordle.state
+from wordle.const import REWARD
+from wordle.wordle import WordleEnvBase
+
+
+Agent = Callable[[np.ndarray, str], List[int]]
+
+
+def words_key(words: List[str]) -> str:
+    return hashlib.sha1('\n'.join(words).encode('ascii')).hexdigest()[:16]
+
+
+def build_tree(agent: Agent, env: WordleEnvBase) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Walk the agent's decision tree over the env's answers, one batched
+    forward pass per turn over the distinct histories still in play
+
+    States follow suggest(), i.e. wordle.state.update_from_mask with the real masks.
+
+    :param agent: deterministic agent, agent(states, "cpu") -> actions
+    :param env:
+    :return: actions, edges and children arrays, see module docstring
+    """
+    goals = np.arange(env.allowable_words)
+    states = np.tile(wordle.state.new(env.max_turns), (len(goals), 1))
+    node = np.zeros(len(goals), dtype=np.int64)
+    n_nodes = 1
+
+    actions = np.full(n_nodes, -1, dtype=np.int64)
+    edges, children = [], []
+    active = goals
+    for turn in range(env.max_turns):
+        if not len(active):
+            break
+        # Every goal at the same node has the same history, and so the same state
+        nodes, first, inverse = np.unique(node[active], return_index=True, return_inverse=True)
+        node_actions = np.array(agent(states[active[first]], "cpu"), dtype=np.int64)
+        actions[nodes] = node_actions
+        played = node_actions[inverse]
+
+        codes = env.patterns.table[played, active]
+        active_states = states[active]
+        wordle.state.update_batch(active_states, played, active, env.patterns, mask_based=True)
+        states[active] = active_states
+
+        going = (codes != wordle.patterns.WIN) & (turn < env.max_turns - 1)
+        keys, key_inverse = np.unique(node[active[going]] * wordle.patterns.N_PATTERNS + codes[going],
+                                      return_inverse=True)
+        new_nodes = n_nodes + np.arange(len(keys))
+        edges.append(keys)
+        children.append(new_nodes)
+        n_nodes += len(keys)
+        actions = np.concatenate([actions, np.full(len(keys), -1, dtype=np.int64)])
+
+        active = active[going]
+        node[active] = new_nodes[key_inverse]
+
+    edges = np.concatenate(edges)
+    children = np.concatenate(children)
+    order = np.argsort(edges)
+    return actions, edges[order], children[order]
+
+
+def write(path: str,
+          actions: np.ndarray,
+          edges: np.ndarray,
+          children: np.ndarray,
+          games: np.ndarray,
+          env: WordleEnvBase,
+          model_key: str):
+    """
+    Save a book built with build_tree, see the module docstring for the layout
+
+    :param games: (answers, max_turns) word ids played by goal() for each answer, -1 padded
+    """
+    os.makedirs(path, exist_ok=True)
+    np.save(f'{path}/actions.npy', actions.astype(np.int32))
+    np.save(f'{path}/edges.npy', edges.astype(np.int64))
+    np.save(f'{path}/children.npy', children.astype(np.int32))
+    np.save(f'{path}/games.npy', games.astype(np.int32))
+    with open(f'{path}/meta.json', 'w') as f:
+        json.dump({
+            "model_key": model_key,
+            "words_key": words_key(env.words),
+            "max_turns": env.max_turns,
+        }, f)
+
+
+class OpeningBook:
+    def __init__(self, path: str, words: List[str]):
+        """
+        :param path: directory written by write()
+        :param words: vocabulary of the env the book was built with
+        """
+        with open(f'{path}/meta.json') as f:
+            self.meta: Dict = json.load(f)
+        self.words = words
+        self.index = {w: i for i, w in enumerate(words)}
+        self.max_turns = self.meta["max_turns"]
+        self.actions = np.load(f'{path}/actions.npy', mmap_mode='r')
+        self.edges = np.load(f'{path}/edges.npy', mmap_mode='r')
+        self.children = np.load(f'{path}/children.npy', mmap_mode='r')
+        self.games = np.load(f'{path}/games.npy', mmap_mode='r')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def load(path: str, model_key: str, words: List[str]) -> Optional['OpeningBook']:
+        """
+        :return: the book at path, or None if there isn't one for this model and vocabulary
+        """
+        if not os.path.exists(f'{path}/meta.json'):
+            return None
+        book = OpeningBook(path, words)
+        if book.meta["model_key"] != model_key or book.meta["words_key"] != words_key(words):
+            print(f"Ignoring opening book {path}, it was built for a different model")
+            return None
+        return book
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "histories": len(self.actions)}
+
+    def _child(self, node: int, code: int) -> Optional[int]:
+        key = node * wordle.patterns.N_PATTERNS + code
+        i = int(np.searchsorted(self.edges, key))
+        if i == len(self.edges) or self.edges[i] != key:
+            return None
+        return int(self.children[i])
+
+    def suggest(self, sequence: List[Tuple[str, List[int]]]) -> Optional[str]:
+        """
+        :param sequence: History of moves and outcomes, as for a2c.play.suggest
+        :return: the suggestion, or None if the history isn't in the book
+        """
+        node = 0
+        for word, mask in sequence:
+            if self.index.get(word.upper()) != self.actions[node]:
+                self._count(False)
+                return None
+            node = self._child(node, wordle.patterns.encode(mask))
+            if node is None:
+                self._count(False)
+                return None
+        self._count(True)
+        return self.words[self.actions[node]]
+
+    def goal(self, goal_word: str) -> Optional[Tuple[bool, List[Tuple[str, int]]]]:
+        """
+        :return: the same (win, outcomes) as a2c.play.goal, or None if goal_word isn't in the book
+        """
+        goal_id = self.index.get(goal_word.upper())
+        if goal_id is None or goal_id >= len(self.games):
+            self._count(False)
+            return None
+        self._count(True)
+
+        outcomes = []
+        win = False
+        for turn, action in enumerate(self.games[goal_id]):
+            if action < 0:
+                break
+            reward = 0
+            if action == goal_id:
+                win = True
+                if turn != 0:
+                    reward = REWARD
+            elif turn == self.max_turns - 1:
+                reward = -REWARD
+            outcomes.append((self.words[action], reward))
+        return win, outcomes
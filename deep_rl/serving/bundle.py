@@ -0,0 +1,228 @@
+"""
+Slim inference bundle for a trained policy network
+
+A bundle is a directory with everything needed to rebuild the greedy agent
+and its env with torch alone, without pytorch_lightning, wandb, h5py or gym:
+
+manifest.json = algo, network name and kwargs, env config, the layout of weights.bin and a content hash
+weights.bin = every tensor of the network's state_dict back to back, 64 byte aligned
+words.txt = the env vocabulary, one word per line
+
+The hash covers the weights, the words and the rest of the manifest, so it
+identifies the model for caches and opening books across processes and
+restarts.
+
+load() memory maps weights.bin copy-on-write and points the network's
+parameters straight at the mapping, so every process that loads the same
+bundle (e.g. gunicorn workers) shares one copy of the weights in the page
+cache instead of each holding its own.
+"""
+import hashlib
+import importlib
+import inspect
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+from wordle.wordle import WordleEnvBase
+
+
+# 2: the manifest carries the content hash
+FORMAT_VERSION = 2
+_ALIGN = 64
+
+
+def _network_package(algo: str):
+    if algo not in ('a2c', 'ppo'):
+        raise ValueError(f"Unknown algo {algo}, expected a2c or ppo")
+    # Only the network registry, not the Lightning module
+    return importlib.import_module(algo)
+
+
+def env_config(env: WordleEnvBase) -> Dict[str, Any]:
+    return {
+        "max_turns": env.max_turns,
+        "allowable_words": env.allowable_words,
+        "mask_based_state_updates": env.mask_based_state_updates,
+    }
+
+
+def save(path: str,
+         algo: str,
+         network_name: str,
+         network_kwargs: Dict[str, Any],
+         net: nn.Module,
+         env: WordleEnvBase):
+    """
+    Write net and the env it plays in as a bundle at path
+
+    :param algo: a2c or ppo, which package's network registry built net
+    :param network_name: registered name of net, e.g. SumChars
+    :param network_kwargs: construct() kwargs of net other than obs_size and word_list
+    """
+    os.makedirs(path, exist_ok=True)
+    tensors = []
+    offset = 0
+    with open(f'{path}/weights.bin', 'wb') as f:
+        for name, tensor in net.state_dict().items():
+            array = tensor.detach().cpu().contiguous().numpy()
+            padding = -offset % _ALIGN
+            f.write(b'\0' * padding)
+            offset += padding
+            tensors.append({
+                "name": name,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            })
+            f.write(array.tobytes())
+            offset += array.nbytes
+
+    with open(f'{path}/words.txt', 'w') as f:
+        f.write('\n'.join(env.words))
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "algo": algo,
+        "network_name": network_name,
+        "network_kwargs": network_kwargs,
+        "obs_size": env.observation_space.shape[0],
+        "env": env_config(env),
+        "tensors": tensors,
+    }
+    manifest["hash"] = content_hash(path, manifest)
+    with open(f'{path}/manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def content_hash(path: str, manifest: Dict[str, Any]) -> str:
+    """
+    :param path: bundle directory holding weights.bin and words.txt
+    :param manifest: manifest of the bundle, its own "hash" entry is ignored
+    :return: hex digest identifying the bundle's contents
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({k: v for k, v in manifest.items() if k != "hash"}, sort_keys=True).encode())
+    for name in ('weights.bin', 'words.txt'):
+        with open(f'{path}/{name}', 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _make_env(env_id: str) -> WordleEnvBase:
+    # Only needed to export, importing gym on the serving path would cost it ~0.2s
+    import gym
+    import wordle.envs  # registers the envs with gym
+    # Same env as gym.make(env_id).unwrapped, without gym's wrappers and checks
+    module, name = gym.spec(env_id).entry_point.split(':')
+    return getattr(importlib.import_module(module), name)()
+
+
+def export_checkpoint(checkpoint: str, path: str, algo: str = 'a2c'):
+    """
+    Write the policy network of a Lightning checkpoint as a bundle
+
+    The checkpoint is read with torch.load, without importing the Lightning
+    module. Only the network is kept, optimizer state and critic are dropped.
+
+    :param checkpoint: local path or URL of an AdvantageActorCritic/PPO checkpoint
+    :param path: bundle directory to write
+    :param algo: a2c or ppo
+    """
+    # Only needed to export, like gym in _make_env
+    import fsspec
+
+    load_kwargs = {}
+    if 'weights_only' in inspect.signature(torch.load).parameters:
+        # Checkpoints pickle their hyperparameters
+        load_kwargs['weights_only'] = False
+    with fsspec.open(checkpoint, 'rb') as f:
+        ckpt = torch.load(f, map_location='cpu', **load_kwargs)
+
+    hparams = ckpt['hyper_parameters']
+    env = _make_env(hparams['env'])
+    network_kwargs = {"n_hidden": hparams['n_hidden'], "hidden_size": hparams['hidden_size']}
+    net = _network_package(algo).construct(
+        hparams['network_name'],
+        obs_size=env.observation_space.shape[0],
+        word_list=env.words,
+        **network_kwargs)
+    net.load_state_dict({name[len('net.'):]: tensor for name, tensor in ckpt['state_dict'].items()
+                         if name.startswith('net.')})
+    save(path, algo, hparams['network_name'], network_kwargs, net, env)
+
+
+def update_manifest(path: str, **fields: Any) -> Dict[str, Any]:
+    """
+    Add fields to a bundle's manifest and recompute its hash
+
+    :return: the updated manifest
+    """
+    manifest = read_manifest(path)
+    manifest.update(fields)
+    manifest["hash"] = content_hash(path, manifest)
+    with open(f'{path}/manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(f'{path}/manifest.json') as f:
+        manifest = json.load(f)
+    if manifest["format"] != FORMAT_VERSION:
+        raise ValueError(f"Bundle {path} has format {manifest['format']}, expected {FORMAT_VERSION}")
+    return manifest
+
+
+def read_words(path: str) -> List[str]:
+    with open(f'{path}/words.txt') as f:
+        return f.read().split('\n')
+
+
+def _map_weights(path: str, manifest: Dict[str, Any]) -> Dict[str, torch.Tensor]:
+    # Copy-on-write, pages are shared between processes until someone writes to them
+    raw = np.memmap(f'{path}/weights.bin', dtype=np.uint8, mode='c')
+    tensors = {}
+    for spec in manifest["tensors"]:
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        array = raw[spec["offset"]:spec["offset"] + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+        tensors[spec["name"]] = torch.from_numpy(array)
+    return tensors
+
+
+def load(path: str, verify: bool = False) -> Tuple[nn.Module, WordleEnvBase, Dict[str, Any]]:
+    """
+    :param path: bundle directory written by save()
+    :param verify: recompute the content hash and fail if it doesn't match the manifest
+    :return: network in eval mode with memory mapped weights, the env and the manifest
+    """
+    manifest = read_manifest(path)
+    if verify and content_hash(path, manifest) != manifest["hash"]:
+        raise ValueError(f"Bundle {path} is corrupt, its contents don't match the manifest hash")
+    words = read_words(path)
+    env = WordleEnvBase(words=words, **manifest["env"])
+
+    net = _network_package(manifest["algo"]).construct(
+        manifest["network_name"],
+        obs_size=manifest["obs_size"],
+        word_list=words,
+        **manifest["network_kwargs"])
+
+    tensors = _map_weights(path, manifest)
+    targets = net.state_dict(keep_vars=True)
+    missing = set(targets) ^ set(tensors)
+    if missing:
+        raise ValueError(f"Bundle {path} doesn't match {manifest['network_name']}, mismatched tensors {sorted(missing)}")
+    for name, tensor in tensors.items():
+        assert targets[name].shape == tensor.shape, f'{name}: {tuple(targets[name].shape)} vs {tuple(tensor.shape)}'
+        # Swap the storage rather than copy into it, so the mapping is what's used
+        targets[name].data = tensor
+    net.requires_grad_(False)
+    net.eval()
+    return net, env, manifest
@@ -0,0 +1,98 @@
+"""
+Bounded LRU cache for inference responses
+
+The greedy agents are deterministic, so a response only depends on the
+model and the request. Keys are built with model_key() and
+canonical_sequence() so equivalent requests ("stare" vs "STARE", a mask
+as a list or tuple) share an entry.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import torch
+
+
+Sequence = Tuple[Tuple[str, Tuple[int, ...]], ...]
+
+
+def canonical_sequence(sequence: List[Tuple[str, List[int]]]) -> Sequence:
+    """
+    :param sequence: (word, mask) history as passed to a2c.play.suggest
+    :return: hashable form with upper case words and int masks
+    """
+    return tuple((word.upper(), tuple(int(i) for i in mask)) for word, mask in sequence)
+
+
+def model_key(net: torch.nn.Module) -> str:
+    """
+    Identity of a network's weights, changes whenever a parameter or buffer does
+    """
+    digest = hashlib.sha1()
+    for name, tensor in net.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 10000):
+        """
+        :param maxsize: entries kept before the least recently used is evicted, 0 disables caching
+        """
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Hashable, object]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[object]:
+        """
+        :return: the cached value, or None on a miss
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: object):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]) -> object:
+        """
+        Look key up, calling compute and caching its result on a miss. The
+        lock isn't held while computing, so concurrent misses on the same key
+        may both compute.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.,
+            }
@@ -0,0 +1,77 @@
+"""
+TorchScript inference mode for the registered networks
+
+compile_network() traces a network's unmasked forward pass and freezes it,
+which turns the weights into constants, precomputes everything that only
+depends on them (e.g. the EmbeddingChars word projection). With optimize,
+torch.jit.optimize_for_inference also fuses linear+ReLU and moves to MKLDNN
+where the build supports it; check benchmarks.inference on the target machine,
+it isn't a win at every batch size. The result is called exactly like the
+eager network, net(x, mask=None).
+
+gather_sum picks a different kernel for a single row than for a batch, and a
+trace only records the path it took, so one graph is traced for each.
+Masks are applied to the traced log probabilities, log_softmax(mask_logits(.))
+of a log_softmax is the same as of the raw logits.
+"""
+import warnings
+from typing import Optional
+
+import torch
+from torch import nn
+
+from a2c.masking import mask_logits
+
+
+def _freeze(module: torch.jit.ScriptModule, optimize: bool) -> torch.jit.ScriptModule:
+    frozen = torch.jit.freeze(module.eval())
+    if optimize and hasattr(torch.jit, 'optimize_for_inference'):
+        frozen = torch.jit.optimize_for_inference(frozen)
+    return frozen
+
+
+class _Unmasked(nn.Module):
+    def __init__(self, net: nn.Module):
+        super().__init__()
+        self.net = net
+
+    def forward(self, x):
+        return self.net(x)
+
+
+class CompiledNetwork(nn.Module):
+    def __init__(self, net: nn.Module, obs_size: int, optimize: bool = False):
+        """
+        :param net: SumChars or EmbeddingChars from the a2c or ppo registry, only used to trace
+        :param obs_size: observation size the network was built for
+        :param optimize: run optimize_for_inference on the frozen graphs
+        """
+        super().__init__()
+        net = net.eval()
+        unmasked = _Unmasked(net)
+        with torch.no_grad(), warnings.catch_warnings():
+            # gather_sum branching on the batch size is why there are two traces
+            warnings.simplefilter('ignore', torch.jit.TracerWarning)
+            single = torch.zeros(1, obs_size)
+            batch = torch.zeros(2, obs_size)
+            self.single = _freeze(torch.jit.trace(unmasked, single, check_trace=False), optimize)
+            self.batched = _freeze(torch.jit.trace(unmasked, batch, check_trace=False), optimize)
+            self.returns_critic = isinstance(net(single), tuple)
+
+    def forward(self, x: torch.Tensor, mask: Optional[torch.Tensor] = None):
+        x = x.float()
+        out = self.single(x) if x.shape[0] == 1 else self.batched(x)
+        if mask is None:
+            return out
+        if self.returns_critic:
+            a, c = out
+            return torch.log_softmax(mask_logits(a, mask), dim=-1), c
+        return torch.log_softmax(mask_logits(out, mask), dim=-1)
+
+
+def compile_network(net: nn.Module, obs_size: int, optimize: bool = False) -> CompiledNetwork:
+    """
+    :return: inference only, frozen version of net. Later changes to net's
+        weights aren't seen by it, compile again after loading new weights.
+    """
+    return CompiledNetwork(net, obs_size, optimize)
@@ -0,0 +1,70 @@
+"""
+Dynamic int8 quantization of the policy networks, with an accuracy guard
+
+quantize_network() swaps the network's nn.Linear layers for dynamically
+quantized ones: int8 weights, activations quantized on the fly. The
+EmbeddingChars word encoder f_word is left in fp32, its output over the
+vocabulary is computed once and memoized anyway (see project_words).
+
+Quantization changes which word wins the argmax every now and then, so a
+quantized network is only served after check_accuracy() has played it
+against every answer and its win rate is within max_drop of the fp32 one.
+export.py records the result in the bundle manifest.
+"""
+import copy
+from typing import Dict, List
+
+import torch
+from torch import nn
+
+from wordle.wordle import WordleEnvBase
+
+
+def _quantizable(net: nn.Module) -> List[str]:
+    return [name for name, module in net.named_modules()
+            if isinstance(module, nn.Linear) and not name.startswith('f_word')]
+
+
+def quantize_network(net: nn.Module) -> nn.Module:
+    """
+    :return: quantized copy of net in eval mode, net itself is left alone
+    """
+    if not torch.backends.quantized.supported_engines:
+        raise RuntimeError("This torch build has no quantized engine")
+    return torch.quantization.quantize_dynamic(
+        copy.deepcopy(net).eval(), set(_quantizable(net)), dtype=torch.qint8)
+
+
+def win_rate(agent, env: WordleEnvBase) -> float:
+    """
+    :param agent: greedy agent, agent(states, "cpu") -> actions
+    :return: fraction of the env's answers the agent wins
+    """
+    # a2c.play loads bundles through this module
+    import a2c.play
+
+    results = a2c.play.goal_many(agent, env, env.words[:env.allowable_words])
+    return sum(win for win, _ in results) / len(results)
+
+
+def check_accuracy(agent, quantized_agent, env: WordleEnvBase, max_drop: float) -> Dict[str, float]:
+    """
+    Compare the win rates of an agent and its quantized counterpart on every answer
+
+    :param agent: agent running the fp32 network
+    :param quantized_agent: same agent running quantize_network() of it
+    :param env:
+    :param max_drop: largest acceptable drop in win rate, as a fraction
+    :return: both win rates
+    :raises ValueError: if the quantized win rate dropped by more than max_drop
+    """
+    rates = {
+        "win_rate": win_rate(agent, env),
+        "quantized_win_rate": win_rate(quantized_agent, env),
+    }
+    drop = rates["win_rate"] - rates["quantized_win_rate"]
+    # Win rates are multiples of 1/len(answers), don't fail on rounding at the threshold
+    if drop > max_drop + 1e-9:
+        raise ValueError(f"Quantized win rate {rates['quantized_win_rate']:.4f} is {drop:.4f} below "
+                         f"fp32 {rates['win_rate']:.4f}, more than the allowed {max_drop}")
+    return rates
@@ -0,0 +1,105 @@
+"""
+Server side game sessions for incremental suggestions
+
+A session keeps the state of a game after its last move, so suggesting
+after turn k+1 applies one update instead of replaying the whole history.
+Sessions expire ttl seconds after they were last used and the least
+recently used are dropped beyond maxsize.
+
+Sessions live in the memory of the process that created them. Behind
+several gunicorn workers a request can land on a worker that doesn't know
+the session, and clients should fall back to the stateless API, sending
+the whole history, when a session isn't found.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class Session:
+    __slots__ = ['state', 'sequence', 'last_used']
+
+    def __init__(self, state: np.ndarray, sequence: Tuple[Tuple[str, Tuple[int, ...]], ...] = ()):
+        self.state = state
+        # Canonical history, see serving.cache.canonical_sequence
+        self.sequence = sequence
+        self.last_used = time.monotonic()
+
+    def history(self) -> List[Tuple[str, List[int]]]:
+        return [(word, list(mask)) for word, mask in self.sequence]
+
+
+class SessionStore:
+    def __init__(self, ttl: float = 600., maxsize: int = 100000):
+        """
+        :param ttl: seconds of inactivity before a session expires
+        :param maxsize: most sessions kept, the least recently used are evicted first
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self, now: float):
+        # Sessions are kept in order of last use, so expired ones are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.ttl:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def create(self, state: np.ndarray) -> str:
+        """
+        :param state: initial state of the game
+        :return: id of the new session
+        """
+        session_id = uuid.uuid4().hex
+        self.put(session_id, Session(state))
+        with self._lock:
+            self.created += 1
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """
+        :return: the session, or None if it expired or never existed here
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session_id: str, session: Session):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session.last_used = now
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
@@ -0,0 +1,114 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+import torch
+
+import a2c
+import wordle.envs
+import wordle.state
+from a2c.actors import Actor, SharedRingBuffer, SharedWeights, run_actor, slot_layout
+
+
+def _config(**kwargs):
+    return dict({
+        "env": "WordleEnv10-v0",
+        "network_name": "SumChars",
+        "n_hidden": 1,
+        "hidden_size": 16,
+        "num_envs": 4,
+        "n_steps": 8,
+        "gamma": 0.9,
+        "mask_actions": False,
+        "prob_play_lost_word": 0.,
+        "prob_cheat": 0.,
+        "seed": 0,
+    }, **kwargs)
+
+
+def _layout(config, n_words=10):
+    return slot_layout(config["n_steps"], config["num_envs"], len(wordle.state.new(6)), n_words, 6,
+                       config["mask_actions"])
+
+
+def _fill(buffer, value):
+    buffer.put({name: np.full((buffer.slots,) + shape, value, dtype=dtype)[0]
+                for name, (shape, dtype) in buffer.layout.items()})
+
+
+def _producer(buffer, start):
+    for value in range(start, start + 3):
+        _fill(buffer, value)
+
+
+def test_ring_buffer_across_processes():
+    ctx = multiprocessing.get_context()
+    buffer = SharedRingBuffer(2, {"x": ((3,), np.int64), "y": ((2, 2), np.float32)}, ctx)
+    producers = [ctx.Process(target=_producer, args=(buffer, start)) for start in (0, 10)]
+    for producer in producers:
+        producer.start()
+    values = []
+    for _ in range(6):
+        batch = buffer.get(timeout=10)
+        assert np.all(batch["x"] == batch["x"][0]) and np.all(batch["y"] == batch["x"][0])
+        values.append(int(batch["x"][0]))
+    for producer in producers:
+        producer.join()
+    # Each producer's batches arrive in order
+    assert [v for v in values if v < 10] == [0, 1, 2]
+    assert [v for v in values if v >= 10] == [10, 11, 12]
+
+
+def test_shared_weights():
+    torch.manual_seed(0)
+    make = lambda: a2c.construct("SumChars", obs_size=len(wordle.state.new(6)), word_list=["ABCDE", "FGHIJ"],
+                                 n_hidden=1, hidden_size=8)
+    learner, actor = make(), make()
+    weights = SharedWeights(learner)
+    assert weights.pull(actor, 0) == 0
+    weights.publish(learner)
+    assert weights.pull(actor, 0) == 1
+    for a, b in zip(learner.parameters(), actor.parameters()):
+        assert torch.equal(a, b)
+
+
+@pytest.mark.parametrize("mask_actions", [False, True])
+def test_actor_plays_batches(mask_actions):
+    config = _config(mask_actions=mask_actions)
+    buffer = SharedRingBuffer(1, _layout(config))
+    actor = Actor(config)
+    for _ in range(3):
+        slot = buffer.acquire()
+        actor.play({name: array[slot] for name, array in buffer.arrays.items()})
+        buffer.commit(slot)
+        batch = buffer.get()
+
+        states = batch["states"].reshape(config["n_steps"], config["num_envs"], -1)
+        dones = batch["dones"].reshape(config["n_steps"], config["num_envs"])
+        # A game's next state is one turn further, or a new game after it ended
+        remaining = states[:, :, 0]
+        assert np.all((remaining[1:] == remaining[:-1] - 1) | (dones[:-1] & (remaining[1:] == 6)))
+        n = int(batch["n_episodes"][0])
+        assert n == dones.sum()
+        assert np.all(batch["episode_turns"][:n] >= 1)
+        assert np.all(batch["episode_won"][:n] == (batch["episode_reward"][:n] >= 0))
+        if mask_actions:
+            assert batch["action_masks"][np.arange(len(batch["actions"])), batch["actions"]].all()
+
+
+def test_run_actor_stops():
+    ctx = multiprocessing.get_context()
+    config = _config()
+    net = a2c.construct("SumChars", obs_size=len(wordle.state.new(6)),
+                        word_list=wordle.envs.WordleEnv10().words, n_hidden=1, hidden_size=16)
+    weights = SharedWeights(net, ctx)
+    weights.publish(net)
+    buffer = SharedRingBuffer(2, _layout(config), ctx)
+    stop = ctx.Event()
+    process = ctx.Process(target=run_actor, args=(0, config, weights, buffer, stop), daemon=True)
+    process.start()
+    for _ in range(4):
+        assert buffer.get(timeout=30)["actions"].shape == (32,)
+    stop.set()
+    process.join(timeout=10)
+    assert process.exitcode == 0
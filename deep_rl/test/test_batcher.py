@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from serving.batcher import MicroBatcher
+
+
+def _submit_concurrently(batcher, items):
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    start = threading.Barrier(len(items))
+
+    def run(i):
+        start.wait()
+        try:
+            results[i] = batcher.submit(items[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_requests_share_batches():
+    calls = []
+
+    def square_all(items):
+        calls.append(len(items))
+        return [i * i for i in items]
+
+    batcher = MicroBatcher(square_all, max_batch_size=8, max_wait=0.05)
+    results, errors = _submit_concurrently(batcher, list(range(16)))
+
+    assert results == [i * i for i in range(16)]
+    assert errors == [None] * 16
+    assert max(calls) <= 8
+    assert len(calls) < 16
+
+    metrics = batcher.metrics.snapshot()
+    assert metrics["requests"] == 16
+    assert metrics["batches"] == len(calls)
+    assert metrics["max_batch_size"] == max(calls)
+    assert sum(n * count for n, count in metrics["batch_sizes"].items()) == 16
+
+
+def test_errors_only_reach_the_failing_request():
+    def invert_all(items):
+        return [1 / i for i in items]
+
+    batcher = MicroBatcher(invert_all, max_batch_size=4, max_wait=0.05)
+    results, errors = _submit_concurrently(batcher, [1, 2, 0, 4])
+
+    assert isinstance(errors[2], ZeroDivisionError)
+    assert [r for i, r in enumerate(results) if i != 2] == [1., 0.5, 0.25]
+    assert batcher.metrics.snapshot()["errors"] == 1
+
+
+def test_single_request():
+    batcher = MicroBatcher(lambda items: [i + 1 for i in items], max_batch_size=1)
+    assert batcher.submit(1) == 2
+    with pytest.raises(TypeError):
+        batcher.submit("a")
+
+
+def test_short_results_fail_the_whole_batch():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait=0.05, timeout=5)
+    results, errors = _submit_concurrently(batcher, [1, 2, 3, 4])
+
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert batcher.metrics.snapshot()["errors"] == 4
+
+
+def test_worker_errors_outside_fn_are_answered():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=4, max_wait=0.05, timeout=5)
+
+    def broken_record(*args):
+        raise ValueError("metrics broke")
+    batcher.metrics.record = broken_record
+
+    with pytest.raises(ValueError):
+        batcher.submit(1)
+    # The worker survived to answer the next one
+    with pytest.raises(ValueError):
+        batcher.submit(2)
+
+
+def test_submit_times_out():
+    release = threading.Event()
+
+    def stuck(items):
+        release.wait()
+        return items
+
+    batcher = MicroBatcher(stuck, timeout=0.05)
+    with pytest.raises(TimeoutError):
+        batcher.submit(1)
+    release.set()
+    assert batcher.submit(2) == 2
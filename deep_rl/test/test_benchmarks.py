@@ -0,0 +1,27 @@
+import json
+
+import benchmarks.env
+import benchmarks.inference
+from benchmarks.common import write_results
+
+
+def test_env_benchmark(tmp_path):
+    results = benchmarks.env.run(n_words=20, steps=30, num_envs=4, batch_size=8, repeat=2)
+    paths = {(r["benchmark"], r.get("env"), r.get("path")) for r in results}
+    assert ("env_step", "WordleEnvBase", "update") in paths
+    assert ("env_step", "WordleVecEnv", "update_mask") in paths
+    assert {r["updater"] for r in results if r["benchmark"] == "state_update"} >= {"update", "update_mask",
+                                                                                  "update_batch"}
+
+    write_results("env", results, str(tmp_path / "env.json"))
+    with open(tmp_path / "env.json") as f:
+        report = json.load(f)
+    assert report["benchmark"] == "env" and len(report["results"]) == len(results)
+    assert "torch" in report["environment"]
+
+
+def test_inference_benchmark_covers_registry():
+    results = benchmarks.inference.run(batch_sizes=(1, 3), n_words=20, hidden_size=8, repeat=2)
+    assert {(r["algo"], r["network"]) for r in results} == set(benchmarks.inference.NETWORKS)
+    assert {r["mode"] for r in results} == {"eager", "compiled", "optimized", "quantized"}
+    assert all(r["p99_ms"] >= r["p50_ms"] > 0 for r in results)
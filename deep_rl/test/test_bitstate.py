@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+import wordle.state
+import wordle.wordle
+from wordle.bitstate import BitState
+
+from test.test_wordle import TESTWORDS
+
+
+@pytest.fixture(scope="module")
+def words():
+    return wordle.wordle._load_words()
+
+
+def _play(words, update, bit_update, seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        goal_word = rng.choice(words)
+        state = wordle.state.new(6)
+        bit_state = BitState(6)
+        buffer = np.zeros_like(state)
+        for _ in range(6):
+            word = rng.choice(words)
+            state = update(state, word, goal_word)
+            bit_update(bit_state, word, goal_word)
+            assert bit_state.expand(buffer) is buffer
+            assert np.array_equal(buffer, state), (word, goal_word)
+
+
+def test_update_matches_state(words):
+    _play(words + TESTWORDS, wordle.state.update, BitState.update, seed=13)
+
+
+def test_update_from_mask_matches_state(words):
+    def bit_update(bit_state, word, goal_word):
+        bit_state.update_from_mask(word, wordle.state.get_mask(word, goal_word))
+    _play(words + TESTWORDS, wordle.state.update_mask, bit_update, seed=17)
+
+
+def test_update_from_random_masks(words):
+    # Masks that no goal word produces still have to match
+    rng = random.Random(19)
+    for _ in range(500):
+        state = wordle.state.new(6)
+        bit_state = BitState(6)
+        for _ in range(3):
+            word = rng.choice(TESTWORDS + words[:50])
+            mask = [rng.randrange(3) for _ in range(5)]
+            state = wordle.state.update_from_mask(state, word, mask)
+            bit_state.update_from_mask(word, mask)
+            assert np.array_equal(bit_state.expand(), state), (word, mask)
+
+
+def test_from_array_round_trip(words):
+    state = wordle.state.new(6)
+    for word in ["CRANE", "SLOTH", "EERIE"]:
+        state = wordle.state.update(state, word, "ERASE")
+    bit_state = BitState.from_array(state)
+    assert np.array_equal(bit_state.expand(), state)
+    copy = bit_state.copy()
+    copy.update("ERASE", "ERASE")
+    assert np.array_equal(bit_state.expand(), state)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import a2c.play
+import serving.book
+import wordle.patterns
+from serving.book import OpeningBook
+from wordle.wordle import WordleEnvBase
+
+from test.test_play import _agent
+from test.test_wordle import TESTWORDS
+
+
+@pytest.fixture
+def env():
+    return WordleEnvBase(words=TESTWORDS, max_turns=6, allowable_words=8)
+
+
+@pytest.fixture
+def book(env, tmp_path):
+    agent = _agent(a2c.play)
+    actions, edges, children = serving.book.build_tree(agent, env)
+    games = np.full((env.allowable_words, env.max_turns), -1)
+    for i, (_, outcomes) in enumerate(a2c.play.goal_many(agent, env, env.words[:env.allowable_words])):
+        games[i, :len(outcomes)] = [env.words.index(guess) for guess, _ in outcomes]
+    serving.book.write(str(tmp_path), actions, edges, children, games, env, model_key="model")
+    return OpeningBook.load(str(tmp_path), "model", env.words)
+
+
+def test_book_follows_the_agent(env, book):
+    agent = _agent(a2c.play)
+    for goal_id, goal_word in enumerate(env.words[:env.allowable_words]):
+        sequence = []
+        for _ in range(env.max_turns):
+            suggestion = book.suggest(sequence)
+            assert suggestion == a2c.play.suggest(agent, env, sequence)
+            if suggestion == goal_word:
+                break
+            sequence.append((suggestion.lower(), env.patterns.mask(env.words.index(suggestion), goal_id)))
+        assert book.goal(goal_word.lower()) == a2c.play.goal(agent, env, goal_word)
+
+
+def test_off_book_histories(env, book):
+    opener = book.suggest([])
+    other = next(w for w in env.words if w != opener)
+    assert book.suggest([(other, [0, 0, 0, 0, 0])]) is None
+    # Every mask the opener can get from an answer is in the book, a made up one isn't
+    seen = {wordle.patterns.encode(env.patterns.get_mask(opener, goal)) for goal in env.words[:env.allowable_words]}
+    unseen = next(code for code in range(wordle.patterns.N_PATTERNS) if code not in seen)
+    assert book.suggest([(opener, wordle.patterns.decode(unseen))]) is None
+    # Only the answers have games
+    assert book.goal(env.words[-1]) is None
+    assert book.goal("ZZZZZ") is None
+
+
+def test_book_is_only_loaded_for_its_model(env, book, tmp_path):
+    assert OpeningBook.load(str(tmp_path), "other model", env.words) is None
+    assert OpeningBook.load(str(tmp_path), "model", list(reversed(env.words))) is None
+    assert OpeningBook.load(str(tmp_path / "missing"), "model", env.words) is None
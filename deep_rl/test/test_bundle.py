@@ -0,0 +1,149 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import torch
+
+import a2c
+import a2c.play
+import ppo
+import ppo.play
+import serving.bundle
+import serving.compiled
+import wordle.state
+from wordle.envs import WordleEnv10
+from wordle.wordle import WordleEnvBase
+
+from test.test_wordle import TESTWORDS
+
+
+def _net(package, name, words):
+    torch.manual_seed(3)
+    return package.construct(name, obs_size=len(wordle.state.new(6)), word_list=words, n_hidden=1, hidden_size=32)
+
+
+def _logprobs(out):
+    return out[0] if isinstance(out, tuple) else out
+
+
+@pytest.mark.parametrize("algo,package,name", [("a2c", a2c, "SumChars"), ("a2c", a2c, "EmbeddingChars"),
+                                               ("ppo", ppo, "SumChars")])
+def test_bundle_round_trip(tmp_path, algo, package, name):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6, allowable_words=8, mask_based_state_updates=True)
+    net = _net(package, name, TESTWORDS)
+    serving.bundle.save(str(tmp_path), algo, name, {"n_hidden": 1, "hidden_size": 32}, net, env)
+
+    loaded, loaded_env, manifest = serving.bundle.load(str(tmp_path))
+    assert loaded_env.words == env.words
+    assert serving.bundle.env_config(loaded_env) == serving.bundle.env_config(env)
+    assert manifest["algo"] == algo and manifest["network_name"] == name
+
+    states = torch.as_tensor(np.tile(wordle.state.new(6), (3, 1)))
+    with torch.no_grad():
+        assert torch.equal(_logprobs(loaded(states)), _logprobs(net(states)))
+    assert all(not p.requires_grad for p in loaded.parameters())
+
+
+def test_export_checkpoint(tmp_path):
+    env = WordleEnv10()
+    net = _net(a2c, "SumChars", env.words)
+    ckpt = {
+        "hyper_parameters": {"env": "WordleEnv10-v0", "network_name": "SumChars", "n_hidden": 1, "hidden_size": 32},
+        "state_dict": dict({f"net.{k}": v for k, v in net.state_dict().items()},
+                           **{"optimizer_only.weight": torch.zeros(3)}),
+    }
+    torch.save(ckpt, str(tmp_path / "model.ckpt"))
+    serving.bundle.export_checkpoint(str(tmp_path / "model.ckpt"), str(tmp_path / "bundle"))
+
+    loaded, loaded_env, _ = serving.bundle.load(str(tmp_path / "bundle"))
+    assert loaded_env.words == env.words
+    for name, tensor in net.state_dict().items():
+        assert torch.equal(loaded.state_dict()[name], tensor)
+
+
+def test_bundle_must_match_network(tmp_path):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6)
+    serving.bundle.save(str(tmp_path), "a2c", "SumChars", {"n_hidden": 1, "hidden_size": 32},
+                        _net(a2c, "SumChars", TESTWORDS), env)
+    manifest = serving.bundle.read_manifest(str(tmp_path))
+    manifest["network_kwargs"]["n_hidden"] = 2
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError):
+        serving.bundle.load(str(tmp_path))
+
+
+def _save(path, net):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6)
+    serving.bundle.save(str(path), "a2c", "SumChars", {"n_hidden": 1, "hidden_size": 32}, net, env)
+    return serving.bundle.read_manifest(str(path))["hash"]
+
+
+def test_content_hash_identifies_the_model(tmp_path):
+    net = _net(a2c, "SumChars", TESTWORDS)
+    first = _save(tmp_path / "first", net)
+    assert _save(tmp_path / "again", net) == first
+    with torch.no_grad():
+        net.actor_head.bias[0] += 1
+    assert _save(tmp_path / "changed", net) != first
+
+
+def test_verify_detects_corruption(tmp_path):
+    _save(tmp_path, _net(a2c, "SumChars", TESTWORDS))
+    serving.bundle.load(str(tmp_path), verify=True)
+    with open(tmp_path / "weights.bin", "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\x01")
+    with pytest.raises(ValueError):
+        serving.bundle.load(str(tmp_path), verify=True)
+
+
+def test_hashless_format_1_bundles_are_rejected(tmp_path):
+    _save(tmp_path, _net(a2c, "SumChars", TESTWORDS))
+    with open(tmp_path / "manifest.json") as f:
+        manifest = json.load(f)
+    del manifest["hash"]
+    manifest["format"] = 1
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(ValueError, match="has format 1, expected 2"):
+        serving.bundle.load(str(tmp_path))
+
+
+def test_play_load_from_bundle(tmp_path):
+    key = _save(tmp_path, _net(a2c, "SumChars", TESTWORDS))
+    manifest, agent, env = a2c.play.load_from_bundle(str(tmp_path))
+    assert manifest["hash"] == key
+    assert a2c.play.suggest(agent, env, []) in TESTWORDS
+    with pytest.raises(AssertionError):
+        ppo.play.load_from_bundle(str(tmp_path))
+
+
+@pytest.mark.parametrize("play", [a2c.play, ppo.play])
+def test_play_load_from_bundle_optimized(tmp_path, monkeypatch, play):
+    calls = []
+    compile_network = serving.compiled.compile_network
+    monkeypatch.setattr(serving.compiled, "compile_network",
+                        lambda *args, **kwargs: calls.append(kwargs) or compile_network(*args, **kwargs))
+    package = a2c if play is a2c.play else ppo
+    net = _net(package, "SumChars", TESTWORDS)
+    serving.bundle.save(str(tmp_path), package.__name__, "SumChars", {"n_hidden": 1, "hidden_size": 32}, net,
+                        WordleEnvBase(words=TESTWORDS, max_turns=6))
+    _, eager, env = play.load_from_bundle(str(tmp_path))
+    _, optimized, _ = play.load_from_bundle(str(tmp_path), compiled=True, optimize=True)
+    states = np.tile(wordle.state.new(6), (3, 1))
+    assert calls == [{"optimize": True}]
+    assert optimized(states, "cpu") == eager(states, "cpu")
+    with pytest.raises(AssertionError):
+        play.load_from_bundle(str(tmp_path), optimize=True)
+
+
+def test_loading_doesnt_import_export_dependencies(tmp_path):
+    _save(tmp_path, _net(a2c, "SumChars", TESTWORDS))
+    code = (f"import sys, a2c.play; a2c.play.load_from_bundle({str(tmp_path)!r}); "
+            f"assert 'gym' not in sys.modules and 'fsspec' not in sys.modules")
+    # A fresh interpreter, gym is already imported by other tests here
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
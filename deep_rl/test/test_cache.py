@@ -0,0 +1,39 @@
+import torch
+
+from serving.cache import LRUCache, canonical_sequence, model_key
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.snapshot() == {
+        "size": 2, "maxsize": 2, "hits": 3, "misses": 1, "evictions": 1, "hit_rate": 0.75,
+    }
+
+
+def test_get_or_compute_only_computes_misses():
+    cache = LRUCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert len(calls) == 1
+    assert cache.hits == 2 and cache.misses == 1
+
+
+def test_canonical_sequence():
+    assert canonical_sequence([("stare", [0, 1, 2, 0, 0])]) == canonical_sequence([("STARE", (0, 1, 2, 0, 0))])
+    assert canonical_sequence([]) == ()
+
+
+def test_model_key_follows_weights():
+    net = torch.nn.Linear(3, 2)
+    key = model_key(net)
+    assert model_key(net) == key
+    with torch.no_grad():
+        net.weight[0, 0] += 1
+    assert model_key(net) != key
@@ -0,0 +1,37 @@
+import pytest
+import torch
+
+import a2c
+import ppo
+from serving.compiled import compile_network
+
+from test.test_networks import OBS_SIZE, _construct, _logprobs, _states
+from test.test_wordle import TESTWORDS
+
+
+@pytest.mark.parametrize("package,name", [(a2c, "SumChars"), (a2c, "EmbeddingChars"),
+                                          (ppo, "SumChars"), (ppo, "EmbeddingChars")])
+@pytest.mark.parametrize("batch", [1, 5])
+@pytest.mark.parametrize("optimize", [False, True])
+def test_compiled_matches_eager(package, name, batch, optimize):
+    net = _construct(package, name).eval()
+    compiled = compile_network(net, OBS_SIZE, optimize=optimize)
+    states = _states(batch)
+    with torch.no_grad():
+        eager = net(states)
+        out = compiled(states)
+    assert type(out) == type(eager)
+    assert torch.allclose(_logprobs(out), _logprobs(eager), atol=1e-5)
+    if isinstance(eager, tuple):
+        assert torch.allclose(out[1], eager[1], atol=1e-5)
+
+
+@pytest.mark.parametrize("package,name", [(a2c, "SumChars"), (ppo, "SumChars")])
+def test_compiled_applies_masks(package, name):
+    net = _construct(package, name).eval()
+    compiled = compile_network(net, OBS_SIZE)
+    states = _states(3)
+    mask = torch.zeros(3, len(TESTWORDS), dtype=torch.bool)
+    mask[:, [2, 5]] = True
+    with torch.no_grad():
+        assert torch.allclose(_logprobs(compiled(states, mask)).exp(), _logprobs(net(states, mask)).exp(), atol=1e-5)
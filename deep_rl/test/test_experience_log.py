@@ -0,0 +1,86 @@
+import h5py
+import numpy as np
+import pytest
+
+from common.experience_log import ExperienceLog
+
+LAYOUT = {"states": ((7,), np.uint8), "returns": ((), np.float32)}
+
+
+def _batches(sizes, seed=0):
+    rng = np.random.RandomState(seed)
+    return [{"states": rng.randint(2, size=(n, 7)).astype(np.uint8), "returns": rng.randn(n).astype(np.float32)}
+            for n in sizes]
+
+
+def _read(file_name):
+    with h5py.File(file_name, 'r') as f:
+        return {name: f[name][:] for name in f}, f["states"].chunks, f["states"].compression
+
+
+@pytest.mark.parametrize("blocks", [1, 3])
+def test_writes_everything_in_order(tmp_path, blocks):
+    file_name = str(tmp_path / "log.hdf5")
+    log = ExperienceLog(file_name, LAYOUT, flush_rows=8, blocks=blocks)
+    # Batches smaller and larger than a block, across block boundaries
+    batches = _batches([3, 5, 6, 20, 1])
+    for batch in batches:
+        log.write(**batch)
+    log.close()
+
+    data, chunks, compression = _read(file_name)
+    for name in LAYOUT:
+        assert np.array_equal(data[name], np.concatenate([batch[name] for batch in batches]))
+        assert data[name].dtype == LAYOUT[name][1]
+    assert chunks == (8, 7)
+    assert compression == "lzf"
+
+
+def test_flush_writes_partial_block(tmp_path):
+    file_name = str(tmp_path / "log.hdf5")
+    log = ExperienceLog(file_name, LAYOUT, flush_rows=8)
+    batch, = _batches([5])
+    log.write(**batch)
+    assert len(_read(file_name)[0]["returns"]) == 0
+
+    log.flush()
+    assert np.array_equal(_read(file_name)[0]["returns"], batch["returns"])
+
+    log.write(**batch)
+    log.close()
+    assert len(_read(file_name)[0]["returns"]) == 10
+    with pytest.raises(RuntimeError):
+        log.write(**batch)
+
+
+def test_file_is_opened_once(tmp_path, monkeypatch):
+    file_name = str(tmp_path / "log.hdf5")
+    opened = []
+    file = h5py.File
+    monkeypatch.setattr(h5py, "File", lambda name, mode, *args, **kwargs: opened.append(mode) or file(name, mode, *args, **kwargs))
+    log = ExperienceLog(file_name, LAYOUT, flush_rows=4)
+    for batch in _batches([4, 4, 4, 2]):
+        log.write(**batch)
+        log.flush()
+    log.close()
+    assert opened == ["w", "a"]
+
+    # Released by close(), so the next run can recreate it
+    monkeypatch.undo()
+    ExperienceLog(file_name, LAYOUT, flush_rows=4).close()
+    assert len(_read(file_name)[0]["returns"]) == 0
+
+
+def test_writer_errors_are_raised(tmp_path):
+    file_name = str(tmp_path / "log.hdf5")
+    log = ExperienceLog(file_name, LAYOUT, flush_rows=4)
+    # Gone before the writer opens it
+    (tmp_path / "log.hdf5").unlink()
+    (tmp_path / "log.hdf5").mkdir()
+    # Raised by whichever call comes after the writer failed
+    with pytest.raises(RuntimeError):
+        for batch in _batches([4, 4, 4, 4]):
+            log.write(**batch)
+        log.flush()
+    with pytest.raises(RuntimeError):
+        log.close()
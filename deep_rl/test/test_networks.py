@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+import torch
+
+import a2c
+import ppo
+import a2c.wordindex
+import ppo.wordindex
+import wordle.state
+from a2c.agent import ActorCriticAgent, GreedyActorCriticAgent
+
+from test.test_wordle import TESTWORDS
+
+OBS_SIZE = len(wordle.state.new(6))
+
+
+def _construct(package, name):
+    torch.manual_seed(13)
+    return package.construct(name, obs_size=OBS_SIZE, word_list=TESTWORDS, n_hidden=1, hidden_size=32)
+
+
+def _states(n):
+    states = np.tile(wordle.state.new(6), (n, 1))
+    for i in range(n):
+        states[i] = wordle.state.update(states[i], TESTWORDS[i % len(TESTWORDS)], TESTWORDS[0])
+    return torch.as_tensor(states)
+
+
+def _logprobs(out):
+    return out[0] if isinstance(out, tuple) else out
+
+
+@pytest.mark.parametrize("package,name", [(a2c, "SumChars"), (a2c, "EmbeddingChars"), (ppo, "SumChars")])
+def test_all_legal_mask_is_noop(package, name):
+    net = _construct(package, name)
+    states = _states(4)
+    mask = torch.ones(4, len(TESTWORDS), dtype=torch.bool)
+    assert torch.equal(_logprobs(net(states, mask)), _logprobs(net(states)))
+
+
+@pytest.mark.parametrize("package,name", [(a2c, "SumChars"), (a2c, "EmbeddingChars"), (ppo, "SumChars")])
+def test_mask_removes_illegal_actions(package, name):
+    net = _construct(package, name)
+    states = _states(4)
+    mask = torch.zeros(4, len(TESTWORDS), dtype=torch.bool)
+    mask[:, [1, 3]] = True
+    logprobs = _logprobs(net(states, mask))
+    probs = logprobs.exp()
+    assert torch.allclose(probs.sum(dim=1), torch.ones(4))
+    assert (probs[:, [0, 2, 4, 5, 6, 7, 8, 9]] == 0).all()
+    # Entropy stays finite so it can be used in the loss
+    assert torch.isfinite((-probs * logprobs).sum(dim=1)).all()
+
+
+def test_agents_respect_mask():
+    net = _construct(a2c, "SumChars")
+    states = _states(8).numpy()
+    mask = np.zeros((8, len(TESTWORDS)), dtype=np.bool_)
+    mask[np.arange(8), np.arange(8)] = True
+    assert ActorCriticAgent(net)(states, "cpu", mask) == list(range(8))
+    assert GreedyActorCriticAgent(net)(states[0], "cpu", mask[5]) == [5]
+
+
+def test_embedding_projection_cache():
+    net = _construct(a2c, "EmbeddingChars")
+    net.eval()
+    states = _states(4)
+    with torch.no_grad():
+        expected = net(states)[0]
+        fw = net.project_words(states.device)
+        assert net.project_words(states.device) is fw
+        assert torch.equal(net(states)[0], expected)
+
+    # Optimizer steps change the parameters in place
+    optimizer = torch.optim.SGD(net.parameters(), lr=0.1)
+    net(states)[0].sum().backward()
+    optimizer.step()
+    with torch.no_grad():
+        assert net.project_words(states.device) is not fw
+        updated = net(states)[0]
+    assert not torch.equal(updated, expected)
+    assert torch.allclose(updated, net(states)[0])
+
+    # So does load_state_dict
+    other = _construct(a2c, "EmbeddingChars")
+    with torch.no_grad():
+        net(states)
+        net.load_state_dict(other.state_dict())
+        assert torch.equal(net(states)[0], other(states)[0])
+
+
+def _dense_words(word_list):
+    words = torch.zeros(26*5, len(word_list))
+    for i, word in enumerate(word_list):
+        for j, c in enumerate(word):
+            words[j*26 + (ord(c) - ord('A')), i] = 1
+    return words
+
+
+@pytest.mark.parametrize("batch", [1, 4])
+def test_gather_sum_matches_dense_tensordot(batch):
+    h = torch.randn(batch, 26*5)
+    expected = torch.tensordot(h, _dense_words(TESTWORDS), dims=((1,), (0,)))
+    assert torch.allclose(a2c.wordindex.gather_sum(h, a2c.wordindex.word_index(TESTWORDS)), expected, atol=1e-6)
+
+
+def test_gather_linear_matches_dense_linear():
+    linear = torch.nn.Linear(26*5, 8)
+    expected = linear(_dense_words(TESTWORDS).t())
+    assert torch.allclose(ppo.wordindex.gather_linear(linear, ppo.wordindex.word_index(TESTWORDS)), expected, atol=1e-6)
+
+
+def test_word_index_is_a_non_persistent_buffer():
+    net = _construct(a2c, "SumChars")
+    assert "word_index" in dict(net.named_buffers())
+    assert "word_index" not in net.state_dict()
@@ -0,0 +1,84 @@
+import random
+
+import numpy as np
+import pytest
+
+import wordle.patterns
+import wordle.state
+import wordle.wordle
+
+from test.test_wordle import TESTWORDS
+
+
+@pytest.fixture(scope="module")
+def sample_words():
+    words = wordle.wordle._load_words()
+    rng = random.Random(13)
+    return rng.sample(words, 300) + TESTWORDS + ["SPEED", "ERASE", "EERIE", "ABBEY"]
+
+
+def test_encode_decode():
+    for code in range(wordle.patterns.N_PATTERNS):
+        assert wordle.patterns.encode(wordle.patterns.decode(code)) == code
+    assert wordle.patterns.decode(wordle.patterns.WIN) == [2] * 5
+
+
+def test_build_matches_get_mask(sample_words):
+    table = wordle.patterns.build(sample_words)
+    assert table.dtype == np.uint8
+    for i, word in enumerate(sample_words):
+        for j, goal_word in enumerate(sample_words):
+            assert wordle.patterns.decode(table[i, j]) == wordle.state.get_mask(word, goal_word), (word, goal_word)
+
+
+def test_load_warns_if_it_cant_cache(tmp_path):
+    missing = str(tmp_path / "missing")
+    with pytest.warns(UserWarning, match="Couldn't cache pattern table"):
+        table = wordle.patterns.load(TESTWORDS, cache_dir=missing)
+    assert np.array_equal(table, wordle.patterns.build(TESTWORDS))
+
+
+def test_load_caches(tmp_path):
+    table = wordle.patterns.load(TESTWORDS, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('*.npy'))) == 1
+    cached = wordle.patterns.load(TESTWORDS, cache_dir=str(tmp_path))
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(table, cached)
+
+
+def test_mask_env_uses_table(tmp_path):
+    env = wordle.wordle.WordleEnvBase(words=TESTWORDS, max_turns=6, mask_based_state_updates=True)
+    env.patterns.cache_dir = str(tmp_path)
+    env.reset()
+    env.set_goal_id(0)
+    state = env.state
+    new_state, _, _, _ = env.step(1)
+    assert np.array_equal(new_state, wordle.state.update_mask(state, TESTWORDS[1], TESTWORDS[0]))
+
+
+def _brute_force_candidates(words, allowable, history, goal_word):
+    return np.array([
+        all(wordle.state.get_mask(guess, w) == wordle.state.get_mask(guess, goal_word) for guess in history)
+        for w in words[:allowable]
+    ])
+
+
+def test_track_candidates(tmp_path):
+    env = wordle.wordle.WordleEnvBase(words=TESTWORDS, max_turns=6, allowable_words=8, track_candidates=True)
+    env.patterns.cache_dir = str(tmp_path)
+    env.reset()
+    env.set_goal_id(5)
+    assert env.get_candidates().all()
+
+    history = []
+    for action in [0, 7, 6]:
+        _, _, _, info = env.step(action)
+        history.append(TESTWORDS[action])
+        expected = _brute_force_candidates(TESTWORDS, 8, history, TESTWORDS[5])
+        assert np.array_equal(info["candidates"], expected)
+        assert np.array_equal(env.get_candidates(), expected)
+        assert env.get_candidates()[5]
+        assert np.array_equal(env.action_mask(), np.concatenate([expected, [False, False]]))
+
+    env.reset()
+    assert env.get_candidates().all()
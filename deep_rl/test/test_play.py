@@ -0,0 +1,97 @@
+import pytest
+import torch
+
+import a2c
+import a2c.play
+import ppo
+import ppo.play
+import wordle.state
+from a2c.agent import GreedyActorCriticAgent
+from ppo.agent import GreedyActorCategorical
+from wordle.wordle import WordleEnvBase
+
+from test.test_wordle import TESTWORDS
+
+
+def _agent(play, seed=7):
+    torch.manual_seed(seed)
+    obs_size = len(wordle.state.new(6))
+    if play is a2c.play:
+        return GreedyActorCriticAgent(a2c.construct("SumChars", obs_size=obs_size, word_list=TESTWORDS,
+                                                    n_hidden=1, hidden_size=32))
+    return GreedyActorCategorical(ppo.construct("SumChars", obs_size=obs_size, word_list=TESTWORDS,
+                                                n_hidden=1, hidden_size=32))
+
+
+def _goal_one_by_one(agent, env, goal_word):
+    """The original env.step based goal loop"""
+    state = env.reset()
+    env.set_goal_word(goal_word)
+    outcomes = []
+    win = False
+    for _ in range(env.max_turns):
+        action = agent(state, "cpu")[0]
+        state, reward, done, _ = env.step(action)
+        outcomes.append((env.words[action], reward))
+        if done:
+            win = reward >= 0
+            break
+    return win, outcomes
+
+
+@pytest.mark.parametrize("play", [a2c.play, ppo.play])
+@pytest.mark.parametrize("mask_based", [False, True])
+def test_goal_many_matches_env_steps(play, mask_based):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6, mask_based_state_updates=mask_based)
+    agent = _agent(play)
+    expected = [_goal_one_by_one(agent, env, w) for w in TESTWORDS]
+    assert play.goal_many(agent, env, [w.lower() for w in TESTWORDS]) == expected
+    assert play.goal(agent, env, TESTWORDS[3]) == expected[3]
+
+
+def _suggest_one_by_one(agent, env, sequence):
+    """The original env.reset based suggest, one state per forward pass"""
+    state = env.reset()
+    for word, mask in sequence:
+        state = wordle.state.update_from_mask(state, word.upper(), mask)
+    return env.words[agent(state, "cpu")[0]]
+
+
+@pytest.mark.parametrize("play", [a2c.play, ppo.play])
+def test_suggest_many_matches_one_by_one(play):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6)
+    # Unlike seed 7, suggests different words for these
+    agent = _agent(play, seed=0)
+    sequences = [
+        [],
+        [(TESTWORDS[0], [0, 1, 0, 0, 2])],
+        [(TESTWORDS[1], [2, 2, 0, 0, 0]), (TESTWORDS[4].lower(), [0, 1, 0, 0, 2])],
+        [(TESTWORDS[5], [2, 2, 2, 2, 0])],
+    ]
+    expected = [_suggest_one_by_one(agent, env, s) for s in sequences]
+    assert len(set(expected)) > 1
+    assert play.suggest_many(agent, env, sequences) == expected
+    assert play.suggest(agent, env, sequences[2]) == expected[2]
+    assert play.suggest_many(agent, env, []) == []
+
+
+def test_goal_many_rejects_unknown_word():
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6)
+    with pytest.raises(ValueError):
+        a2c.play.goal_many(_agent(a2c.play), env, [TESTWORDS[0], "ZZZZZ"])
+
+
+@pytest.mark.parametrize("play", [a2c.play, ppo.play])
+@pytest.mark.parametrize("processes", [1, 3])
+def test_evaluate(play, processes):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6, allowable_words=8)
+    agent = _agent(play)
+    evaluation = play.evaluate(agent, env, processes=processes)
+
+    expected = play.goal_many(agent, env, TESTWORDS[:8])
+    assert list(evaluation.trajectories) == TESTWORDS[:8]
+    assert evaluation.losses == [w for w, (win, _) in zip(TESTWORDS, expected) if not win]
+    for (win, outcomes), trajectory in zip(expected, evaluation.trajectories.values()):
+        assert trajectory == [guess for guess, _ in outcomes]
+    assert len(evaluation.guess_counts) == env.max_turns
+    assert sum(evaluation.guess_counts) + len(evaluation.losses) == 8
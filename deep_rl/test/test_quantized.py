@@ -0,0 +1,63 @@
+import pytest
+import torch
+
+import a2c
+import a2c.play
+import ppo
+import ppo.play
+import serving.bundle
+import serving.quantized
+from a2c.agent import GreedyActorCriticAgent
+from wordle.wordle import WordleEnvBase
+
+from test.test_networks import _construct, _logprobs, _states
+from test.test_wordle import TESTWORDS
+
+
+@pytest.mark.parametrize("package,name", [(a2c, "SumChars"), (a2c, "EmbeddingChars"), (ppo, "SumChars")])
+def test_quantized_stays_close(package, name):
+    net = _construct(package, name).eval()
+    quantized = serving.quantized.quantize_network(net)
+    assert any(isinstance(p, torch.nn.Linear) for p in net.modules())
+    states = _states(4)
+    with torch.no_grad():
+        assert torch.allclose(_logprobs(quantized(states)).exp(), _logprobs(net(states)).exp(), atol=1e-2)
+    # The original is left alone
+    assert all(type(m) is not torch.nn.quantized.dynamic.Linear for m in net.modules())
+
+
+def test_accuracy_guard():
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6, allowable_words=8)
+    agent = GreedyActorCriticAgent(_construct(a2c, "SumChars").eval())
+    rates = serving.quantized.check_accuracy(agent, agent, env, max_drop=0.)
+    assert rates["win_rate"] == rates["quantized_win_rate"]
+
+    def cycling(states, device):
+        # Guesses answer i on turn i, wins 6 of the 8 games
+        return list(env.max_turns - states[:, 0])
+
+    def stuck(states, device):
+        # Always the last word, which isn't an answer
+        return [len(TESTWORDS) - 1] * len(states)
+
+    rates = serving.quantized.check_accuracy(cycling, stuck, env, max_drop=0.75)
+    assert rates == {"win_rate": 0.75, "quantized_win_rate": 0.}
+    with pytest.raises(ValueError):
+        serving.quantized.check_accuracy(cycling, stuck, env, max_drop=0.5)
+
+
+@pytest.mark.parametrize("algo,package,play", [("a2c", a2c, a2c.play), ("ppo", ppo, ppo.play)])
+def test_load_quantized_needs_guard(tmp_path, algo, package, play):
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6, allowable_words=8)
+    serving.bundle.save(str(tmp_path), algo, "SumChars", {"n_hidden": 1, "hidden_size": 32},
+                        _construct(package, "SumChars"), env)
+    with pytest.raises(AssertionError):
+        play.load_from_bundle(str(tmp_path), quantized=True)
+
+    old_hash = serving.bundle.read_manifest(str(tmp_path))["hash"]
+    manifest = serving.bundle.update_manifest(str(tmp_path), quantization={"win_rate": 1., "quantized_win_rate": 1.})
+    assert manifest["hash"] != old_hash
+    assert manifest == serving.bundle.read_manifest(str(tmp_path))
+
+    _, agent, _ = play.load_from_bundle(str(tmp_path), verify=True, quantized=True, compiled=True)
+    assert len(agent(_states(3).numpy(), "cpu")) == 3
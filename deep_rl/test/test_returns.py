@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import torch
+
+from common.returns import discounted_returns, gae
+
+
+def _discount_rewards(rewards, discount):
+    """The list based PPO.discount_rewards"""
+    cumul_reward = []
+    sum_r = 0.0
+    for r in reversed(rewards):
+        sum_r = (sum_r * discount) + r
+        cumul_reward.append(sum_r)
+    return list(reversed(cumul_reward))
+
+
+def _calc_advantage(rewards, values, last_value, gamma, lam):
+    """The list based PPO.calc_advantage"""
+    rews = rewards + [last_value]
+    vals = values + [last_value]
+    delta = [rews[i] + gamma * vals[i + 1] - vals[i] for i in range(len(rews) - 1)]
+    return _discount_rewards(delta, gamma * lam)
+
+
+def _compute_returns(rewards, dones, last_value, gamma):
+    """The list based AdvantageActorCritic.compute_returns"""
+    g = last_value
+    returns = []
+    for r, d in zip(rewards[::-1], dones[::-1]):
+        g = r + gamma * g * (1 - d)
+        returns.append(g)
+    return returns[::-1]
+
+
+def _batch(seed, n_steps=9, n_envs=4):
+    rng = np.random.RandomState(seed)
+    rewards = rng.choice([0., 1., -1.], size=(n_steps, n_envs)).astype(np.float32)
+    values = rng.randn(n_steps, n_envs).astype(np.float32)
+    dones = rng.random_sample((n_steps, n_envs)) < 0.3
+    last_values = rng.randn(n_envs).astype(np.float32)
+    return rewards, values, dones, last_values
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_per_game_loops(seed):
+    gamma, lam = 0.99, 0.95
+    rewards, values, dones, last_values = _batch(seed)
+    returns = discounted_returns(rewards, dones, last_values, gamma)
+    advantages = gae(rewards, values, dones, last_values, gamma, lam)
+
+    for i in range(rewards.shape[1]):
+        assert returns[:, i].tolist() == _compute_returns(rewards[:, i].tolist(), dones[:, i].tolist(),
+                                                          float(last_values[i]), gamma)
+        # PPO's split of a column into games
+        ends = list(np.flatnonzero(dones[:, i]) + 1)
+        if not ends or ends[-1] != len(rewards):
+            ends.append(len(rewards))
+        start = 0
+        for end in ends:
+            last_value = 0. if dones[end - 1, i] else float(last_values[i])
+            ep_rewards = rewards[start:end, i].tolist()
+            ep_values = values[start:end, i].tolist()
+            assert returns[start:end, i].tolist() == _discount_rewards(ep_rewards + [last_value], gamma)[:-1]
+            assert advantages[start:end, i].tolist() == _calc_advantage(ep_rewards, ep_values, last_value, gamma, lam)
+            start = end
+
+
+def test_torch_matches_numpy():
+    rewards, values, dones, last_values = _batch(7)
+    as_torch = [torch.from_numpy(x) for x in (rewards, values, dones, last_values)]
+    assert np.array_equal(gae(*as_torch, 0.9, 0.8).numpy(), gae(rewards, values, dones, last_values, 0.9, 0.8))
+    returns = discounted_returns(as_torch[0], as_torch[2], as_torch[3], 0.9)
+    assert returns.dtype == torch.float64
+    assert np.array_equal(returns.numpy(), discounted_returns(rewards, dones, last_values, 0.9))
+
+
+def test_single_game():
+    assert discounted_returns(np.array([0., 0., 1.]), np.zeros(3), 0., 0.5).tolist() == [0.25, 0.5, 1.]
+    assert discounted_returns(np.array([1., 1.]), np.array([True, False]), 4., 0.5).tolist() == [1., 3.]
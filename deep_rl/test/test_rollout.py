@@ -0,0 +1,44 @@
+import numpy as np
+import torch
+
+from common.rollout import RolloutBuffer
+
+
+def _buffer(copies=2):
+    return RolloutBuffer(3, 4, {"states": ((5,), np.int32), "returns": ((), np.float32)}, copies)
+
+
+def test_shapes():
+    buffer = _buffer()
+    arrays = buffer.next()
+    assert len(buffer) == 12
+    assert arrays["states"].shape == (3, 4, 5) and arrays["states"].dtype == np.int32
+    assert arrays["returns"].shape == (3, 4) and arrays["returns"].dtype == np.float32
+    assert buffer.flat("states").shape == (12, 5)
+
+
+def test_minibatches_are_views_in_step_order():
+    buffer = _buffer()
+    arrays = buffer.next()
+    arrays["states"][:] = np.arange(60).reshape(3, 4, 5)
+    arrays["returns"][:] = np.arange(12).reshape(3, 4)
+
+    batches = list(buffer.minibatches(["returns", "states"], 5))
+    assert [len(returns) for returns, _ in batches] == [5, 5, 2]
+    returns = torch.cat([returns for returns, _ in batches])
+    assert torch.equal(returns, torch.arange(12, dtype=torch.float32))
+    assert torch.equal(batches[1][1][0], torch.arange(25, 30, dtype=torch.int32))
+
+    # Written after serving, seen by the tensors
+    arrays["returns"][0, 0] = -1
+    assert batches[0][0][0] == -1
+
+
+def test_next_keeps_previous_rollout():
+    buffer = _buffer(copies=2)
+    buffer.next()["returns"][:] = 1
+    batch, = buffer.minibatches(["returns"], len(buffer))
+    buffer.next()["returns"][:] = 2
+    assert torch.all(batch[0] == 1)
+    # The third rollout reuses the first one's storage
+    assert np.shares_memory(buffer.next()["returns"], batch[0].numpy())
@@ -0,0 +1,46 @@
+import numpy as np
+
+import a2c.play
+import wordle.state
+from serving.cache import canonical_sequence
+from serving.sessions import Session, SessionStore
+from wordle.wordle import WordleEnvBase
+
+from test.test_wordle import TESTWORDS
+
+
+def test_sessions_expire_after_ttl(monkeypatch):
+    now = [100.]
+    monkeypatch.setattr("serving.sessions.time.monotonic", lambda: now[0])
+    store = SessionStore(ttl=10)
+    first = store.create(wordle.state.new(6))
+    now[0] += 6
+    second = store.create(wordle.state.new(6))
+    now[0] += 6
+    # first wasn't used for 12s, second only 6s
+    assert store.get(first) is None
+    assert store.get(second) is not None
+    now[0] += 9
+    assert store.get(second) is not None
+    assert store.snapshot() == {"size": 1, "created": 2, "expired": 1, "evicted": 0}
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(maxsize=2)
+    ids = [store.create(wordle.state.new(6)) for _ in range(2)]
+    store.get(ids[0])
+    ids.append(store.create(wordle.state.new(6)))
+    assert store.get(ids[1]) is None
+    assert store.get(ids[0]) is not None and store.get(ids[2]) is not None
+    assert store.evicted == 1
+
+
+def test_incremental_state_matches_replay():
+    env = WordleEnvBase(words=TESTWORDS, max_turns=6)
+    sequence = [("appaa", [2, 2, 2, 2, 0]), ("BPPAB", [0, 2, 2, 2, 2]), ("cppad", [0, 2, 2, 2, 0])]
+    session = Session(a2c.play.sequence_state(env, []))
+    for k, (word, mask) in enumerate(sequence):
+        state = a2c.play.apply_guess(env, session.state, word, mask)
+        session = Session(state, session.sequence + canonical_sequence([(word, mask)]))
+        assert np.array_equal(session.state, a2c.play.sequence_state(env, sequence[:k + 1]))
+    assert [w for w, _ in session.history()] == ["APPAA", "BPPAB", "CPPAD"]
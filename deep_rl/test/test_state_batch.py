@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import wordle.patterns
+import wordle.state
+import wordle.wordle
+
+
+@pytest.fixture(scope="module")
+def words():
+    return wordle.wordle._load_words()
+
+
+@pytest.mark.parametrize("mask_based", [False, True])
+def test_update_batch_matches_scalar(words, mask_based):
+    scalar_update = wordle.state.update_mask if mask_based else wordle.state.update
+    patterns = wordle.patterns.PatternTable(words)
+    rng = np.random.RandomState(13)
+
+    # Every word is the goal of one row
+    goals = np.arange(len(words))
+    states = np.tile(wordle.state.new(6), (len(words), 1))
+    expected = list(states.copy())
+    for _ in range(3):
+        guesses = rng.randint(len(words), size=len(words))
+        wordle.state.update_batch(states, guesses, goals, patterns, mask_based=mask_based)
+        for b in range(len(words)):
+            expected[b] = scalar_update(expected[b], words[guesses[b]], words[goals[b]])
+        assert np.array_equal(states, np.stack(expected))
+
+
+def test_update_batch_repeated_letters():
+    words = ["EERIE", "ERASE", "SPEED", "ABBEY", "BABES", "LLAMA", "ALLAY"]
+    patterns = wordle.patterns.PatternTable(words, cache_dir=None)
+    guesses, goals = np.meshgrid(np.arange(len(words)), np.arange(len(words)))
+    guesses, goals = guesses.ravel(), goals.ravel()
+
+    for mask_based in (False, True):
+        scalar_update = wordle.state.update_mask if mask_based else wordle.state.update
+        states = np.tile(wordle.state.new(6), (len(guesses), 1))
+        wordle.state.update_batch(states, guesses, goals, patterns, mask_based=mask_based)
+        wordle.state.update_batch(states, goals, guesses, patterns, mask_based=mask_based)
+        for b in range(len(guesses)):
+            state = scalar_update(wordle.state.new(6), words[guesses[b]], words[goals[b]])
+            state = scalar_update(state, words[goals[b]], words[guesses[b]])
+            assert np.array_equal(states[b], state), (words[guesses[b]], words[goals[b]])
+
+
+def test_states_stay_uint8(words):
+    patterns = wordle.patterns.PatternTable(words)
+    state = wordle.state.new(6)
+    assert state.dtype == np.uint8
+    assert wordle.state.update(state, words[0], words[1]).dtype == np.uint8
+    assert wordle.state.update_from_mask(state, words[0], [0, 1, 2, 0, 1]).dtype == np.uint8
+
+    states = np.tile(state, (6, 1))
+    for _ in range(6):
+        wordle.state.update_batch(states, np.zeros(6, dtype=np.int64), np.ones(6, dtype=np.int64), patterns)
+    assert states.dtype == np.uint8
+    assert wordle.state.remaining_steps(states[0]) == 0
+    # A Python int, so counting turns from it can't wrap around
+    assert 6 - wordle.state.remaining_steps(states[0]) - 7 == -1
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import wordle.wordle
+from wordle.subproc import SubprocVecEnv
+from wordle.vec import WordleVecEnv
+
+from test.test_wordle import TESTWORDS
+
+
+def _set_goals(vec_env, goals):
+    for i, goal in enumerate(goals):
+        vec_env.set_goal_id(i, int(goal))
+
+
+@pytest.mark.parametrize("mask_based", [False, True])
+@pytest.mark.parametrize("track_candidates", [False, True])
+def test_matches_vec_env(mask_based, track_candidates):
+    env = wordle.wordle.WordleEnvBase(words=TESTWORDS, max_turns=6, mask_based_state_updates=mask_based,
+                                      track_candidates=track_candidates)
+    vec_env = WordleVecEnv(env, num_envs=5)
+    subproc_env = SubprocVecEnv(env, num_envs=5, num_workers=2)
+    try:
+        rng = np.random.RandomState(0)
+        vec_env.reset()
+        assert np.array_equal(subproc_env.reset(), vec_env.states)
+        goals = rng.randint(len(TESTWORDS), size=5)
+        _set_goals(vec_env, goals)
+        _set_goals(subproc_env, goals)
+
+        out = np.empty_like(vec_env.states)
+        for _ in range(12):
+            assert np.array_equal(subproc_env.action_masks(), vec_env.action_masks())
+            actions = rng.randint(len(TESTWORDS), size=5)
+            expected = vec_env.step(actions)
+            result = subproc_env.step(actions, out=out)
+            assert result[0] is out
+            for a, b in zip(result[:3], expected[:3]):
+                assert np.array_equal(a, b)
+            assert result[3].keys() == expected[3].keys()
+            for key in expected[3]:
+                assert np.array_equal(result[3][key], expected[3][key])
+
+            # Finished games were reset with goals of their own, give both the same new goals
+            goals[expected[2]] = rng.randint(len(TESTWORDS), size=expected[2].sum())
+            _set_goals(vec_env, goals)
+            _set_goals(subproc_env, goals)
+    finally:
+        subproc_env.close()
+
+
+def test_workers_draw_different_goals():
+    env = wordle.wordle.WordleEnvBase(words=TESTWORDS, max_turns=6)
+    subproc_env = SubprocVecEnv(env, num_envs=40, num_workers=2)
+    try:
+        subproc_env.reset()
+        goals = []
+        for _ in range(3):
+            # goal_id is the goal each game was played with
+            _, _, _, info = subproc_env.step(np.zeros(40, dtype=np.int64))
+            goals.append(info["goal_id"])
+        goals = np.concatenate(goals).reshape(3, 2, 20)
+        assert not np.array_equal(goals[:, 0], goals[:, 1])
+    finally:
+        subproc_env.close()
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import wordle.state
+import wordle.wordle
+from wordle.vec import WordleVecEnv
+
+from test.test_wordle import TESTWORDS
+
+
+@pytest.fixture(params=[False, True])
+def envs(request):
+    env = wordle.wordle.WordleEnvBase(
+        words=TESTWORDS,
+        max_turns=6,
+        mask_based_state_updates=request.param,
+    )
+    vec_env = WordleVecEnv(env, num_envs=3)
+    vec_env.reset()
+    return env, vec_env
+
+
+def test_step_matches_single_env(envs):
+    env, vec_env = envs
+    goals = [0, 4, 9]
+    for i, goal in enumerate(goals):
+        vec_env.set_goal_id(i, goal)
+
+    singles = []
+    for goal in goals:
+        env.reset()
+        env.set_goal_id(goal)
+        singles.append((env.state.copy(), goal))
+
+    actions = np.array([1, 4, 2])
+    states, rewards, dones, info = vec_env.step(actions)
+    assert list(info["goal_id"]) == goals
+    assert list(dones) == [False, True, False]
+    assert list(rewards) == [0, 0, 0]
+
+    for i, (state, goal) in enumerate(singles):
+        if dones[i]:
+            # Auto-reset to a fresh game
+            assert np.array_equal(states[i], wordle.state.new(6))
+            continue
+        expected = env.state_updater(state=state, word=TESTWORDS[actions[i]], goal_word=TESTWORDS[goal])
+        assert np.array_equal(states[i], expected)
+
+
+
+def test_step_writes_into_out(envs):
+    _, vec_env = envs
+    rollout = np.zeros((2,) + vec_env.states.shape, dtype=wordle.state.DTYPE)
+    states = vec_env.reset(out=rollout[0])
+    assert np.shares_memory(states, rollout[0])
+    assert np.array_equal(rollout[0], vec_env.states)
+
+    states, _, _, _ = vec_env.step(np.array([1, 4, 2]), out=rollout[1])
+    assert np.shares_memory(states, rollout[1])
+    assert np.array_equal(rollout[1], vec_env.states)
+    assert not np.shares_memory(rollout, vec_env.states)
+    assert not np.array_equal(rollout[0], rollout[1])
+
+def test_rewards(envs):
+    _, vec_env = envs
+    vec_env.set_goal_id(0, 0)
+    vec_env.set_goal_id(1, 1)
+    vec_env.set_goal_id(2, 2)
+
+    for _ in range(5):
+        _, rewards, dones, _ = vec_env.step(np.array([3, 3, 3]))
+        assert not dones.any()
+        assert (rewards == 0).all()
+
+    _, rewards, dones, _ = vec_env.step(np.array([0, 3, 3]))
+    assert dones.all()
+    assert list(rewards) == [wordle.wordle.REWARD, -wordle.wordle.REWARD, -wordle.wordle.REWARD]
+    assert (vec_env.states[:, 0] == 6).all()
+
+
+def test_track_candidates(tmp_path):
+    env = wordle.wordle.WordleEnvBase(words=TESTWORDS, max_turns=6, track_candidates=True)
+    env.patterns.cache_dir = str(tmp_path)
+    vec_env = WordleVecEnv(env, num_envs=2)
+    vec_env.reset()
+    vec_env.set_goal_id(0, 5)
+    vec_env.set_goal_id(1, 0)
+
+    env.reset()
+    env.set_goal_id(5)
+    _, _, dones, info = vec_env.step(np.array([0, 0]))
+    _, _, _, single_info = env.step(0)
+    assert np.array_equal(info["candidates"][0], single_info["candidates"])
+    # Game 1 was won and reset, so all words are candidates again
+    assert dones[1]
+    assert info["candidates"][1].all()
@@ -196,3 +196,18 @@ def test_step(wordleEnv):
     assert done
     assert wordleEnv.done
     assert reward == wordle.wordle.REWARD
+
+
+def test_action_mask(wordleEnv):
+    wordleEnv.reset(seed=13)
+    wordleEnv.goal_word = 0
+    assert wordleEnv.action_mask().all()
+
+    wordleEnv.step(1)
+    wordleEnv.step(4)
+    mask = wordleEnv.action_mask()
+    assert not mask[1] and not mask[4]
+    assert mask.sum() == len(TESTWORDS) - 2
+
+    wordleEnv.reset(seed=13)
+    assert wordleEnv.action_mask().all()
@@ -0,0 +1,150 @@
+"""
+Bit packed alternative to the wordle.state array
+
+Instead of a one-hot status per (letter, position) the constraints are kept
+as bitmasks:
+
+guessed = int with bit c set if letter c has been guessed
+maybe[c] = uint8 with bit i set if letter c may be at position i
+yes[c] = uint8 with bit i set if letter c is definitely at position i
+
+a (letter, position) with neither bit set is definitely not there. Updates
+are whole-array bit ops and the 417 long wordle.state layout is only
+produced by expand(), which writes into a buffer owned by the caller.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+from wordle.const import WORDLE_CHARS, WORDLE_N
+from wordle.state import DTYPE, NO, SOMEWHERE, YES, WordleState
+
+
+N_CHARS = len(WORDLE_CHARS)
+ALL_POSITIONS = (1 << WORDLE_N) - 1
+
+# _POSITION_BITS[i] = bit for position i, _LETTER_BITS[c] = bit for letter c
+_POSITION_BITS = (1 << np.arange(WORDLE_N)).astype(np.uint8)
+_LETTER_BITS = 1 << np.arange(N_CHARS)
+# _UNPACK[bits] = the WORDLE_N flags packed in bits
+_UNPACK = ((np.arange(1 << WORDLE_N)[:, None] & _POSITION_BITS) != 0)
+# _EARLIER[i, k] = position k comes before position i
+_EARLIER = np.tri(WORDLE_N, k=-1, dtype=np.bool_)
+
+
+def _letter_ids(word: str) -> np.ndarray:
+    return np.frombuffer(word.encode('ascii'), dtype=np.uint8) - ord(WORDLE_CHARS[0])
+
+
+class BitState:
+    __slots__ = ['remaining', 'guessed', 'maybe', 'yes']
+
+    def __init__(self, max_turns: int):
+        self.remaining = max_turns
+        self.guessed = 0
+        self.maybe = np.full(N_CHARS, ALL_POSITIONS, dtype=np.uint8)
+        self.yes = np.zeros(N_CHARS, dtype=np.uint8)
+
+    def copy(self) -> 'BitState':
+        other = BitState.__new__(BitState)
+        other.remaining = self.remaining
+        other.guessed = self.guessed
+        other.maybe = self.maybe.copy()
+        other.yes = self.yes.copy()
+        return other
+
+    def _guess(self, letters: np.ndarray, green: np.ndarray):
+        """
+        Common part of both updates: use up a turn, mark letters as guessed
+        and make each green letter the only one possible at its position
+        """
+        self.remaining -= 1
+        self.guessed |= int(np.bitwise_or.reduce(_LETTER_BITS[letters]))
+
+        green_bits = np.bitwise_or.reduce(_POSITION_BITS[green])
+        self.maybe &= ~green_bits
+        self.yes &= ~green_bits
+        np.bitwise_or.at(self.yes, letters[green], _POSITION_BITS[green])
+
+    def _clear(self, letters: np.ndarray, at: np.ndarray, everywhere: np.ndarray, maybes: np.ndarray):
+        """
+        Mark letters[at] as not at their position, letters[everywhere] as not
+        in the word and letters[maybes] as not in any position that isn't a yes
+        """
+        clear_yes = np.zeros(N_CHARS, dtype=np.uint8)
+        np.bitwise_or.at(clear_yes, letters[at], _POSITION_BITS[at])
+        clear_yes[letters[everywhere]] = ALL_POSITIONS
+
+        clear_maybe = clear_yes.copy()
+        clear_maybe[letters[maybes]] = ALL_POSITIONS
+
+        self.maybe &= ~clear_maybe
+        self.yes &= ~clear_yes
+
+    def update_from_mask(self, word: str, mask: List[int]):
+        """
+        In place equivalent of wordle.state.update_from_mask
+        """
+        letters = _letter_ids(word)
+        mask = np.asarray(mask)
+        green = mask == YES
+        self._guess(letters, green)
+
+        same = letters[:, None] == letters[None, :]
+        # A no after a somewhere of the same letter only rules out this spot
+        prior_maybe = (same & _EARLIER & (mask == SOMEWHERE)[None, :]).any(axis=1)
+        # Otherwise a no for a letter that's green elsewhere clears its maybes
+        prior_yes = (same & green[None, :]).any(axis=1)
+
+        no = mask == NO
+        self._clear(letters,
+                    at=(mask == SOMEWHERE) | (no & prior_maybe),
+                    everywhere=no & ~prior_maybe & ~prior_yes,
+                    maybes=no & ~prior_maybe & prior_yes)
+
+    def update(self, word: str, goal_word: str):
+        """
+        In place equivalent of wordle.state.update
+        """
+        letters = _letter_ids(word)
+        goal_letters = _letter_ids(goal_word)
+        green = letters == goal_letters
+        self._guess(letters, green)
+
+        in_goal = (letters[:, None] == goal_letters[None, :]).any(axis=1)
+        self._clear(letters,
+                    at=~green & in_goal,
+                    everywhere=~in_goal,
+                    maybes=np.zeros(WORDLE_N, dtype=np.bool_))
+
+    def expand(self, out: Optional[WordleState] = None) -> WordleState:
+        """
+        Write the wordle.state layout of this state into out
+
+        :param out: buffer of length 1 + 26 + 3*5*26 to write into, allocated if None
+        :return: out
+        """
+        if out is None:
+            out = np.empty(1 + N_CHARS + 3 * WORDLE_N * N_CHARS, dtype=DTYPE)
+        out[0] = self.remaining
+        out[1:1 + N_CHARS] = (self.guessed & _LETTER_BITS) != 0
+
+        status = out[1 + N_CHARS:].reshape(N_CHARS, WORDLE_N, 3)
+        maybe = _UNPACK[self.maybe]
+        yes = _UNPACK[self.yes]
+        status[:, :, NO] = ~(maybe | yes)
+        status[:, :, SOMEWHERE] = maybe
+        status[:, :, YES] = yes
+        return out
+
+    @staticmethod
+    def from_array(state: WordleState) -> 'BitState':
+        """
+        Pack a wordle.state array
+        """
+        bit_state = BitState(int(state[0]))
+        bit_state.guessed = int(np.dot(state[1:1 + N_CHARS] != 0, _LETTER_BITS))
+        status = state[1 + N_CHARS:].reshape(N_CHARS, WORDLE_N, 3) != 0
+        bit_state.maybe = (status[:, :, SOMEWHERE] * _POSITION_BITS).sum(axis=1).astype(np.uint8)
+        bit_state.yes = (status[:, :, YES] * _POSITION_BITS).sum(axis=1).astype(np.uint8)
+        return bit_state
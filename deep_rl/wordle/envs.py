@@ -0,0 +1,153 @@
+"""
+Wordle envs registered with gym, for training
+
+Importing this module registers them, e.g. gym.make("WordleEnv100-v0"). Serving
+builds a WordleEnvBase from a bundle instead and never imports gym.
+"""
+import gym
+from gym.envs.registration import register
+
+from wordle.wordle import WordleEnvBase, _load_words
+
+
+class WordleEnv(WordleEnvBase, gym.Env):
+    """WordleEnvBase as a gym.Env, the base of the registered envs"""
+
+
+class WordleEnv10(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(10), max_turns=6)
+
+
+class WordleEnv100(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(100), max_turns=6)
+
+
+class WordleEnv100OneAction(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(100), allowable_words=1, max_turns=6)
+
+
+class WordleEnv100WithMask(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(100), max_turns=6,
+                         mask_based_state_updates=True)
+
+
+class WordleEnv100TwoAction(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(100), allowable_words=2, max_turns=6)
+
+
+class WordleEnv100FullAction(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(), allowable_words=100, max_turns=6)
+
+
+class WordleEnv1000(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(1000), max_turns=6)
+
+
+class WordleEnv1000WithMask(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(1000), max_turns=6,
+                         mask_based_state_updates=True)
+
+
+class WordleEnv1000FullAction(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(), allowable_words=1000, max_turns=6)
+
+
+class WordleEnvFull(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(), max_turns=6)
+
+
+class WordleEnvReal(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(), allowable_words=2315, max_turns=6)
+
+
+class WordleEnvRealWithMask(WordleEnv):
+    def __init__(self):
+        super().__init__(words=_load_words(), allowable_words=2315, max_turns=6,
+                         mask_based_state_updates=True)
+
+
+# Classic
+# ----------------------------------------
+
+register(
+    id="WordleEnv10-v0",
+    entry_point="wordle.envs:WordleEnv10",
+    max_episode_steps=200,
+)
+
+register(
+    id="WordleEnv100-v0",
+    entry_point="wordle.envs:WordleEnv100",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv100OneAction-v0",
+    entry_point="wordle.envs:WordleEnv100OneAction",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv100TwoAction-v0",
+    entry_point="wordle.envs:WordleEnv100TwoAction",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv100FullAction-v0",
+    entry_point="wordle.envs:WordleEnv100FullAction",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv100WithMask-v0",
+    entry_point="wordle.envs:WordleEnv100WithMask",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv1000-v0",
+    entry_point="wordle.envs:WordleEnv1000",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv1000WithMask-v0",
+    entry_point="wordle.envs:WordleEnv1000WithMask",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnv1000FullAction-v0",
+    entry_point="wordle.envs:WordleEnv1000FullAction",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnvFull-v0",
+    entry_point="wordle.envs:WordleEnvFull",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnvReal-v0",
+    entry_point="wordle.envs:WordleEnvReal",
+    max_episode_steps=500,
+)
+
+register(
+    id="WordleEnvRealWithMask-v0",
+    entry_point="wordle.envs:WordleEnvRealWithMask",
+    max_episode_steps=500,
+)
@@ -0,0 +1,155 @@
+"""
+Precomputed feedback patterns for a word list
+
+A pattern is the mask returned by wordle.state.get_mask encoded in base 3:
+
+code = sum(mask[i] * 3**i for i in range(WORDLE_N))
+
+so every pattern fits in a uint8 (3^5 = 243). The table is laid out as
+table[guess_id, goal_id] and is cached to disk as a .npy file keyed on the
+word list so it only has to be built once per vocabulary.
+"""
+import hashlib
+import os
+import warnings
+from typing import List, Optional
+
+import numpy as np
+
+from wordle.const import WORDLE_CHARS, WORDLE_N
+
+
+dirname = os.path.dirname(__file__)
+CACHE_DIR = os.environ.get('WORDLE_PATTERN_CACHE', f'{dirname}/../../data')
+
+N_PATTERNS = 3 ** WORDLE_N
+WIN = N_PATTERNS - 1
+
+_POWERS = 3 ** np.arange(WORDLE_N)
+# MASKS[code] is the list form of a pattern code
+MASKS = (np.arange(N_PATTERNS)[:, None] // _POWERS) % 3
+
+# Number of guesses per chunk when building a table, bounds peak memory
+_CHUNK = 256
+
+
+def encode(mask: List[int]) -> int:
+    return int(np.dot(mask, _POWERS))
+
+
+def decode(code: int) -> List[int]:
+    return MASKS[code].tolist()
+
+
+def letters(words: List[str]) -> np.ndarray:
+    """
+    :param words: upper case words of length WORDLE_N
+    :return: (len(words), WORDLE_N) uint8 array of letter ids
+    """
+    arr = np.frombuffer(''.join(words).encode('ascii'), dtype=np.uint8)
+    return (arr - ord(WORDLE_CHARS[0])).reshape(len(words), WORDLE_N)
+
+
+def codes(guesses: np.ndarray, goals: np.ndarray) -> np.ndarray:
+    """
+    Vectorized wordle.state.get_mask, returning pattern codes
+
+    :param guesses: (..., WORDLE_N) letter ids
+    :param goals: (..., WORDLE_N) letter ids, broadcastable against guesses
+    :return: (...) uint8 pattern codes
+    """
+    guesses, goals = np.broadcast_arrays(guesses, goals)
+    guesses = [guesses[..., i] for i in range(WORDLE_N)]
+    goals = [goals[..., j] for j in range(WORDLE_N)]
+    green = [guesses[i] == goals[i] for i in range(WORDLE_N)]
+
+    # Loop over positions rather than materializing (..., 5, 5) temporaries,
+    # every op here is a flat pass over a (...) array
+    result = np.zeros(green[0].shape, dtype=np.uint8)
+    for i in range(WORDLE_N):
+        # Copies of the letter left in the goal once greens are accounted for
+        remaining = np.zeros(result.shape, dtype=np.uint8)
+        for j in range(WORDLE_N):
+            remaining += (guesses[i] == goals[j]) & ~green[j]
+        # Yellows are handed out left to right, so a non-green letter is yellow
+        # iff fewer earlier non-green copies of it were seen than remain in goal
+        earlier = np.zeros(result.shape, dtype=np.uint8)
+        for k in range(i):
+            earlier += (guesses[i] == guesses[k]) & ~green[k]
+        yellow = ~green[i] & (earlier < remaining)
+        result += (2 * green[i] + yellow).astype(np.uint8) * np.uint8(_POWERS[i])
+    return result
+
+
+def build(words: List[str]) -> np.ndarray:
+    """
+    :return: (len(words), len(words)) uint8 table of codes[guess, goal]
+    """
+    word_letters = letters(words)
+    table = np.empty((len(words), len(words)), dtype=np.uint8)
+    for start in range(0, len(words), _CHUNK):
+        chunk = word_letters[start:start + _CHUNK]
+        table[start:start + _CHUNK] = codes(chunk[:, None, :], word_letters[None, :, :])
+    return table
+
+
+def _cache_path(words: List[str], cache_dir: str) -> str:
+    digest = hashlib.sha1('\n'.join(words).encode('ascii')).hexdigest()[:16]
+    return f'{cache_dir}/patterns_{len(words)}_{digest}.npy'
+
+
+def load(words: List[str], cache_dir: Optional[str] = CACHE_DIR) -> np.ndarray:
+    """
+    Load the pattern table for words from the cache, building it if needed
+
+    The cached table is memory mapped read-only so processes forked after
+    loading share the same pages.
+
+    :param words:
+    :param cache_dir: where to look for/write the table, None disables caching
+    :return:
+    """
+    if cache_dir is None:
+        return build(words)
+
+    path = _cache_path(words, cache_dir)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+
+    table = build(words)
+    try:
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, table)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        warnings.warn(f"Couldn't cache pattern table to {path}: {e}")
+    return table
+
+
+class PatternTable:
+    """
+    Pattern table for a word list plus the index needed to look up words
+    """
+    def __init__(self, words: List[str], cache_dir: Optional[str] = CACHE_DIR):
+        self.words = words
+        self.index = {w: i for i, w in enumerate(words)}
+        self.letters = letters(words)
+        self.cache_dir = cache_dir
+        self._table: Optional[np.ndarray] = None
+
+    @property
+    def table(self) -> np.ndarray:
+        # Loaded on first use, the full vocabulary table is ~170MB
+        if self._table is None:
+            self._table = load(self.words, self.cache_dir)
+        return self._table
+
+    def code(self, guess_id: int, goal_id: int) -> int:
+        return int(self.table[guess_id, goal_id])
+
+    def mask(self, guess_id: int, goal_id: int) -> List[int]:
+        return decode(self.table[guess_id, goal_id])
+
+    def get_mask(self, word: str, goal_word: str) -> List[int]:
+        return self.mask(self.index[word], self.index[goal_word])
@@ -1,5 +1,5 @@
 """
-Keep the state in a 1D int array
+Keep the state in a 1D uint8 array
 
 index[0] = remaining steps
 Rest of data is laid out as binary array
@@ -14,14 +14,20 @@ where status has codes
  [0, 0, 1] - char is definitely in this spot
 """
 import collections
-from typing import List
+from typing import List, Optional
 import numpy as np
 
 from wordle.const import WORDLE_CHARS, WORDLE_N
+import wordle.patterns
+from wordle.patterns import PatternTable
 
 
 WordleState = np.ndarray
 
+# Every entry but the remaining steps is 0 or 1, states are stored, logged and
+# fed to the networks as bytes, which convert them to float themselves
+DTYPE = np.uint8
+
 
 def get_nvec(max_turns: int):
     return [max_turns] + [2] * len(WORDLE_CHARS) + [2] * 3 * WORDLE_N * len(WORDLE_CHARS)
@@ -30,11 +36,12 @@ def get_nvec(max_turns: int):
 def new(max_turns: int) -> WordleState:
     return np.array(
         [max_turns] + [0] * len(WORDLE_CHARS) + [0, 1, 0] * WORDLE_N * len(WORDLE_CHARS),
-        dtype=np.int32)
+        dtype=DTYPE)
 
 
 def remaining_steps(state: WordleState) -> int:
-    return state[0]
+    # A Python int, uint8 arithmetic on it would wrap around
+    return int(state[0])
 
 
 NO = 0
@@ -123,16 +130,21 @@ def get_mask(word: str, goal_word: str) -> List[int]:
 
     return mask
 
-def update_mask(state: WordleState, word: str, goal_word: str) -> WordleState:
+def update_mask(state: WordleState, word: str, goal_word: str,
+                patterns: Optional[PatternTable] = None) -> WordleState:
     """
     return a copy of state that has been updated to new state
 
     :param state:
     :param word:
     :param goal_word:
+    :param patterns: precomputed table to read the mask from instead of get_mask
     :return:
     """
-    mask = get_mask(word, goal_word)
+    if patterns is not None:
+        mask = patterns.get_mask(word, goal_word)
+    else:
+        mask = get_mask(word, goal_word)
     return update_from_mask(state, word, mask)
 
 
@@ -160,3 +172,77 @@ def update(state: WordleState, word: str, goal_word: str) -> WordleState:
 
     return state
 
+
+
+_NO_STATUS = np.array([1, 0, 0])
+_YES_STATUS = np.array([0, 0, 1])
+# _EARLIER[i, k] = position k comes before position i
+_EARLIER = np.tri(WORDLE_N, k=-1, dtype=np.bool_)
+
+
+def update_batch(states: np.ndarray,
+                 guesses: np.ndarray,
+                 goals: np.ndarray,
+                 patterns: PatternTable,
+                 mask_based: bool = False) -> np.ndarray:
+    """
+    Update a batch of states in place, row b is updated the same way as
+    update (or update_mask if mask_based) with guess/goal ids guesses[b] and
+    goals[b]
+
+    Unlike update, which takes the words themselves, guesses and goals are
+    word ids, so the vocabulary they index has to come along: patterns, e.g.
+    the env's, has the letters of every word and with mask_based the masks are
+    read from its precomputed table, as update_mask does.
+
+    :param states: (B, 417) C contiguous states, modified in place
+    :param guesses: (B,) word ids guessed
+    :param goals: (B,) word ids of the goal words
+    :param patterns: pattern table of the vocabulary the ids index
+    :param mask_based:
+    :return: states
+    """
+    assert states.flags.c_contiguous, 'states must be C contiguous to be updated in place'
+    guess_letters = patterns.letters[guesses].astype(np.intp)
+    goal_letters = patterns.letters[goals]
+    rows = np.arange(len(states))[:, None].repeat(WORDLE_N, axis=1)
+    same = guess_letters[:, :, None] == guess_letters[:, None, :]
+
+    if mask_based:
+        mask = wordle.patterns.MASKS[patterns.table[guesses, goals]]
+        green = mask == YES
+        no = mask == NO
+        # See update_from_mask, a no after a somewhere only rules out this spot,
+        # otherwise a no for a letter that's green elsewhere clears its maybes
+        prior_maybe = (same & _EARLIER & (mask == SOMEWHERE)[:, None, :]).any(axis=2)
+        prior_yes = (same & green[:, None, :]).any(axis=2)
+        at = (mask == SOMEWHERE) | (no & prior_maybe)
+        everywhere = no & ~prior_maybe & ~prior_yes
+        maybes = no & ~prior_maybe & prior_yes
+    else:
+        green = guess_letters == goal_letters
+        in_goal = (guess_letters[:, :, None] == goal_letters[:, None, :]).any(axis=2)
+        at = ~green & in_goal
+        everywhere = ~in_goal
+        maybes = np.zeros_like(green)
+
+    positions = np.broadcast_to(np.arange(WORDLE_N), guess_letters.shape)
+    status = states[:, 1 + len(WORDLE_CHARS):].reshape(len(states), len(WORDLE_CHARS), WORDLE_N, 3)
+
+    states[:, 0] -= 1
+    states[rows, 1 + guess_letters] = 1
+
+    # Greens first: every char at that position = no, then char = yes
+    status[rows[green], :, positions[green]] = _NO_STATUS
+    status[rows[green], guess_letters[green], positions[green]] = _YES_STATUS
+
+    # Everything else only ever flips statuses to no so the order doesn't matter
+    status[rows[at], guess_letters[at], positions[at]] = _NO_STATUS
+    status[rows[everywhere], guess_letters[everywhere]] = _NO_STATUS
+    if maybes.any():
+        idx = rows[maybes], guess_letters[maybes]
+        letter_status = status[idx]
+        letter_status[letter_status[:, :, SOMEWHERE] == 1] = _NO_STATUS
+        status[idx] = letter_status
+
+    return states
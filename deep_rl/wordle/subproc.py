@@ -0,0 +1,176 @@
+"""
+WordleVecEnv split across worker processes
+
+SubprocVecEnv has the interface of WordleVecEnv, but its N games are divided
+between worker processes, each stepping its share with a WordleVecEnv of its
+own. States, actions, rewards and the rest live in shared memory: a step
+writes the actions, tells every worker to go and waits for them, and the
+workers read their rows and write the results in place. Only the commands go
+through pipes.
+
+Worth it when the env steps are a real share of a rollout, e.g. large N with
+mask_based_state_updates or track_candidates, and there are cores to spare.
+"""
+import multiprocessing
+from typing import Any, Dict, Optional, Tuple
+
+import gym
+import numpy as np
+
+import wordle.state
+from wordle.vec import WordleVecEnv
+from wordle.wordle import WordleEnvBase
+
+# Field name -> (shape, dtype) of the shared arrays
+Layout = Dict[str, Tuple[Tuple[int, ...], Any]]
+
+
+def _views(raw: Dict[str, Any], layout: Layout) -> Dict[str, np.ndarray]:
+    return {
+        name: np.frombuffer(raw[name], dtype=dtype, count=int(np.prod(shape, dtype=np.int64))).reshape(shape)
+        for name, (shape, dtype) in layout.items()
+    }
+
+
+def _worker(conn, env: WordleEnvBase, start: int, end: int, raw: Dict[str, Any], layout: Layout, seed: int):
+    """
+    Step rows start:end of the shared arrays on command until told to close
+    """
+    # Forked workers would all draw the same goals otherwise
+    np.random.seed(seed)
+    arrays = _views(raw, layout)
+    rows = slice(start, end)
+    vec_env = WordleVecEnv(env, end - start)
+    while True:
+        command, args = conn.recv()
+        if command == 'step':
+            states, rewards, dones, info = vec_env.step(arrays["actions"][rows])
+            arrays["states"][rows] = states
+            arrays["rewards"][rows] = rewards
+            arrays["dones"][rows] = dones
+            arrays["goal_ids"][rows] = info["goal_id"]
+            if "candidates" in info:
+                arrays["candidates"][rows] = info["candidates"]
+        elif command == 'reset':
+            arrays["states"][rows] = vec_env.reset()
+            if vec_env.track_candidates:
+                arrays["candidates"][rows] = vec_env.candidates
+        elif command == 'action_masks':
+            arrays["action_masks"][rows] = vec_env.action_masks()
+        elif command == 'set_goal_id':
+            vec_env.set_goal_id(*args)
+        elif command == 'close':
+            conn.send(None)
+            conn.close()
+            return
+        conn.send(None)
+
+
+class SubprocVecEnv:
+    def __init__(self,
+                 env: gym.Env,
+                 num_envs: int,
+                 num_workers: int,
+                 ctx: Optional[multiprocessing.context.BaseContext] = None):
+        """
+        :param env: env to copy the vocabulary and rules from, may be wrapped
+        :param num_envs: number of games played in lockstep
+        :param num_workers: number of processes the games are divided between
+        :param ctx: multiprocessing context to start the workers with
+        """
+        assert 0 < num_workers <= num_envs, f'Need between 1 and num_envs {num_envs} workers, got {num_workers}'
+        ctx = ctx or multiprocessing.get_context()
+        self.env: WordleEnvBase = env.unwrapped
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+        self.words = self.env.words
+        self.max_turns = self.env.max_turns
+        self.allowable_words = self.env.allowable_words
+        self.mask_based_state_updates = self.env.mask_based_state_updates
+        self.track_candidates = self.env.track_candidates
+
+        self.action_space = self.env.action_space
+        self.observation_space = self.env.observation_space
+
+        layout = {
+            "states": ((num_envs, self.observation_space.shape[0]), wordle.state.DTYPE),
+            "actions": ((num_envs,), np.int64),
+            "rewards": ((num_envs,), np.float32),
+            "dones": ((num_envs,), np.bool_),
+            "goal_ids": ((num_envs,), np.int64),
+            "action_masks": ((num_envs, len(self.words)), np.bool_),
+        }
+        if self.track_candidates:
+            layout["candidates"] = ((num_envs, self.allowable_words), np.bool_)
+        layout = {name: (shape, np.dtype(dtype)) for name, (shape, dtype) in layout.items()}
+        raw = {name: ctx.RawArray('b', int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+               for name, (shape, dtype) in layout.items()}
+        self._arrays = _views(raw, layout)
+        self.states = self._arrays["states"]
+        self.candidates = self._arrays.get("candidates")
+
+        # Worker i steps games bounds[i]:bounds[i+1]
+        self._bounds = np.linspace(0, num_envs, num_workers + 1).astype(np.int64)
+        # Follows np.random.seed in the parent
+        seeds = np.random.randint(2**31, size=num_workers)
+        self._conns = []
+        self._processes = []
+        for i in range(num_workers):
+            conn, worker_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(worker_conn, self.env, int(self._bounds[i]), int(self._bounds[i + 1]), raw, layout,
+                      int(seeds[i])),
+                daemon=True)
+            process.start()
+            worker_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+    def _call(self, command: str, args: Tuple = (), workers: Optional[range] = None):
+        workers = range(self.num_workers) if workers is None else workers
+        for i in workers:
+            self._conns[i].send((command, args))
+        for i in workers:
+            self._conns[i].recv()
+
+    def _states_out(self, out: Optional[np.ndarray]) -> np.ndarray:
+        if out is None:
+            return self.states.copy()
+        out[:] = self.states
+        return out
+
+    def reset(self, seed: Optional[int] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        self._call('reset')
+        return self._states_out(out)
+
+    def step(self, actions: np.ndarray,
+             out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Same as WordleVecEnv.step
+        """
+        self._arrays["actions"][:] = actions
+        self._call('step')
+        info = {"goal_id": self._arrays["goal_ids"].copy()}
+        if self.track_candidates:
+            info["candidates"] = self.candidates.copy()
+        return self._states_out(out), self._arrays["rewards"].copy(), self._arrays["dones"].copy(), info
+
+    def action_masks(self) -> np.ndarray:
+        """
+        :return: (N, len(words)) legal actions of each game, see WordleVecEnv.action_masks
+        """
+        self._call('action_masks')
+        return self._arrays["action_masks"].copy()
+
+    def set_goal_id(self, idx: int, goal_id: int):
+        worker = int(np.searchsorted(self._bounds, idx, side='right')) - 1
+        self._call('set_goal_id', (idx - int(self._bounds[worker]), goal_id), range(worker, worker + 1))
+
+    def close(self):
+        if not self._processes:
+            return
+        self._call('close')
+        for process in self._processes:
+            process.join()
+        self._processes = []
@@ -0,0 +1,126 @@
+"""
+Vectorized WordleEnvBase
+
+Holds N games as a stacked (N, obs) state array and steps all of them in a
+single call. Games that finish are reset automatically, so the states
+returned from step() are always ready for the next batched forward pass.
+"""
+from typing import Optional, Dict, Tuple
+
+import gym
+import numpy as np
+
+import wordle.state
+from wordle.const import REWARD
+from wordle.wordle import WordleEnvBase
+
+
+class WordleVecEnv:
+    def __init__(self, env: gym.Env, num_envs: int):
+        """
+        :param env: env to copy the vocabulary and rules from, may be wrapped
+        :param num_envs: number of games played in lockstep
+        """
+        self.env: WordleEnvBase = env.unwrapped
+        self.num_envs = num_envs
+        self.words = self.env.words
+        self.max_turns = self.env.max_turns
+        self.allowable_words = self.env.allowable_words
+        self.mask_based_state_updates = self.env.mask_based_state_updates
+        self.patterns = self.env.patterns
+        self.track_candidates = self.env.track_candidates
+
+        self.action_space = self.env.action_space
+        self.observation_space = self.env.observation_space
+
+        initial = wordle.state.new(self.max_turns)
+        self._initial_state = initial
+        self.states = np.tile(initial, (num_envs, 1))
+        self.goal_words = np.zeros(num_envs, dtype=np.int64)
+        self.guessed = np.zeros((num_envs, len(self.words)), dtype=np.bool_)
+        self.candidates: Optional[np.ndarray] = None
+        if self.track_candidates:
+            self.candidates = np.ones((num_envs, self.allowable_words), dtype=np.bool_)
+
+    def _sample_goals(self, n: int) -> np.ndarray:
+        return (np.random.random(n) * self.allowable_words).astype(np.int64)
+
+    def _states_out(self, out: Optional[np.ndarray]) -> np.ndarray:
+        if out is None:
+            return self.states.copy()
+        out[:] = self.states
+        return out
+
+    def reset(self, seed: Optional[int] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        :param out: (N, obs_size) array to write the states into instead of a new one, see step
+        """
+        self.states[:] = self._initial_state
+        self.goal_words[:] = self._sample_goals(self.num_envs)
+        self.guessed[:] = False
+        if self.track_candidates:
+            self.candidates[:] = True
+        return self._states_out(out)
+
+    def reset_at(self, idx: np.ndarray):
+        """
+        Reset the games at idx in place
+        """
+        self.states[idx] = self._initial_state
+        self.goal_words[idx] = self._sample_goals(len(idx))
+        self.guessed[idx] = False
+        if self.track_candidates:
+            self.candidates[idx] = True
+
+    def step(self, actions: np.ndarray,
+             out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        :param actions: (N,) word ids, one per game
+        :param out: (N, obs_size) array to write the next states into, e.g. the
+            next row of a rollout, instead of returning a new copy of them
+        :return: next states, rewards, dones and info with the goal_id of each
+            game. Rows that finished are reset, so their next state is the
+            initial state of a new game. With track_candidates, info also has
+            the (N, allowable_words) candidates mask matching the next states.
+        """
+        actions = np.asarray(actions)
+        goal_ids = self.goal_words.copy()
+        wordle.state.update_batch(self.states, actions, goal_ids, self.patterns,
+                                  mask_based=self.mask_based_state_updates)
+        self.guessed[np.arange(self.num_envs), actions] = True
+        if self.track_candidates:
+            table = self.patterns.table
+            rows = table[actions[:, None], np.arange(self.allowable_words)]
+            self.candidates &= rows == table[actions, goal_ids][:, None]
+
+        remaining = self.states[:, 0]
+        wins = actions == goal_ids
+        losses = ~wins & (remaining == 0)
+        dones = wins | losses
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        # No reward for guessing off the bat, same as WordleEnvBase.step
+        rewards[wins & (remaining != self.max_turns - 1)] = REWARD
+        rewards[losses] = -REWARD
+
+        done_idx = np.flatnonzero(dones)
+        if len(done_idx):
+            self.reset_at(done_idx)
+
+        info = {"goal_id": goal_ids}
+        if self.track_candidates:
+            info["candidates"] = self.candidates.copy()
+        return self._states_out(out), rewards, dones, info
+
+    def action_masks(self) -> np.ndarray:
+        """
+        :return: (N, len(words)) legal actions of each game, see WordleEnvBase.action_mask
+        """
+        if self.track_candidates:
+            masks = np.zeros((self.num_envs, len(self.words)), dtype=np.bool_)
+            masks[:, :self.allowable_words] = self.candidates
+            return masks
+        return ~self.guessed
+
+    def set_goal_id(self, idx: int, goal_id: int):
+        self.goal_words[idx] = goal_id
@@ -1,10 +1,10 @@
+import functools
 import os
 from typing import Optional, List
 
-import gym
-from gym import spaces
 import numpy as np
 
+import wordle.patterns
 import wordle.state
 from wordle.const import WORDLE_N, REWARD
 
@@ -23,7 +23,7 @@ def _load_words(limit: Optional[int]=None) -> List[str]:
             return lines[:limit]
 
 
-class WordleEnvBase(gym.Env):
+class WordleEnvBase:
     """
     Actions:
         Can play any 5 letter word in vocabulary
@@ -39,17 +39,29 @@ class WordleEnvBase(gym.Env):
     Starting State:
         Random goal word
         Initial state with turn 0, all chars Unvisited + Maybe
+    Candidates:
+        With track_candidates, the env also keeps a boolean mask over the allowable
+        goal words that are still consistent with the feedback so far. It's narrowed
+        with one row of the pattern table per step and returned in info["candidates"]
+    Legal actions:
+        action_mask() gives the words worth playing: the remaining candidates when
+        they're tracked, otherwise every word that hasn't been guessed yet
+    Gym:
+        Doesn't import gym, so serving can play without it. The spaces are only
+        built when asked for and the registered gym envs are in wordle.envs
     """
     def __init__(self, words: List[str],
                  max_turns: int,
                  allowable_words: Optional[int] = None,
                  frequencies: Optional[List[float]]=None,
-                 mask_based_state_updates: bool=False):
+                 mask_based_state_updates: bool=False,
+                 track_candidates: bool=False):
         assert all(len(w) == WORDLE_N for w in words), f'Not all words of length {WORDLE_N}, {words}'
         self.words = words
         self.max_turns = max_turns
         self.allowable_words = allowable_words
         self.mask_based_state_updates = mask_based_state_updates
+        self.track_candidates = track_candidates
         if not self.allowable_words:
             self.allowable_words = len(self.words)
 
@@ -58,16 +70,16 @@ class WordleEnvBase(gym.Env):
             assert len(words) == len(frequencies), f'{len(words), len(frequencies)}'
             self.frequencies = np.array(frequencies, dtype=np.float32) / sum(frequencies)
 
-        self.action_space = spaces.Discrete(len(self.words))
-        self.observation_space = spaces.MultiDiscrete(wordle.state.get_nvec(self.max_turns))
-
         self.done = True
         self.goal_word: int = -1
 
         self.state: wordle.state.WordleState = None
+        self.candidates: Optional[np.ndarray] = None
+        self.guessed = np.zeros(len(self.words), dtype=np.bool_)
+        self.patterns = wordle.patterns.PatternTable(self.words)
         self.state_updater = wordle.state.update
         if self.mask_based_state_updates:
-            self.state_updater = wordle.state.update_mask
+            self.state_updater = functools.partial(wordle.state.update_mask, patterns=self.patterns)
 
     def step(self, action: int):
         if self.done:
@@ -80,6 +92,7 @@ class WordleEnvBase(gym.Env):
         self.state = self.state_updater(state=self.state,
                                         word=self.words[action],
                                         goal_word=self.words[self.goal_word])
+        self.guessed[action] = True
 
         reward = 0
         if action == self.goal_word:
@@ -94,80 +107,60 @@ class WordleEnvBase(gym.Env):
             self.done = True
             reward = -REWARD
 
-        return self.state.copy(), reward, self.done, {"goal_id": self.goal_word}
+        info = {"goal_id": self.goal_word}
+        if self.track_candidates:
+            # Candidates survive if they'd have produced the same pattern as the goal
+            row = self.patterns.table[action]
+            self.candidates &= row[:self.allowable_words] == row[self.goal_word]
+            info["candidates"] = self.candidates.copy()
+
+        return self.state.copy(), reward, self.done, info
 
     def reset(self, seed: Optional[int] = None):
         self.state = wordle.state.new(self.max_turns)
         self.done = False
         self.goal_word = int(np.random.random()*self.allowable_words)
+        self.guessed[:] = False
+        if self.track_candidates:
+            self.candidates = np.ones(self.allowable_words, dtype=np.bool_)
 
         return self.state.copy()
 
+    @functools.cached_property
+    def action_space(self):
+        from gym import spaces
+        return spaces.Discrete(len(self.words))
+
+    @functools.cached_property
+    def observation_space(self):
+        from gym import spaces
+        return spaces.MultiDiscrete(wordle.state.get_nvec(self.max_turns))
+
+    @property
+    def unwrapped(self) -> 'WordleEnvBase':
+        return self
+
+    def get_candidates(self) -> np.ndarray:
+        """
+        :return: boolean mask over the first allowable_words words of the goal
+            words still consistent with the feedback, updated in place by step()
+        """
+        assert self.track_candidates, 'Candidates are only tracked with track_candidates=True'
+        return self.candidates
+
+    def action_mask(self) -> np.ndarray:
+        """
+        :return: boolean mask over all words, True for the actions worth playing
+        """
+        if self.track_candidates:
+            mask = np.zeros(len(self.words), dtype=np.bool_)
+            mask[:self.allowable_words] = self.candidates
+            return mask
+        return ~self.guessed
+
     def set_goal_word(self, goal_word: str):
         self.goal_word = self.words.index(goal_word)
 
     def set_goal_id(self, goal_id: int):
         self.goal_word = goal_id
 
-
-class WordleEnv10(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(10), max_turns=6)
-
-
-class WordleEnv100(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(100), max_turns=6)
-
-
-class WordleEnv100OneAction(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(100), allowable_words=1, max_turns=6)
-
-
-class WordleEnv100WithMask(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(100), max_turns=6,
-                         mask_based_state_updates=True)
-
-
-class WordleEnv100TwoAction(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(100), allowable_words=2, max_turns=6)
-
-
-class WordleEnv100FullAction(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(), allowable_words=100, max_turns=6)
-
-
-class WordleEnv1000(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(1000), max_turns=6)
-
-
-class WordleEnv1000WithMask(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(1000), max_turns=6,
-                         mask_based_state_updates=True)
-
-
-class WordleEnv1000FullAction(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(), allowable_words=1000, max_turns=6)
-
-
-class WordleEnvFull(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(), max_turns=6)
-
-
-class WordleEnvReal(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(), allowable_words=2315, max_turns=6)
-
-
-class WordleEnvRealWithMask(WordleEnvBase):
-    def __init__(self):
-        super().__init__(words=_load_words(), allowable_words=2315, max_turns=6,
-                         mask_based_state_updates=True)